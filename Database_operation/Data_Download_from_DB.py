@@ -1,23 +1,18 @@
-import pandas as pd
-import db_operations as dbop
 import os
+import sys
+
+import db_operations as dbop
 
+# The deration factor cache lives next to the utility ETLs that read it
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import deration_cache
 
 
 # access database
 conn, engine = dbop.db_connect('LoadStaging')
-LocaleName = 'APS'
-save_directory = 'C:\\Users\\5DIntern3_2024\\Work\\PE_MD'
-
-df_load = pd.read_sql(f"SELECT * FROM [dbo].[Load_PJMHourlyDerationFactor] where LocaleName = '{LocaleName}'", engine)
-print(f"{LocaleName} data downloaded from Database")
-
-# Define the directory to save the CSV file
-csv_file_path = os.path.join(save_directory, f'DerationFactor_{LocaleName}.csv')
-# Save the DataFrame to a CSV file
-df_load.to_csv(csv_file_path, index=False)
 
-# # Make the CSV file read-only
-# os.chmod(csv_file_path, 0o444)
+# Sync the local Parquet cache of Load_PJMHourlyDerationFactor (all locales) with the rows added since the last run.
+# ETLs read it through deration_cache.get_deration(LocaleName), e.g. 'APS', 'DEOK', 'DAY', 'ATSI', 'AEPOHIO_RESID_AGG'
+row_count = deration_cache.sync_deration_cache(engine)
 
-print(f"{LocaleName} DataFrame saved to {csv_file_path}")
+print(f"{row_count} deration factor rows synced to {deration_cache.CACHE_DIR}")
@@ -13,32 +13,23 @@ def get_miso_transoutage(start_date=date.today(), end_date=date.today() + timede
     mapping_df = read_sql(select_sql, engine)
 
     branch_df, gen_df, injgroup_df, gen_mapping_df = get_latest_cm_data(iso_name='MISO')
-    branch_df = branch_df.loc[branch_df.Label != '', :].copy()
-    branch_df['Label_nobranchid'] = branch_df['Label'].apply(lambda x: x.rsplit(' ', 1)[0])
-    branch_df['Label_nospace'] = branch_df['Label'].apply(lambda x: x.replace(' ', ''))
-    branch_df['BusNameFrom'] = branch_df['BusNameFrom'].astype(str).str.strip()
-    branch_df['BusNameTo'] = branch_df['BusNameTo'].astype(str).str.strip()
-    branch_df['NomkVFrom'] = branch_df['NomkVFrom'].astype(str).str.strip()
-    branch_df['NomkVTo'] = branch_df['NomkVTo'].astype(str).str.strip()
-    branch_df['Circuit'] = branch_df['Circuit'].astype(str).str.strip()
-    branch_df['IDC Name_1'] = branch_df['BusNameFrom'].astype(str).str.ljust(12) + branch_df['NomkVFrom'].astype(str).str[:6] + ' ' + branch_df['BusNameTo'].astype(str).str.ljust(12) + branch_df['NomkVTo'].astype(str).str[:6] + ' ' + branch_df['Circuit'].astype(str) + ' '
-    branch_df['IDC Name_2'] = branch_df['BusNameTo'].astype(str).str.ljust(12) + branch_df['NomkVTo'].astype(str).str[:6] + ' ' + branch_df['BusNameFrom'].astype(str).str.ljust(12) + branch_df['NomkVFrom'].astype(str).str[:6] + ' ' + branch_df['Circuit'].astype(str) + ' '
-    branch_df_temp = branch_df.copy()
-    branch_df_temp['Label_Update'] = branch_df_temp.Label.str[:-1].str.rstrip()
-    # EMS_IDC mapping contains some errors, we use IDC_EQUIPMENT_NAME to Branch_Label[:-1] to update the mapping
-    branch_df_temp = branch_df_temp[~branch_df_temp.duplicated(subset=['Label_Update'], keep=False)].copy()
-    branch_df_temp.rename(columns={'Label': 'Branch_Label', 'Label_Update': 'Branch_Label_Update'}, inplace=True)
+    # Label lookups of every branch alias (IDC names, label without branch id, ...) and the EMS-IDC mapping, built once per commercial model
+    import com_model_cache
+    import outage_labels
+    cm_name = com_model_cache.latest_import(conn, 'MISO')['Com_Model_Name']
+    label_index = outage_labels.get_label_index((cm_name, str(mapping_df['Market_Date'].max())), branch_df, mapping_df)
     if planned_rt.upper() == 'PLANNED' and simu_type.upper() == 'FORECAST':
         if as_of_date is None:
             as_of_date = start_date
         # Now pull outage
-        select_sql = "Select * FROM [MISO_TransOutage_Planned] Where Market_Date IN (Select max(Market_Date) FROM [MISO_TransOutage_Planned] Where Market_Date <= \'{}\') ".format(as_of_date.strftime("%Y-%m-%d"))
+        select_sql = "Select * FROM [MISO_TransOutage_Planned] Where Market_Date IN (Select max(Market_Date) FROM [MISO_TransOutage_Planned] Where Market_Date <= :as_of_date) "
+        params = {'as_of_date': as_of_date.strftime("%Y-%m-%d")}
         try:
-            transoutage_df = read_sql(select_sql, engine)
+            transoutage_df = dbop.read_sql(select_sql, engine, params=params)
         except:
             print("Retry after 10 sec")
             time.sleep(10)
-            transoutage_df = read_sql(select_sql, engine)
+            transoutage_df = dbop.read_sql(select_sql, engine, params=params)
         as_of_date = transoutage_df.iloc[0, 0]
         # transoutage_df.loc[pd.notnull(transoutage_df.ACTUAL_START), 'PLANNED_START'] = transoutage_df.loc[pd.notnull(transoutage_df.ACTUAL_START), 'ACTUAL_START']
         transoutage_df = transoutage_df.loc[((transoutage_df.PLANNED_START < (end_date + timedelta(days=1)).strftime("%Y-%m-%d")) | (transoutage_df.ACTUAL_START < (end_date + timedelta(days=1)).strftime("%Y-%m-%d"))) &
@@ -48,13 +39,15 @@ def get_miso_transoutage(start_date=date.today(), end_date=date.today() + timede
 
     elif simu_type.upper() == 'BACKTEST':
         # Pull data from 'MISO_TransOutage_Historical' table
-        select_sql = "Select * FROM [MISO_TransOutage_Historical] Where ACTUAL_END >= \'{}\' and ACTUAL_START <= \'{}\' ".format(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        select_sql = "Select * FROM [MISO_TransOutage_Historical] Where ACTUAL_END >= :start_date and ACTUAL_START <= :end_date "
+        params = {'start_date': start_date.strftime("%Y-%m-%d"), 'end_date': end_date.strftime("%Y-%m-%d")}
+        # Years of history: read it as monthly ACTUAL_START partitions in parallel over the pooled connections
         try:
-            transoutage_df = read_sql(select_sql, engine)
+            transoutage_df = dbop.read_sql_partitioned(select_sql, engine, partition_column='ACTUAL_START', params=params)
         except:
             print("Retry after 10 sec")
             time.sleep(10)
-            transoutage_df = read_sql(select_sql, engine)
+            transoutage_df = dbop.read_sql_partitioned(select_sql, engine, partition_column='ACTUAL_START', params=params)
 
     transoutage_df['Set_Status'] = ''  # 'Set_Status' will be used to set branch status in powerworld
     # Keep only Branch and Transformer
@@ -68,40 +61,15 @@ def get_miso_transoutage(start_date=date.today(), end_date=date.today() + timede
 
     # # For those that don't match with latest EMS model, reset 'Label' to ''
     # transoutage_df.loc[~transoutage_df.Label.isin(branch_df.Label.tolist()), 'Label'] = ''
-    # Update 'IDC_Name' in mapping_df by adding a ' ' at the end, Pull EMS-IDC mapping from DB, use that to get Label
-    mapping_df['IDC_Name'] = mapping_df['IDC_Name'] + ' '
-    transoutage_df = pd.merge(transoutage_df, mapping_df[['IDC_Name', 'Label']], left_on=['IDC_EQUIPMENT_NAME'], right_on=['IDC_Name'], how='left', suffixes=('', '_x'))
-    transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label'] = transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label_x']
-    transoutage_df.drop(columns=['IDC_Name', 'Label_x'], inplace=True)
+    # Resolve Label in one pass over the aliases, by priority: EMS name to Branch_Label[:-1] (corrects errors of the EMS_IDC mapping),
+    # IDC name from the branch buses, the outage's own Label, EMS-IDC mapping, EMS name to label without branch id / spaces / label
+    transoutage_df['Label'], label_sources = outage_labels.resolve_labels(transoutage_df, label_index)
     print('Total branch_transformer outage data entry is {}'.format(str(transoutage_df.shape[0])))
-    print('Total mapped outage data entry is {}'.format(str(transoutage_df.loc[transoutage_df.Label.isin(branch_df.Label.tolist()), :].shape[0])))
-
-    transoutage_df = pd.merge(transoutage_df, branch_df[['IDC Name_1', 'Label']].drop_duplicates(['IDC Name_1']), left_on=['IDC_EQUIPMENT_NAME'], right_on=['IDC Name_1'], how='left', suffixes=('', '_y'))
-    transoutage_df = pd.merge(transoutage_df, branch_df[['IDC Name_2', 'Label']].drop_duplicates(['IDC Name_2']), left_on=['IDC_EQUIPMENT_NAME'], right_on=['IDC Name_2'], how='left', suffixes=('', '_z'))
-    transoutage_df.loc[pd.notnull(transoutage_df.Label_y), 'Label'] = transoutage_df.loc[pd.notnull(transoutage_df.Label_y), 'Label_y']
-    transoutage_df.loc[pd.notnull(transoutage_df.Label_z), 'Label'] = transoutage_df.loc[pd.notnull(transoutage_df.Label_y), 'Label_z']
-    transoutage_df.drop(columns=['IDC Name_1', 'Label_y', 'IDC Name_2', 'Label_z'], inplace=True)
-
-    transoutage_df = pd.merge(transoutage_df, branch_df[['Label_nobranchid', 'Label']].drop_duplicates(['Label_nobranchid']), left_on=['EMS_EQUIPMENT_NAME'], right_on=['Label_nobranchid'], how='left', suffixes=('', '_x'))
-    transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label'] = transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label_x']
-    print('Total mapped outage data entry is {}'.format(str(transoutage_df.loc[transoutage_df.Label.isin(branch_df.Label.tolist()), :].shape[0])))
-
-    transoutage_df = pd.merge(transoutage_df, branch_df[['Label_nospace', 'Label']].drop_duplicates(['Label_nospace']), left_on=['EMS_EQUIPMENT_NAME'], right_on=['Label_nospace'], how='left', suffixes=('', '_y'))
-    transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label'] = transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label_y']
-    transoutage_df.drop(columns=['Label_x', 'Label_y', 'Label_nobranchid', 'Label_nospace'], inplace=True)
-
-    transoutage_df = pd.merge(transoutage_df, branch_df[['Label']].drop_duplicates(['Label']), left_on=['EMS_EQUIPMENT_NAME'], right_on=['Label'], how='left', suffixes=('', '_y'))
-    transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label'] = transoutage_df.loc[pd.isnull(transoutage_df.Label), 'Label_y']
-    transoutage_df.drop(columns=['Label_y'], inplace=True)
-
-    # Update EMS_IDC mapping
-    transoutage_df = transoutage_df.merge(branch_df_temp[['Branch_Label', 'Branch_Label_Update']], left_on='EMS_EQUIPMENT_NAME', right_on='Branch_Label_Update', how='left')
-    transoutage_df.loc[transoutage_df.Branch_Label.notna() & (transoutage_df.Label != transoutage_df.Branch_Label), 'Label'] = transoutage_df.loc[transoutage_df.Branch_Label.notna() & (transoutage_df.Label != transoutage_df.Branch_Label), 'Branch_Label']
-    transoutage_df.drop(columns=['Branch_Label', 'Branch_Label_Update'], inplace=True)
+    print('Labels resolved by {}'.format(label_sources.value_counts().to_dict()))
 
     transoutage_df = transoutage_df.loc[pd.notnull(transoutage_df.Label), :].copy()
     print('Total mapped branch_transformer outage data entry is {}'.format(str(transoutage_df.shape[0])))
-    print('Total mapped outage data entry is {}'.format(str(transoutage_df.loc[transoutage_df.Label.isin(branch_df.Label.tolist()), :].shape[0])))
+    print('Total mapped outage data entry is {}'.format(str(transoutage_df.Label.isin(label_index['Label'].keys()).sum())))
 
     transoutage_df.drop(columns=['Year', 'Month', 'Day'], inplace=True)
     if planned_rt.upper() == 'PLANNED' and simu_type.upper() == 'FORECAST':
@@ -183,29 +151,20 @@ def get_latest_cm_data(iso_name='MISO'):
     Check MISO/PJM_ComModel_ImportLog and find the commercial model with the latest Effective_Date
     Note that it can pull PJM commcrcial model data as well
     """
+    # Read through the local cache of the model tables, only a new model in the ImportLog goes to the database
+    import com_model_cache
+
     # DB connection
     conn, engine = dbop.db_connect(db='MISO')  # MISO/SPP/PJM ComModel data are all stored in AnalysisDB
+    cm_name, tables = com_model_cache.get_com_model(conn, iso_name)
 
-    select_sql0 = '''SELECT TOP 1 * from {}_ComModel_ImportLog ORDER BY Effective_Date DESC'''.format(iso_name)
-    raw_df = read_sql(select_sql0, conn)
-    cm_name = raw_df.iloc[0, :]['Com_Model_Name']
-
-    # Now pull se_data
-    select_sql1 = '''SELECT * from {}_ComModel_Branch Where Com_Model_Name = \'{}\' '''.format(iso_name, cm_name)
-    branch_df = read_sql(select_sql1, conn)
-
-    select_sql2 = '''SELECT * from {}_ComModel_Gen where Com_Model_Name = \'{}\' '''.format(iso_name, cm_name)
-    gen_df = read_sql(select_sql2, conn)
-
-    select_sql3 = '''SELECT * from {}_ComModel_InjectionGroup where Com_Model_Name = \'{}\' '''.format(iso_name, cm_name)
-    injgroup_df = read_sql(select_sql3, conn)
+    branch_df = tables['Branch']
+    gen_df = tables['Gen']
+    injgroup_df = tables['InjectionGroup']
 
     if iso_name != 'PJM':
-        select_sql4 = '''SELECT * from {}_ComModel_Gen_Mapping where Com_Model_Name = \'{}\' '''.format(iso_name, cm_name)
-        gen_mapping_df = read_sql(select_sql4, conn)
-
-        select_sql5 = '''SELECT * from {}_ComModel_Cpnode where Com_Model_Name = \'{}\' '''.format(iso_name, cm_name)
-        cpnodes_df = read_sql(select_sql5, conn)
+        gen_mapping_df = tables['Gen_Mapping']
+        cpnodes_df = tables['Cpnode']
         if cpnodes_df.shape[0] > 0:
             injgroup_df = injgroup_df.merge(cpnodes_df[['Commercial_Node_Name', 'EFFECTIVE_DATE', 'TERMINATION_DATE']].drop_duplicates(), left_on='Label', right_on='Commercial_Node_Name', how='left')
     else:
@@ -4,4 +4,9 @@ import db_operations as dbop
 conn, engine = dbop.db_connect('LoadStaging')
 edc_name = 'OH_AEP'
 customer_class = 'RES'
-df_load = pd.read_sql(f"SELECT * FROM [dbo].[Load_HourlyVolumeHist] where EDCName = '{edc_name}' and CustomerClass = '{customer_class}'", engine)
+# Values go as parameters, not into the SQL text, so SQL Server reuses one plan for every EDC and class
+select_sql = "SELECT * FROM [dbo].[Load_HourlyVolumeHist] where EDCName = :edc_name and CustomerClass = :customer_class"
+params = {'edc_name': edc_name, 'customer_class': customer_class}
+# The full EDC history in parallel: one partition per month of Datetime_beginning_utc, one pooled connection each.
+# dbop.read_sql, read_sql_chunks and read_sql_to_parquet take the same query and params
+df_load = dbop.read_sql_partitioned(select_sql, engine, partition_column='Datetime_beginning_utc', freq='MS', params=params)
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+import db_operations as dbop
+
+# Local Parquet copies of the commercial model tables, one directory per Com_Model_Name. A model is only read from
+# the database once: later calls check *_ComModel_ImportLog and reuse the cached model while it is still the latest
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ComModel')
+MANIFEST_FILE = 'manifest.json'
+# ImportLog is checked at most this often within one process, models change a few times a year
+IMPORT_LOG_TTL_SECONDS = 10 * 60
+# Cached models kept on disk per ISO, the latest ones
+KEEP_MODELS = 2
+# Table names cannot be query parameters, so only known ISOs go into the SQL text
+ISO_TABLES = {
+    'MISO': ['Branch', 'Gen', 'InjectionGroup', 'Gen_Mapping', 'Cpnode'],
+    'SPP': ['Branch', 'Gen', 'InjectionGroup', 'Gen_Mapping', 'Cpnode'],
+    'PJM': ['Branch', 'Gen', 'InjectionGroup'],
+}
+
+_latest = {}
+_models = {}
+_lock = threading.Lock()
+
+
+def model_dir(iso_name, cm_name, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, iso_name, re.sub(r'[^\w.-]', '_', cm_name))
+
+
+def latest_import(conn, iso_name, refresh=False):
+    """
+    The latest row of {iso}_ComModel_ImportLog by Effective_Date as a dict of strings, checked every IMPORT_LOG_TTL_SECONDS
+    """
+    cached = _latest.get(iso_name)
+    if not refresh and cached is not None and time.time() - cached[0] < IMPORT_LOG_TTL_SECONDS:
+        return cached[1]
+    raw_df = dbop.read_sql('''SELECT TOP 1 * from {}_ComModel_ImportLog ORDER BY Effective_Date DESC'''.format(iso_name), conn)
+    import_log = {column: str(value) for column, value in raw_df.iloc[0, :].items()}
+    _latest[iso_name] = (time.time(), import_log)
+    return import_log
+
+
+def read_model(path, import_log, tables):
+    # The cached tables of a model, None if missing or cached from another import of the same Com_Model_Name
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest['ImportLog'] != import_log or set(manifest['Tables']) != set(tables):
+        return None
+    return {table: pd.read_parquet(os.path.join(path, table + '.parquet')) for table in tables}
+
+
+def write_model(path, import_log, model):
+    # Written to a temporary directory first so an interrupted write never leaves a partial model behind
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for table, df in model.items():
+        df.to_parquet(os.path.join(tmp_path, table + '.parquet'), index=False)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump({'ImportLog': import_log, 'Tables': list(model), 'CachedAt': pd.Timestamp.now(tz='UTC').isoformat()}, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def prune_models(iso_name, keep=KEEP_MODELS, cache_dir=CACHE_DIR):
+    # Drop the older cached models of an ISO, by last write
+    iso_dir = os.path.join(cache_dir, iso_name)
+    paths = sorted((os.path.join(iso_dir, name) for name in os.listdir(iso_dir)), key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def get_com_model(conn, iso_name='MISO', refresh=False, cache_dir=CACHE_DIR):
+    """
+    Com_Model_Name and tables ({'Branch': df, 'Gen': df, ...}) of the latest commercial model of an ISO,
+    from memory, then the local Parquet cache, then the database. refresh=True reads the model from the database again.
+    The frames are copies, callers can change them
+    """
+    if iso_name not in ISO_TABLES:
+        raise ValueError('Unknown ISO {}'.format(iso_name))
+    tables = ISO_TABLES[iso_name]
+    with _lock:
+        import_log = latest_import(conn, iso_name, refresh)
+        cm_name = import_log['Com_Model_Name']
+        key = (iso_name, json.dumps(import_log, sort_keys=True))
+        model = None if refresh else _models.get(key)
+        if model is None:
+            path = model_dir(iso_name, cm_name, cache_dir)
+            model = None if refresh else read_model(path, import_log, tables)
+            if model is None:
+                start = time.time()
+                model = {table: dbop.read_sql('''SELECT * from {}_ComModel_{} where Com_Model_Name = :cm_name'''.format(iso_name, table), conn, params={'cm_name': cm_name})
+                         for table in tables}
+                # read_sql returns a frame without columns when all its retries failed, never cache that
+                failed = [table for table, df in model.items() if len(df.columns) == 0]
+                if failed:
+                    raise Exception('Error reading {} of commercial model {}'.format(', '.join(failed), cm_name))
+                print('Commercial model {} read from the database in {:.1f}s'.format(cm_name, time.time() - start))
+                write_model(path, import_log, model)
+                prune_models(iso_name, cache_dir=cache_dir)
+            # Only the latest model of each ISO stays in memory
+            for old_key in [old_key for old_key in _models if old_key[0] == iso_name]:
+                del _models[old_key]
+            _models[key] = model
+    return cm_name, {table: df.copy() for table, df in model.items()}
@@ -25,6 +25,9 @@ np.set_printoptions(suppress=True)
 
 # Import the module with all db functions
 import db_operations as dbop
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import bulk_loader
 
 class IsoDataImporter:
     """
@@ -209,12 +212,10 @@ def read_miso_dailyloadbylrz(target_date):
 
 
 def upload_miso_dailyloadbylrz_df(dailyloadbylrz_df, engine, target_date):
-    """ Upload the dailyloadbylrz_df to DB, need to remove existing record first"""
-    # Delete existing records
-    del_sql = '''DELETE from Target_Table where Market_Date >= \'{}\''''.format(target_date - timedelta(2))
-    result = sql.execute(del_sql, engine)
-    # Upload new records
-    dailyloadbylrz_df.loc[dailyloadbylrz_df.Market_Date >= pd.Timestamp((target_date - timedelta(2))).to_pydatetime(), :].to_sql('Target_Table', con=engine, if_exists='append', index=False, chunksize=10000)
+    """ Upload the dailyloadbylrz_df to DB, replacing the existing records of the last days in one transaction"""
+    delete_from = pd.Timestamp((target_date - timedelta(2))).to_pydatetime()
+    upload_df = dailyloadbylrz_df.loc[dailyloadbylrz_df.Market_Date >= delete_from, :]
+    bulk_loader.bulk_load(engine, upload_df, 'Target_Table', 'Market_Date', schema=None, delete_from=delete_from)
     return 0
 
 def read_upload_miso_dailyloadbylrz(target_date=date.today()):
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Aliases an outage Label is resolved from, first match wins: (alias, outage column matched against it).
+# Label_Update (branch label without its last character) corrects known errors of the EMS-IDC mapping and the IDC
+# names built from the branch buses replace the Label an outage already has (alias None); the EMS-IDC mapping and
+# the EMS name variants only fill outages without one
+LABEL_PRIORITY = [
+    ('Label_Update', 'EMS_EQUIPMENT_NAME'),
+    ('IDC Name_2', 'IDC_EQUIPMENT_NAME'),
+    ('IDC Name_1', 'IDC_EQUIPMENT_NAME'),
+    (None, 'Label'),
+    ('IDC_Name', 'IDC_EQUIPMENT_NAME'),
+    ('Label_nobranchid', 'EMS_EQUIPMENT_NAME'),
+    ('Label_nospace', 'EMS_EQUIPMENT_NAME'),
+    ('Label', 'EMS_EQUIPMENT_NAME'),
+]
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def branch_aliases(branch_df):
+    # Alias columns of the commercial model branches with a Label
+    branch_df = branch_df.loc[branch_df.Label != '', ['Label', 'BusNameFrom', 'BusNameTo', 'NomkVFrom', 'NomkVTo', 'Circuit']].copy()
+    branch_df['Label_nobranchid'] = branch_df['Label'].str.rsplit(' ', n=1).str[0]
+    branch_df['Label_nospace'] = branch_df['Label'].str.replace(' ', '')
+    for column in ['BusNameFrom', 'BusNameTo', 'NomkVFrom', 'NomkVTo', 'Circuit']:
+        branch_df[column] = branch_df[column].astype(str).str.strip()
+    branch_df['IDC Name_1'] = branch_df['BusNameFrom'].str.ljust(12) + branch_df['NomkVFrom'].str[:6] + ' ' + branch_df['BusNameTo'].str.ljust(12) + branch_df['NomkVTo'].str[:6] + ' ' + branch_df['Circuit'] + ' '
+    branch_df['IDC Name_2'] = branch_df['BusNameTo'].str.ljust(12) + branch_df['NomkVTo'].str[:6] + ' ' + branch_df['BusNameFrom'].str.ljust(12) + branch_df['NomkVFrom'].str[:6] + ' ' + branch_df['Circuit'] + ' '
+    branch_df['Label_Update'] = branch_df['Label'].str[:-1].str.rstrip()
+    return branch_df
+
+
+def build_label_index(branch_df, mapping_df):
+    """
+    {alias: {alias value: Label}} for every alias of LABEL_PRIORITY, from the branches of a commercial model and the
+    EMS-IDC mapping. The first branch of a duplicated alias wins, a Label_Update shared by several branches is left out
+    """
+    aliases = branch_aliases(branch_df)
+    index = {}
+    for alias in ['IDC Name_1', 'IDC Name_2', 'Label_nobranchid', 'Label_nospace', 'Label']:
+        first = aliases.drop_duplicates(alias)
+        index[alias] = dict(zip(first[alias], first['Label']))
+    unique = aliases[~aliases.duplicated('Label_Update', keep=False)]
+    index['Label_Update'] = dict(zip(unique['Label_Update'], unique['Label']))
+    # IDC names of outages end with a ' '
+    mapping_df = mapping_df.drop_duplicates('IDC_Name')
+    index['IDC_Name'] = dict(zip(mapping_df['IDC_Name'] + ' ', mapping_df['Label']))
+    return index
+
+
+def get_label_index(key, branch_df, mapping_df):
+    """
+    build_label_index, cached for the life of the process by key, e.g. (Com_Model_Name, mapping Market_Date)
+    """
+    with _lock:
+        if key not in _indexes:
+            _indexes.clear()
+            _indexes[key] = build_label_index(branch_df, mapping_df)
+        return _indexes[key]
+
+
+def resolve_labels(outage_df, index):
+    """
+    Label of every outage from the first alias of LABEL_PRIORITY that matches it, NaN if none does,
+    and the alias it came from ('Outage' for the Label the outage already has)
+    """
+    labels = pd.Series(np.nan, index=outage_df.index, dtype=object)
+    sources = pd.Series(np.nan, index=outage_df.index, dtype=object)
+    for alias, column in LABEL_PRIORITY:
+        if column not in outage_df.columns:
+            continue
+        found = outage_df[column] if alias is None else outage_df[column].map(index[alias])
+        fill = labels.isna() & found.notna()
+        labels[fill] = found[fill]
+        sources[fill] = 'Outage' if alias is None else alias
+    return labels, sources
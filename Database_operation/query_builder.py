@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+# Values per IN list statement, SQL Server takes at most 2100 parameters in one statement
+IN_LIST_BATCH_SIZE = 1000
+
+
+def as_statement(select_sql, params=None):
+    """
+    SQL strings run with params as SQLAlchemy text, so their :name placeholders bind. Without params a string is
+    returned as it is (a literal like '00:00' is not a placeholder), as are statements that are already built
+    """
+    return text(select_sql) if params is not None and isinstance(select_sql, str) else select_sql
+
+
+def in_list(name, values):
+    """
+    Placeholders ':name_0, :name_1, ...' and their params for an IN list.
+    The list is padded with its last value to the next power of two, so the server caches one plan per size
+    bucket instead of one per list length
+    """
+    values = list(values)
+    size = 1 << (len(values) - 1).bit_length()
+    values = values + values[-1:] * (size - len(values))
+    placeholders = ', '.join(':{}_{}'.format(name, i) for i in range(size))
+    return placeholders, {'{}_{}'.format(name, i): value for i, value in enumerate(values)}
+
+
+def in_list_batches(select_sql, name, values, params=None, batch_size=IN_LIST_BATCH_SIZE):
+    """
+    (statement, params) for each batch of values of a query with an IN ({name}) list, e.g.
+    "SELECT * FROM [dbo].[Load_PJMHourlyDerationFactor] WHERE LocaleName IN ({locale_names})"
+    """
+    values = list(dict.fromkeys(values))
+    for start in range(0, len(values), batch_size):
+        placeholders, in_params = in_list(name, values[start:start + batch_size])
+        yield text(select_sql.replace('{' + name + '}', placeholders)), {**(params or {}), **in_params}
@@ -9,9 +9,15 @@ import regex as re
 import Automation as auto
 import camelot
 import pytz
+import sys
 import db_operations as dbop
+import crosscheck
+import zone_resolver
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import reconcile
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,6 +27,12 @@ logging.basicConfig(
 )
 logging.getLogger('camelot').setLevel(logging.WARNING)
 
+# Zone labels of the 5CP PLC and NSPL tables that differ from the LocaleName
+PLC_ZONE_INDEX = zone_resolver.build_zone_index({'Vineland': 'VINELAND', 'DAYTON': 'DAY', 'DLCo': 'DUQ', 'PENLC': 'PENELEC', 'PL': 'PPL',
+                                                 'PS': 'PSEG', 'PJM RTO': 'PJM_RTO'})
+NSPL_ZONE_INDEX = zone_resolver.build_zone_index({'DAYTON': 'DAY', 'DLCo': 'DUQ', 'PENLC': 'PENELEC', 'PL': 'PPL', 'PS': 'PSEG',
+                                                  'PPL-EU': 'PPL', 'PJM RTO': 'PJM_RTO', 'Vineland': 'VINELAND'})
+
 
 def find_target_files_path(folder_path, keywords):
     file_paths = {}
@@ -151,11 +163,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
             df1.loc[df1['temp'] != '', 'VolumeLevel'] = df1.loc[df1['temp'] != '', 'temp']
 
             df1 = df1.drop('temp', axis=1)
-            mapping_dict = {'Vineland': 'VINELAND', 'DAYTON': 'DAY', 'DLCo': 'DUQ', 'PENLC': 'PENELEC', 'PL': 'PPL', 'PS': 'PSEG', 'PJM RTO':'PJM_RTO'}
-            for idx in df1.index:
-                zone = df1.loc[idx, 'LocaleName']
-                if zone in mapping_dict:
-                    df1.loc[idx, 'LocaleName'] = mapping_dict[zone]
+            df1['LocaleName'] = zone_resolver.resolve_zones(df1['LocaleName'], PLC_ZONE_INDEX)
 
             df1['VolumeType'] = 'PLC_Annual'
             df1['VolumeComment'] = 'average'
@@ -174,12 +182,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
 
             df2 = df2.iloc[1:]
 
-            mapping_dict = {'DAYTON': 'DAY', 'DLCo': 'DUQ', 'PENLC': 'PENELEC', 'PL': 'PPL', 'PS': 'PSEG',
-                            'PPL-EU': 'PPL', 'PJM RTO':'PJM_RTO', 'Vineland': 'VINELAND'}
-            for idx in df2.index:
-                zone = df2.loc[idx, 'LocaleName']
-                if zone in mapping_dict:
-                    df2.loc[idx, 'LocaleName'] = mapping_dict[zone]
+            df2['LocaleName'] = zone_resolver.resolve_zones(df2['LocaleName'], NSPL_ZONE_INDEX)
 
             df2_final = pd.DataFrame()
             for i in range(1, 6):
@@ -223,35 +226,28 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
         df_processed.sort_values(by=['FlowMonth', 'LocaleName', 'VolumeType'], ignore_index=True)
 
         logging.info('Checking Data')
-        # download data from database for crosscheck:
-        conn, engine = dbop.db_connect('LoadStaging')
-        df_database = pd.read_sql('select * from [dbo].[Load_PJMPLCNSPL] where VolumeType != \'NSPL_Volume\'', conn)
-        conn.close()
-        df_database['FlowMonth'] = pd.to_datetime(df_database['FlowMonth']).dt.strftime('%Y-%m-%d')
         # Output data check
         warning_messages = data_check(df_processed, warning_messages)
 
-        # Data Crosscheck
-        df_merged = df_processed.merge(df_database, on=['FlowMonth', 'LocaleName', 'VolumeType'], how='outer', indicator=True, suffixes=('_output', '_db'))
-        df_match = df_merged[df_merged['_merge'] == 'both'].copy()
-        df_match['volume_diff'] = df_match['VolumeLevel_output'] - df_match['VolumeLevel_db']
-        df_mismatch = df_match[abs(df_match['volume_diff']) > 1]
-        if not df_mismatch.empty:
-            for index, row in df_mismatch.iterrows():
-                missing_time = row['FlowMonth']
-                locale_name = row['LocaleName']
-                volume_type = row['VolumeType']
-                print(f'Find data mismatch in {missing_time} {locale_name} {volume_type}')
-                warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {missing_time} {locale_name} {volume_type}')
-
-        df_update = df_merged[df_merged['_merge'] == 'left_only'].copy()
-        df_dbonly = df_merged[df_merged['_merge'] == 'right_only'].copy()
-
-        if pd.to_datetime(df_update['FlowMonth']).min() <= pd.to_datetime(df_database['FlowMonth']).max():
-            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= pd.to_datetime(df_database['FlowMonth']).max()]
+        # Data Crosscheck on the database server: processed rows are staged there and only the change set comes back
+        conn, engine = dbop.db_connect('LoadStaging')
+        df_diff, database_max = crosscheck.server_diff(conn, 'Load_PJMPLCNSPL', df_processed,
+                                                       ['FlowMonth', 'LocaleName', 'VolumeType'], ['VolumeLevel'],
+                                                       {'VolumeLevel': 1}, excludes={'VolumeType': 'NSPL_Volume'},
+                                                       suffixes=('_output', '_db'))
+        conn.close()
+        for label in reconcile.describe(df_diff[df_diff['Status'] == reconcile.CHANGED], ['FlowMonth', 'LocaleName', 'VolumeType']):
+            print(f'Find data mismatch in {label}')
+            warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {label}')
+
+        df_update = df_diff[df_diff['Status'] == reconcile.NEW].copy()
+        df_dbonly = df_diff[df_diff['Status'] == reconcile.DELETED].copy()
+
+        if pd.to_datetime(df_update['FlowMonth']).min() <= database_max:
+            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= database_max]
             conflict_locale = df_conflict['LocaleName'].unique()
             conflict_start = pd.to_datetime(df_update['FlowMonth']).min().strftime('%Y-%m-%d')
-            conflict_end = pd.to_datetime(df_database['FlowMonth']).max().strftime('%Y-%m-%d')
+            conflict_end = database_max.strftime('%Y-%m-%d')
 
             print(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
             warning_messages.append(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
@@ -273,7 +269,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
             'VolumeLevel': df_update['VolumeLevel_output'],
             'VolumeType': df_update['VolumeType'],
             'VolumeUnit': 'MW',
-            'VolumeComment': df_update['VolumeComment_output']
+            'VolumeComment': df_update['VolumeComment']
         }
         df_update = pd.DataFrame(data_update)
 
@@ -4,9 +4,14 @@ import os
 import regex as re
 import Automation as auto
 import numpy as np
+import sys
 import db_operations as dbop
+import crosscheck
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import reconcile
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -158,36 +163,29 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
         }
         df_processed = pd.DataFrame(data_processed)
 
-        # download data from database for crosscheck:
-        conn, engine = dbop.db_connect('LoadStaging')
-        df_database = pd.read_sql('select * from [dbo].[Load_PJMMonthlyPriceHist] where PriceType = \'BlackStartRevenue\'', conn)
-        conn.close()
-
-        df_database['FlowMonth'] = pd.to_datetime(df_database['FlowMonth']).dt.strftime('%Y-%m-%d')
-
         # Output data check
         logging.info('Checking Data')
         warning_messages = data_check(df_processed, warning_messages)
 
-        df_merged = df_processed.merge(df_database, on=['FlowMonth', 'LocaleName'], how='outer', indicator=True, suffixes=('_output', '_db'))
-        df_match = df_merged[df_merged['_merge'] == 'both'].copy()
-        df_match['PriceLevel_diff'] = df_match['PriceLevel_output'] - df_match['PriceLevel_db']
-        df_mismatch = df_match[abs(df_match['PriceLevel_diff']) > 1]
-        if not df_mismatch.empty:
-            for index, row in df_mismatch.iterrows():
-                missing_time = row['FlowMonth']
-                locale_name = row['LocaleName']
-                print(f'Find data mismatch in {missing_time} {locale_name}')
-                warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {missing_time} {locale_name}')
-
-        df_update = df_merged[df_merged['_merge'] == 'left_only'].copy()
-        df_dbonly = df_merged[df_merged['_merge'] == 'right_only'].copy()
-
-        if pd.to_datetime(df_update['FlowMonth']).min() <= pd.to_datetime(df_database['FlowMonth']).max():
-            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= pd.to_datetime(df_database['FlowMonth']).max()]
+        # Data Crosscheck on the database server: processed rows are staged there and only the change set comes back
+        conn, engine = dbop.db_connect('LoadStaging')
+        df_diff, database_max = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df_processed,
+                                                       ['FlowMonth', 'LocaleName'], ['PriceLevel'],
+                                                       {'PriceLevel': 1}, filters={'PriceType': 'BlackStartRevenue'},
+                                                       suffixes=('_output', '_db'))
+        conn.close()
+        for label in reconcile.describe(df_diff[df_diff['Status'] == reconcile.CHANGED], ['FlowMonth', 'LocaleName']):
+            print(f'Find data mismatch in {label}')
+            warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {label}')
+
+        df_update = df_diff[df_diff['Status'] == reconcile.NEW].copy()
+        df_dbonly = df_diff[df_diff['Status'] == reconcile.DELETED].copy()
+
+        if pd.to_datetime(df_update['FlowMonth']).min() <= database_max:
+            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= database_max]
             conflict_locale = df_conflict['LocaleName'].unique()
             conflict_start = pd.to_datetime(df_update['FlowMonth']).min().strftime('%Y-%m-%d')
-            conflict_end = pd.to_datetime(df_database['FlowMonth']).max().strftime('%Y-%m-%d')
+            conflict_end = database_max.strftime('%Y-%m-%d')
 
             print(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
             warning_messages.append(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
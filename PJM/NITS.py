@@ -5,9 +5,15 @@ from datetime import datetime
 import regex as re
 import pdfplumber
 import Automation as auto
+import sys
 import db_operations as dbop
+import crosscheck
+import zone_resolver
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import reconcile
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,6 +23,11 @@ logging.basicConfig(
 )
 logging.getLogger('camelot').setLevel(logging.WARNING)
 
+# Short transmission owner names in brackets that differ from the LocaleName
+OWNER_ZONE_INDEX = zone_resolver.build_zone_index({'CE': 'COMED', 'DLCO': 'DUQ', 'METED, PENELEC': 'MAIT'})
+# 2022 short names
+ZONE_2022_INDEX = zone_resolver.build_zone_index({'AEC': 'AECO', 'Dayton': 'DAY', 'DL': 'DUQ', 'Dominion': 'DOM', 'RE': 'RECO', 'ComEd': 'COMED'})
+
 
 def find_target_files_path(folder_path, keywords):
     file_paths = {}
@@ -43,6 +54,33 @@ def check_continuity(df, date_column, table_name):
 
     return message
 
+def normalize_zone(owner):
+    # Take the short name in brackets, e.g. 'Commonwealth Edison (CE)' -> 'CE', and resolve it to its LocaleName
+    zone = owner.str.extract(r'\(\s*([^)]+)\s*\)', expand=False).fillna(owner)
+    return zone_resolver.resolve_zones(zone, OWNER_ZONE_INDEX)
+
+
+def consolidate_zones(df, value_columns):
+    # Sum the rows of zones listed with several transmission owners into one row per zone
+    return df.groupby('Zone', sort=False)[value_columns].sum(min_count=1).reset_index()
+
+
+def backfill_missing_months(df, existing_months, all_months):
+    # Copy the rates of the latest published month into every following month without a publication
+    existing_months = pd.DatetimeIndex(pd.to_datetime(existing_months)).unique()
+    missing_months = pd.DatetimeIndex(all_months).difference(existing_months)
+
+    source_month = pd.Series(existing_months, index=existing_months).reindex(existing_months.union(missing_months)).ffill()
+    source_month = source_month.reindex(missing_months).dropna()
+    month_map = pd.DataFrame({'FlowMonth': source_month.index.strftime('%Y-%m-%d'),
+                              'SourceMonth': source_month.dt.strftime('%Y-%m-%d').to_numpy()})
+
+    new_rows = month_map.merge(df.rename(columns={'FlowMonth': 'SourceMonth'}), on='SourceMonth')
+    new_rows = new_rows.drop(columns='SourceMonth')[df.columns]
+
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
 def data_check(df_processed, warning_messages):
     df_processed = df_processed.copy()
     df_processed['FlowMonth'] = pd.to_datetime(df_processed['FlowMonth'])
@@ -206,20 +244,11 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
                             df_i['FilteredComment'] = df_i['Comment'].str.replace('[^\d.]', '', regex=True)
                             df_i['FilteredLevel'] = df_i['Level'].str.replace('[^\d.]', '', regex=True)
 
-                            for idx in df_i.index:
-                                zone = df_i.loc[idx, 'Transmission Owner']
-                                match = re.search(r'\(\s*([^)]+)\s*\)', zone)
-                                if match:
-                                    df_i.loc[idx, 'Zone'] = match.group(1)
-                                else:
-                                    df_i.loc[idx, 'Zone'] = zone
+                            df_i['Zone'] = normalize_zone(df_i['Transmission Owner'])
 
                             df_i = df_i.drop(['Comment', 'Level'], axis=1)
                             df_i['FilteredComment'] = df_i['FilteredComment'].astype(float)
                             df_i['FilteredLevel'] = df_i['FilteredLevel'].astype(float)
-                            df_i.loc[df_i['Zone'] == 'CE', 'Zone'] = 'COMED'
-                            df_i.loc[df_i['Zone'] == 'DLCO', 'Zone'] = 'DUQ'
-                            df_i.loc[df_i['Zone'] == 'METED, PENELEC', 'Zone'] = 'MAIT'
 
                             dom_index = df_i[df_i['Zone'] == 'DOM'].index
                             df_i.iloc[dom_index[0], df_i.columns.get_loc('FilteredComment')] += df_i.iloc[dom_index[1], df_i.columns.get_loc('FilteredComment')]
@@ -291,15 +320,9 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
                             indices_with_all_none = df_i[rows_with_all_none].index
                             df_i = df_i.drop(indices_with_all_none, axis=0)
 
-                            # 2022:
-                            df_i.loc[df_i['Zone'] == 'AEC', 'Zone'] = 'AECO'
-                            df_i.loc[df_i['Zone'] == 'Dayton', 'Zone'] = 'DAY'
-                            df_i.loc[df_i['Zone'] == 'DL', 'Zone'] = 'DUQ'
-                            df_i.loc[df_i['Zone'] == 'Dominion', 'Zone'] = 'DOM'
-                            df_i.loc[df_i['Zone'] == 'RE', 'Zone'] = 'RECO'
+                            # 2022 short names and Locale = 'ComEd':
+                            df_i['Zone'] = zone_resolver.resolve_zones(df_i['Zone'], ZONE_2022_INDEX)
 
-                            # Locale = 'ComEd':
-                            df_i.loc[df_i['Zone'] == 'ComEd', 'Zone'] = 'COMED'
                             # Locale = 'PENELEC':
                             df_i.loc[df_i['Zone'] == 'PENELEC', 'Comment'] = df_i.loc[df_i['Zone'] == 'ME', 'Comment'].values[0]
                             # make all str to be float:
@@ -307,15 +330,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
                             df_i['Level'] = df_i['Level'].replace('[\$, ]', '', regex=True).astype(float)
                             df_i['Zone'] = df_i['Zone'].ffill()
 
-                            consolidated_rows = []  # List to hold all the data frames or series
-                            for zone in df_i['Zone'].unique():
-                                temp_df = df_i[df_i['Zone'] == zone]
-                                sum_data = temp_df.sum(numeric_only=True, min_count=1)
-                                result_row = pd.Series(sum_data, index=temp_df.columns[1:])
-                                result_row['Zone'] = zone
-                                consolidated_rows.append(pd.DataFrame([result_row]))
-
-                            new_df_i = pd.concat(consolidated_rows, ignore_index=True)
+                            new_df_i = consolidate_zones(df_i, ['Level', 'Comment'])
                             new_df_i['Level'] = new_df_i['Level'].round(2)
                             new_df_i = new_df_i[['Zone', 'Level', 'Comment']]
 
@@ -338,29 +353,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
                     else:
                         all_months = pd.date_range(start=df_time['Date'].iloc[0], end=f'{year}-12-01', freq='MS')
 
-                    existing_months = df_time_total['Date'].unique()
-                    existing_months = existing_months.strftime('%Y-%m-%d')
-                    missing_months = all_months.difference(existing_months)
-                    missing_months = missing_months.strftime('%Y-%m-%d')
-
-                    new_rows = pd.DataFrame()
-                    year_total = res_per_year.copy()
-
-                    for i, j in enumerate(existing_months):
-                        temp = year_total[year_total['FlowMonth'] == j]
-                        next_month = existing_months[i + 1] if i + 1 < len(existing_months) else None
-                        for missing_month in missing_months:
-                            if next_month and missing_month > j and missing_month < next_month:
-                                temp_copy = temp.copy()
-                                temp_copy['FlowMonth'] = missing_month
-                                new_rows = pd.concat([new_rows, temp_copy])
-                            elif not next_month:
-                                if missing_month > j:
-                                    temp_copy = temp.copy()
-                                    temp_copy['FlowMonth'] = missing_month
-                                    new_rows = pd.concat([new_rows, temp_copy])
-
-                    year_total = pd.concat([year_total, pd.DataFrame(new_rows)], ignore_index=True)
+                    year_total = backfill_missing_months(res_per_year, df_time_total['Date'], all_months)
                     year_total = year_total.sort_values(by=['FlowMonth','LocaleName'], ascending=[True,True])
 
                     if year != str(current_year):
@@ -394,37 +387,26 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
         logging.info('Checking Data')
         warning_messages = data_check(df_processed, warning_messages)
 
-        # Data Crosscheck
+        # Data Crosscheck on the database server: processed rows are staged there and only the change set comes back
         conn,engine = dbop.db_connect('LoadStaging')
-        df_database = pd.read_sql('select * from [dbo].[Load_PJMMonthlyPriceHist] where PriceType = \'NITSRevenue\'',conn)
+        df_diff, database_max = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df_processed,
+                                                       ['FlowMonth', 'LocaleName', 'PriceType', 'PriceUnit'], ['PriceLevel', 'PriceComment'],
+                                                       {'PriceLevel': 1, 'PriceComment': 1}, filters={'PriceType': 'NITSRevenue'},
+                                                       suffixes=('_output', '_db'), inclusive=True)
         conn.close()
-        df_database['FlowMonth'] = pd.to_datetime(df_database['FlowMonth']).dt.strftime('%Y-%m-%d')
-
-        # Data Crosscheck
-        df_merged = df_processed.merge(df_database, on=['FlowMonth', 'LocaleName', 'PriceType', 'PriceUnit'], how='outer',
-                                       indicator=True, suffixes=('_output', '_db'))
-        df_match = df_merged[df_merged['_merge'] == 'both'].copy()
-        df_match['PriceLevel_diff'] = df_match['PriceLevel_output'] - df_match['PriceLevel_db']
-        df_match['PriceComment_diff'] = df_match['PriceComment_output'] - df_match['PriceComment_db'].astype(float)
-
-        df_mismatch = df_match[~((abs(df_match['PriceComment_diff']) < 1) & (abs(df_match['PriceLevel_diff']) < 1))]
-
-        if not df_mismatch.empty:
-            for index, row in df_mismatch.iterrows():
-                missing_time = row['FlowMonth']
-                locale_name = row['LocaleName']
-                print(f'Find data mismatch in {missing_time} {locale_name}')
-                warning_messages.append(
-                    f'Data Mismatch Warning: Find data mismatch in {missing_time} {locale_name}')
-
-        df_update = df_merged[df_merged['_merge'] == 'left_only'].copy()
-        df_dbonly = df_merged[df_merged['_merge'] == 'right_only'].copy()
-
-        if pd.to_datetime(df_update['FlowMonth']).min() <= pd.to_datetime(df_database['FlowMonth']).max():
-            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= pd.to_datetime(df_database['FlowMonth']).max()]
+        # A difference of 1 or more, or a missing value, is a mismatch
+        for label in reconcile.describe(df_diff[df_diff['Status'] == reconcile.CHANGED], ['FlowMonth', 'LocaleName']):
+            print(f'Find data mismatch in {label}')
+            warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {label}')
+
+        df_update = df_diff[df_diff['Status'] == reconcile.NEW].copy()
+        df_dbonly = df_diff[df_diff['Status'] == reconcile.DELETED].copy()
+
+        if pd.to_datetime(df_update['FlowMonth']).min() <= database_max:
+            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= database_max]
             conflict_locale = df_conflict['LocaleName'].unique()
             conflict_start = pd.to_datetime(df_update['FlowMonth']).min().strftime('%Y-%m-%d')
-            conflict_end = pd.to_datetime(df_database['FlowMonth']).max().strftime('%Y-%m-%d')
+            conflict_end = database_max.strftime('%Y-%m-%d')
 
             print(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
             warning_messages.append(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
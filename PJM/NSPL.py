@@ -6,9 +6,15 @@ import Automation as auto
 import pdfplumber
 import camelot
 import pytz
+import sys
 import db_operations as dbop
+import crosscheck
+import zone_resolver
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import reconcile
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,6 +24,9 @@ logging.basicConfig(
 )
 logging.getLogger('camelot').setLevel(logging.WARNING)
 
+# Special cases in naming that the transmission zone table cannot map
+SPECIAL_NAME_INDEX = zone_resolver.build_zone_index({'ComEd': 'COMED', 'Dominion': 'DOM', 'Duke Energy OHKY': 'DEOK'})
+
 
 
 def find_target_files_path(folder_path, keywords):
@@ -72,26 +81,6 @@ def data_check(df_processed, warning_messages):
     return warning_messages
 
 
-def find_locale_name(check_value, df_map_total):
-    """
-    Searches a DataFrame for a row where the 'check_value' is a substring of the 'Cleaned' column.
-
-    Parameters:
-    - check_value (str): The substring to search for within the 'Cleaned' column of df_map_total (a predefined df to store mapping info).
-
-    Returns:
-    - str: The 'LocaleName' of the matching row if a row is found where the substring matches.
-    - None: Returns None if no matching row is found.
-    """
-    words = check_value.split()
-    pattern = '.*'.join(map(re.escape, words))
-    for _, row in df_map_total.iterrows():
-        # Search for the pattern in 'Cleaned', checking if the words appear in order
-        if re.search(pattern, row['Cleaned'], re.IGNORECASE):
-            return row['LocaleName']
-    return None
-
-
 def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
     try:
         logging.info('Starting ETL Process for NSPL')
@@ -128,6 +117,7 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
 
         res = pd.DataFrame()
         df_map_total = pd.DataFrame()
+        zone_index = None
         downloaded_pdf_paths.sort(reverse=True)
         '''
         Read-in data and formatting starts
@@ -211,21 +201,13 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
                     correction_DAY2 = df[df['Zone'] == 'Dayton']['Zonal Peak (MW)'][22]
                     df = df[:-3]
 
-                # Mapping takes place
-                df['Check'] = df['Zone'].str.replace(r'[^a-zA-Z0-9 ]', '', regex=True)
-                df['Zone'] = df['Check']
-                df['LocaleName'] = df['Check'].apply(lambda x: find_locale_name(x, df_map_total))
-                df = pd.merge(df, df_map_total, on='LocaleName', how='left')
-
-                # Special cases in naming that cannot be directly mapped
-                for i in range(len(df)):
-                    if df['LocaleName'].iloc[i] is None:
-                        df['LocaleName'].iloc[i] = df['Zone'].iloc[i]
-                    if df['LocaleName'].iloc[i] in ['ComEd','Dominion','Duke Energy OHKY']:
-                        special_name_map = {'ComEd': 'COMED', 'Dominion': 'DOM', 'Duke Energy OHKY': 'DEOK'}
-                        df['LocaleName'].iloc[i] = special_name_map[df['LocaleName'].iloc[i]]
+                # Mapping takes place: each distinct zone is resolved once against the current year's transmission zone names
+                if zone_index is None:
+                    zone_index = zone_resolver.build_zone_index(dict(zip(df_map_total['Cleaned'], df_map_total['LocaleName'])))
+                df['Zone'] = df['Zone'].str.replace(r'[^a-zA-Z0-9 ]', '', regex=True)
+                df['LocaleName'] = zone_resolver.resolve_zones(df['Zone'], zone_index, fuzzy=True, rename_index=SPECIAL_NAME_INDEX)
 
-                df.drop(columns=['Zone', 'Check', 'Cleaned'], inplace=True)
+                df.drop(columns=['Zone'], inplace=True)
 
                 df['Hour Ending (Eastern Prevailing Time)'] = df['Hour Ending (Eastern Prevailing Time)'].str.strip().replace(r'\s+', ' ', regex=True)
                 split_df = df['Hour Ending (Eastern Prevailing Time)'].str.split(' ', expand=True)
@@ -294,36 +276,29 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
         }
         df_processed = pd.DataFrame(data_processed)
 
-        # download data from database for crosscheck:
-        conn,engine = dbop.db_connect('LoadStaging')
-        df_database = pd.read_sql('select * from [dbo].[Load_PJMPLCNSPL] WHERE VolumeType = \'NSPL_Volume\'',conn)
-        conn.close()
-
-        df_database['FlowMonth'] = pd.to_datetime(df_database['FlowMonth']).dt.strftime('%Y-%m-%d')
         # Output data check
         logging.info('Checking Data')
         warning_messages = data_check(df_processed, warning_messages)
 
-        # Data Crosscheck
-        df_merged = df_processed.merge(df_database, on=['FlowMonth', 'LocaleName'], how='outer', indicator=True, suffixes=('_output', '_db'))
-        df_match = df_merged[df_merged['_merge'] == 'both'].copy()
-        df_match['volume_diff'] = df_match['VolumeLevel_output'] - df_match['VolumeLevel_db']
-        df_mismatch = df_match[abs(df_match['volume_diff']) > 1]
-        if not df_mismatch.empty:
-            for index, row in df_mismatch.iterrows():
-                missing_time = row['FlowMonth']
-                locale_name = row['LocaleName']
-                print(f'Find data mismatch in {missing_time} {locale_name}')
-                warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {missing_time} {locale_name}')
-
-        df_update = df_merged[df_merged['_merge'] == 'left_only'].copy()
-        df_dbonly = df_merged[df_merged['_merge'] == 'right_only'].copy()
-
-        if pd.to_datetime(df_update['FlowMonth']).min() <= pd.to_datetime(df_database['FlowMonth']).max():
-            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= pd.to_datetime(df_database['FlowMonth']).max()]
+        # Data Crosscheck on the database server: processed rows are staged there and only the change set comes back
+        conn,engine = dbop.db_connect('LoadStaging')
+        df_diff, database_max = crosscheck.server_diff(conn, 'Load_PJMPLCNSPL', df_processed,
+                                                       ['FlowMonth', 'LocaleName'], ['VolumeLevel'],
+                                                       {'VolumeLevel': 1}, filters={'VolumeType': 'NSPL_Volume'},
+                                                       suffixes=('_output', '_db'))
+        conn.close()
+        for label in reconcile.describe(df_diff[df_diff['Status'] == reconcile.CHANGED], ['FlowMonth', 'LocaleName']):
+            print(f'Find data mismatch in {label}')
+            warning_messages.append(f'Data Mismatch Warning: Find data mismatch in {label}')
+
+        df_update = df_diff[df_diff['Status'] == reconcile.NEW].copy()
+        df_dbonly = df_diff[df_diff['Status'] == reconcile.DELETED].copy()
+
+        if pd.to_datetime(df_update['FlowMonth']).min() <= database_max:
+            df_conflict = df_update[pd.to_datetime(df_update['FlowMonth']) <= database_max]
             conflict_locale = df_conflict['LocaleName'].unique()
             conflict_start = pd.to_datetime(df_update['FlowMonth']).min().strftime('%Y-%m-%d')
-            conflict_end = pd.to_datetime(df_database['FlowMonth']).max().strftime('%Y-%m-%d')
+            conflict_end = database_max.strftime('%Y-%m-%d')
 
             print(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
             warning_messages.append(f'Data Conflict Warning: Cannot find {conflict_locale} between {conflict_start} and {conflict_end} in database')
@@ -343,9 +318,9 @@ def main(extract_data=True, base_path=r"C:\Users\5DIntern3_2024\Work\PJM"):
             'FlowMonth': df_update['FlowMonth'],
             'LocaleName': df_update['LocaleName'],
             'VolumeLevel': df_update['VolumeLevel_output'],
-            'VolumeType': df_update['VolumeType_output'],
-            'VolumeUnit': df_update['VolumeUnit_output'],
-            'VolumeComment': df_update['VolumeComment_output']
+            'VolumeType': df_update['VolumeType'],
+            'VolumeUnit': df_update['VolumeUnit'],
+            'VolumeComment': df_update['VolumeComment']
         }
         df_update = pd.DataFrame(data_update)
 
@@ -0,0 +1,144 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utilities'))
+import reconcile
+
+
+def window_start(df, date_column='FlowMonth'):
+    # First period of the processed data, as the 'YYYY-MM-DD' string the FlowMonth columns are compared on
+    return pd.to_datetime(df[date_column]).min().strftime('%Y-%m-%d')
+
+
+def where_clause(filters=None, excludes=None, start=None, date_column='FlowMonth', alias=''):
+    # Shared filter of the reference table rows a crosscheck covers, as SQL plus its parameters
+    conditions = []
+    params = {}
+    for index, (column, value) in enumerate((filters or {}).items()):
+        conditions.append(f'{alias}[{column}] = :filter_{index}')
+        params[f'filter_{index}'] = value
+    for index, (column, value) in enumerate((excludes or {}).items()):
+        conditions.append(f'{alias}[{column}] != :exclude_{index}')
+        params[f'exclude_{index}'] = value
+    if start is not None:
+        conditions.append(f'{alias}[{date_column}] >= :start')
+        params['start'] = start
+
+    return conditions, params
+
+
+def fetch_crosscheck_rows(conn, table, columns, filters=None, excludes=None, start=None, end=None, locales=None,
+                          date_column='FlowMonth', locale_column='LocaleName', schema='dbo'):
+    """Read only the database rows a crosscheck compares against instead of the whole history table.
+
+    Selects `columns` of `table` where every `filters` column equals its value, every `excludes` column differs
+    from its value, `date_column` lies in [start, end] and `locale_column` is in `locales` (None skips a bound).
+    All values are sent as query parameters.
+    """
+    conditions, params = where_clause(filters, excludes, start, date_column)
+    if end is not None:
+        conditions.append(f'[{date_column}] <= :end')
+        params['end'] = end
+    if locales is not None:
+        conditions.append(f'[{locale_column}] IN :locales')
+        params['locales'] = [str(locale) for locale in locales]
+
+    select_sql = f'select {", ".join(f"[{column}]" for column in columns)} from [{schema}].[{table}]'
+    if conditions:
+        select_sql += ' where ' + ' and '.join(conditions)
+    query = text(select_sql)
+    if locales is not None:
+        query = query.bindparams(bindparam('locales', expanding=True))
+
+    df = pd.read_sql(query, conn, params=params)
+    df[date_column] = pd.to_datetime(df[date_column]).dt.strftime('%Y-%m-%d')
+
+    return df
+
+
+def stage_table_name(conn, table):
+    # Session scoped staging table: a #temp table on SQL Server, the temp schema on SQLite / DuckDB stand-ins
+    if conn.dialect.name == 'mssql':
+        return f'#stage_{table}', None, f'[#stage_{table}]'
+    return f'stage_{table}', 'temp', f'[temp].[stage_{table}]'
+
+
+def value_differs(column, tolerance=None, inclusive=False):
+    # SQL condition of a changed value. Without a tolerance the values must match, a value missing on only one side
+    # counts as changed; with one, only a difference beyond the tolerance counts (a missing value never does).
+    # inclusive: a difference of exactly the tolerance counts too, and so does a value missing on either side
+    missing = f'((s.[{column}] is null and t.[{column}] is not null) or (s.[{column}] is not null and t.[{column}] is null))'
+    if tolerance is None:
+        return f'(s.[{column}] <> t.[{column}] or {missing})'
+    if inclusive:
+        return (f'(abs(cast(s.[{column}] as float) - cast(t.[{column}] as float)) >= {float(tolerance)} '
+                f'or s.[{column}] is null or t.[{column}] is null)')
+    return f'abs(cast(s.[{column}] as float) - cast(t.[{column}] as float)) > {float(tolerance)}'
+
+
+def server_diff(conn, table, df, key_columns, value_columns, tolerances=None, filters=None, excludes=None,
+                date_column='FlowMonth', suffixes=('_new', '_old'), schema='dbo', inclusive=False):
+    """Diff processed rows against a reference table on the database server.
+
+    The key and value columns of `df` are bulk loaded into a session staging table; new, changed and deleted rows
+    (database rows of the `filters` / `excludes` slice from the first processed period on, missing from `df`) are
+    found with set based queries, so only the change set comes back. Returns the diff in the layout of
+    reconcile.diff_frames (unchanged rows left out) and the latest `date_column` of the slice in the database.
+    inclusive=True also flags differences equal to the tolerance and values missing on either side.
+    """
+    tolerances = tolerances or {}
+    stage_name, stage_schema, stage = stage_table_name(conn, table)
+    target = f'[{schema}].[{table}]'
+    staged = df[key_columns + value_columns].copy()
+    staged['StageRow'] = np.arange(len(staged))
+    staged.to_sql(stage_name, conn, schema=stage_schema, if_exists='replace', index=False, chunksize=10000)
+
+    join = ' and '.join(f's.[{column}] = t.[{column}]' for column in key_columns)
+    conditions, params = where_clause(filters, excludes, date_column=date_column, alias='t.')
+    target_slice = ' and '.join(conditions) or '1 = 1'
+    changed = ' or '.join(value_differs(column, tolerances.get(column), inclusive) for column in value_columns)
+    db_values = ', '.join(f't.[{column}] as [{column}{suffixes[1]}]' for column in value_columns)
+
+    try:
+        new_rows = pd.read_sql(text(f'select s.[StageRow] from {stage} s where not exists '
+                                    f'(select 1 from {target} t where {join} and {target_slice})'), conn, params=params)
+        changed_rows = pd.read_sql(text(f'select s.[StageRow], {db_values} from {stage} s join {target} t on {join} '
+                                        f'where {target_slice} and ({changed})'), conn, params=params)
+
+        conditions, params = where_clause(filters, excludes, window_start(df, date_column), date_column, alias='t.')
+        key_values = ', '.join(f't.[{column}]' for column in key_columns)
+        deleted_rows = pd.read_sql(text(f'select {key_values}, {db_values} from {target} t where {" and ".join(conditions)} '
+                                        f'and not exists (select 1 from {stage} s where {join})'), conn, params=params)
+
+        conditions, params = where_clause(filters, excludes, date_column=date_column)
+        latest = pd.read_sql(text(f'select max([{date_column}]) as [Latest] from {target}'
+                                  + (f' where {" and ".join(conditions)}' if conditions else '')), conn, params=params)
+    finally:
+        # The staging table is dropped even when a read fails; the reads are rolled back and the drop committed
+        if conn.in_transaction():
+            conn.rollback()
+        with conn.begin():
+            conn.execute(text(f'drop table {stage}'))
+
+    # Assemble the change set in the diff_frames layout
+    other_columns = [column for column in df.columns if column not in key_columns and column not in value_columns]
+    new_side = pd.concat([new_rows.assign(Status=reconcile.NEW), changed_rows.assign(Status=reconcile.CHANGED)], ignore_index=True)
+    new_side = new_side.sort_values(by='StageRow', ignore_index=True)
+    processed = df.iloc[new_side['StageRow']].reset_index(drop=True)
+    diff = processed[key_columns + other_columns].copy()
+    diff['Status'] = new_side['Status']
+    for column in value_columns:
+        diff[column + suffixes[0]] = processed[column]
+        diff[column + suffixes[1]] = new_side[column + suffixes[1]] if column + suffixes[1] in new_side else np.nan
+
+    deleted_rows['Status'] = reconcile.DELETED
+    deleted_rows[date_column] = pd.to_datetime(deleted_rows[date_column]).dt.strftime('%Y-%m-%d')
+    if not deleted_rows.empty:
+        diff = pd.concat([diff, deleted_rows], ignore_index=True)
+
+    columns = key_columns + ['Status'] + [column + suffix for column in value_columns for suffix in suffixes] + other_columns
+    return diff[columns], pd.to_datetime(latest['Latest'].iloc[0])
@@ -1,7 +1,7 @@
 import pandas as pd
 # import modin.pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import urllib
 import requests
 requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS = 'ALL:@SECLEVEL=1'
@@ -9,22 +9,77 @@ import os
 import os.path
 import http.client, urllib.request, urllib.parse, urllib.error, base64
 import os.path
+import sys
 from util.configUtil import ConfigUtil
+import json
+import threading
+import configparser
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# SQL statement helpers are shared with Database_operation/db_operations.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Database_operation'))
+import query_builder
 
 pd.set_option('display.max_rows', 100)
 pd.set_option('display.max_columns', 500)
 pd.set_option('display.width', 1000)
 np.set_printoptions(suppress=True)
 
-# Driver={ODBC Driver 13 for SQL Server};Server=tcp:5ddev1.database.windows.net,1433;Database=AnalysisDB;Uid={};Pwd={your_password_here};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;
-def db_connect(db=None, pool_size=None):
-    cwd = os.getcwd()
+# Engines are cached per (database, pool size) for the life of the process and only created on first use, so
+# repeated db_connect calls hand out pooled connections instead of building a new pool and TLS session each time
+_engines = {}
+_engines_lock = threading.RLock()
+# VNet IPs of the on-premise servers, only looked up when a server is unreachable by name, cached in process and
+# on local disk for VNET_TTL_SECONDS
+VNET_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vnet_ip_cache.json')
+VNET_TTL_SECONDS = 6 * 3600
+_vnet_ips = {'fetched_at': 0, 'ips': {}}
+
+
+def _reset_engines():
+    # A forked worker must not share the parent's pooled connections: every cached engine gets a new pool without
+    # closing the parent's connections, and engines with connections checked out at the fork are built again on first use
+    global _engines_lock
+    _engines_lock = threading.RLock()
+    for key, engine in list(_engines.items()):
+        checked_out = engine.pool.checkedout()
+        engine.dispose(close=False)
+        if checked_out:
+            del _engines[key]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines)
+
+
+# Connection catalog: one section per database name, parsed once at import so each lookup is a dict access
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_catalog.ini')
+ODBC_SETTINGS = [('encrypt', 'Encrypt'), ('trust_server_certificate', 'TrustServerCertificate'),
+                 ('timeout', 'Connection Timeout'), ('autocommit', 'Autocommit')]
+
+
+def load_catalog(path=CATALOG_FILE):
+    catalog = configparser.ConfigParser(interpolation=None)
+    catalog.optionxform = str
+    catalog.read(path)
+    return {name: dict(catalog[name]) for name in catalog.sections()}
+
+
+CATALOG = load_catalog()
+
+
+@functools.lru_cache(maxsize=None)
+def load_credentials():
+    # The credentials config is read once per process
     # it returns error if using ./ directly
-    basedir = os. path. dirname(__file__) + "\\"
-    m = ConfigUtil(basedir=basedir)
-    rt = m.loadConfig()
+    basedir = os.path.dirname(__file__) + "\\"
+    return ConfigUtil(basedir=basedir).loadConfig()
+
 
+def credentials(db):
+    rt = load_credentials()
     try:
         uid = rt.get(db, 'UID')
         pwd = rt.get(db, 'PWD')
@@ -36,458 +91,149 @@ def db_connect(db=None, pool_size=None):
         # if we do not have certain section in config file, we pass in default credential
         uid = rt.get('Default_Credential', 'UID')
         pwd = rt.get('Default_Credential', 'PWD')
+    return uid, pwd
+
+
+def odbc_string(entry, server, uid=None, pwd=None):
+    parts = ['Driver={}'.format(entry['driver']), 'Server={}'.format(server), 'Database={}'.format(entry['database'])]
+    if entry['auth'] == 'windows':
+        parts.append('Trusted_Connection=yes')
+    else:
+        parts += ['UId={}'.format(uid), 'Pwd={}'.format(pwd)]
+    parts += ['{}={}'.format(attribute, entry[key]) for key, attribute in ODBC_SETTINGS if key in entry]
+    return ';'.join(parts) + ';'
+
+
+def catalog_entry(db):
+    entry = CATALOG.get(db)
+    if entry is None:
+        raise KeyError('Unknown database {}, add it to {}'.format(db, CATALOG_FILE))
+    return entry
 
-    if db == 'local' or db == 'SPP':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=AnalysisDB;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'PJM':
-        # 'Used to point to FTRPJM, switched to FTRStaging'
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=FTRStaging;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-            r'Autocommit=true'
-        ).format(uid, pwd)
-    elif db == 'PJM_PathFinder':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=PathFinder;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'Daniu_PathFinder':
-        vnet_ip = get_vnetip('DESKTOP-NQ7U7IN')
-        # r'Server=desktop-nq7u7in;'
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=PathFinder_PJM;'
-            r'UId={};'
-            r'Pwd={};'.format('DESKTOP-NQ7U7IN', uid, pwd)
-        )
-    elif db == 'FTRStaging':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=FTRStaging;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'FTRPJM':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=FTRPJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'PJMSelector':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'PJM_Archive':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=FTRAnalytics;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'MISO':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=AnalysisDB;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'SE':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=SE;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'DZ_Cloud':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'ERCOT':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=FTRERCOT;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'DZ':
-        # r'Server=desktop-nq7u7in;'
-        # 5DPRINCETON1
-        vnet_ip = get_vnetip('5DPRINCETON1')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON1', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == 'DZ_PJM':
-        vnet_ip = get_vnetip('5DPRINCETON2')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON2', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == 'NODAL_PJM':
-        vnet_ip = get_vnetip(servername='5DPRINCETON2')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=NODAL_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON2', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=NODAL_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == 'ISO_PJM':
-        vnet_ip = get_vnetip(servername='5DPRINCETON03')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=ISO_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON03', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=ISO_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == 'Supplemental':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=LAMBO2;'
-            r'Database=SupplementalDB;'
-            r'Trusted_Connection=yes;'
-        )
-    elif db == 'local_server':
-        conn_str = (
-            r'Driver=ODBC Driver 13 for SQL Server;'
-            r'Server=.;'
-            r'Database=Dayzer_Input;'
-            r'Trusted_Connection=yes;'
-        )
-    elif db == 'DZP2':
-        vnet_ip = get_vnetip('5DPRINCETON2')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON2', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Output;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == '5DP1_Dayzer_Input':
-        vnet_ip = get_vnetip('5DPRINCETON1')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Input;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON1', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Input;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == '5DP2_Dayzer_Input':
-        vnet_ip = get_vnetip('5DPRINCETON2')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Input;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON2', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Dayzer_Input;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
-    elif db == 'Azure_Dayzer':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=Dayzer;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'Caiso_Staging':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=CAISOStaging;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'Ddev2_FTRPJM':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev2.database.windows.net,1433;'
-            r'Database=FTRPJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'MISO_Intern':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev3.database.windows.net,1433;'
-            r'Database=AnalysisDB;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'OTCStaging':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database=OTCStaging;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-
-    elif db in ('Load_Readonly', 'LoadStaging_Readonly', 'Load', 'LoadStaging'):
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database={};'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(db, uid, pwd)
-    elif db in ('Weather'):
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=tcp:5ddev1.database.windows.net,1433;'
-            r'Database={};'
-            r'UId={};'
-            r'Pwd={};'
-            r'Encrypt=yes;'
-            r'TrustServerCertificate=no;'
-            r'Connection Timeout=300;'
-        ).format(db, uid, pwd)
-    # elif db == 'ISO_ERCOT':
-    #     conn_str = (
-    #         r'Driver=ODBC Driver 17 for SQL Server;'
-    #         r'Server=172.16.0.136;'
-    #         r'Database=ISO_ERCOT_MIS;'
-    #         r'UId={};'
-    #         r'Pwd={};'
-    #         r'Connection Timeout=300;'
-    #     ).format(uid, pwd)
-    elif db == 'ISO_ERCOT':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=desktop-rt3bov8;'
-            r'Database=ISO_ERCOT_MIS;'
-            r'UId={};'
-            r'Pwd={};'
-            r'TrustServerCertificate=yes;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'lambo3':
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server=Lambo3;'
-            r'Database=ISO_ERCOT_MIS;'
-            r'UId={};'
-            r'Pwd={};'
-            r'TrustServerCertificate=yes;'
-            r'Connection Timeout=300;'
-        ).format(uid, pwd)
-    elif db == 'Trans_PJM':
-        vnet_ip = get_vnetip(servername='5DPRINCETON2')
-        conn_str = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Trans_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format('5DPRINCETON2', uid, pwd)
-        conn_str1 = (
-            r'Driver=ODBC Driver 17 for SQL Server;'
-            r'Server={};'
-            r'Database=Trans_PJM;'
-            r'UId={};'
-            r'Pwd={};'
-            r'Connection Timeout=300;'
-        ).format(vnet_ip, uid, pwd)
 
+def connection_string(db=None, via_vnet=False, refresh_vnet=False):
+    """
+    ODBC connection string of a database, by server name or via the VNet IP of its on-premise server
+    """
+    entry = catalog_entry(db)
+    uid, pwd = credentials(db) if entry['auth'] == 'sql' else (None, None)
+    server = get_vnetip(entry['vnet_server'], refresh=refresh_vnet) if via_vnet else entry['server']
+    return odbc_string(entry, server, uid, pwd)
+
+
+def build_engine(conn_str, pool_size=10):
     quoted_conn_str = urllib.parse.quote_plus(conn_str)
+    return create_engine('mssql+pyodbc:///?odbc_connect={}'.format(quoted_conn_str), echo_pool=True, pool_size=pool_size, max_overflow=10, pool_pre_ping=True, encoding="utf-8", fast_executemany=True)
+
+
+def get_engine(db=None, pool_size=None):
+    """
+    The process wide engine of a database, created on first use
+    """
     if pool_size is None:
         pool_size = 10
-    engine = create_engine('mssql+pyodbc:///?odbc_connect={}'.format(quoted_conn_str), echo_pool=True, pool_size=pool_size, max_overflow=10, pool_pre_ping=True, encoding="utf-8", fast_executemany=True)
-    count = 0
-    while count < 4:
+    key = (db, pool_size)
+    engine = _engines.get(key)
+    if engine is None:
+        # Re-entrant: resolving a VNet IP connects to FTRStaging while the lock is held
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = build_engine(connection_string(db), pool_size)
+    return engine
+
+
+def connect(engine, retry_num=4):
+    # A pooled connection, retrying transient failures
+    for count in range(retry_num):
         try:
-            conn = engine.connect()
-            break
-        except:
-            # print('Error creating connection {}, try again'.format(int(count)))
-            pass
-        count = count + 1
-    if (db in ('DZ', 'DZ_PJM', 'NODAL_PJM', 'ISO_PJM', 'DZP2', '5DP1_Dayzer_Input')) and count == 4:
-        quoted_conn_str = urllib.parse.quote_plus(conn_str1)
-        engine = create_engine('mssql+pyodbc:///?odbc_connect={}'.format(quoted_conn_str), echo_pool=True, pool_size=pool_size, max_overflow=10, pool_pre_ping=True, encoding="utf-8", fast_executemany=True)
-        count = 0
-        while count < 4:
+            return engine.connect()
+        except Exception as e:
+            error = e
+    raise error
+
+
+def db_connect(db=None, pool_size=None):
+    engine = get_engine(db, pool_size)
+    try:
+        conn = connect(engine)
+    except Exception:
+        # On-premise servers unreachable by name are retried via their VNet IP. The VNet engine is cached next to the
+        # engine by name, which later connects still try first; a cached IP that does not work is looked up again once
+        if 'vnet_server' not in catalog_entry(db):
+            raise
+        vnet_key = (db, 10 if pool_size is None else pool_size, 'vnet')
+        with _engines_lock:
+            engine = _engines.get(vnet_key)
             try:
-                conn = engine.connect()
-                break
-            except:
-                # print('Error creating connection {} via VNET IP, try again'.format(int(count)))
-                pass
-            count = count + 1
+                if engine is None:
+                    engine = _engines[vnet_key] = build_engine(connection_string(db, via_vnet=True), vnet_key[1])
+                conn = connect(engine)
+            except Exception:
+                if engine is not None:
+                    engine.dispose()
+                engine = _engines[vnet_key] = build_engine(connection_string(db, via_vnet=True, refresh_vnet=True),
+                                                           vnet_key[1])
+                conn = connect(engine)
     return conn, engine
 
-def get_vnetip(servername='5DPRINCETON03'):
+def load_vnet_ips(refresh=False):
+    """
+    {servername: VNet IP} of every server, from memory, the disk cache or one VNetServerHeartBeats query
+    """
+    now = time.time()
+    if not refresh and now - _vnet_ips['fetched_at'] < VNET_TTL_SECONDS:
+        return _vnet_ips['ips']
+    if not refresh and os.path.exists(VNET_CACHE_FILE):
+        try:
+            with open(VNET_CACHE_FILE) as f:
+                cached = json.load(f)
+            if now - cached['fetched_at'] < VNET_TTL_SECONDS:
+                _vnet_ips.update(cached)
+                return _vnet_ips['ips']
+        except (ValueError, KeyError, OSError):
+            pass
+
+    print("let's connect")
+    conn_temp, engine_temp = db_connect('FTRStaging')
+    heartbeats = read_sql("select servername, VNetIp from [dbo].[VNetServerHeartBeats]", conn_temp)
+    conn_temp.close()
+    # Server names compare case-insensitively, as in the database; the first row of a server wins
+    heartbeats = heartbeats.drop_duplicates(subset='servername', keep='first')
+    _vnet_ips.update({'fetched_at': now, 'ips': dict(zip(heartbeats['servername'].str.upper(), heartbeats['VNetIp']))})
+    try:
+        with open(VNET_CACHE_FILE + '.tmp', 'w') as f:
+            json.dump(_vnet_ips, f)
+        os.replace(VNET_CACHE_FILE + '.tmp', VNET_CACHE_FILE)
+    except OSError:
+        print('Warning: cannot write VNet IP cache {}'.format(VNET_CACHE_FILE))
+    return _vnet_ips['ips']
+
+
+def get_vnetip(servername='5DPRINCETON03', refresh=False):
     """
     5DPRINCETON1
     5DPRINCETON2
     5DPRINCETON03
     DESKTOP-NQ7U7IN
     """
-    print("let's connect")
-    conn_temp, engine_temp = db_connect('FTRStaging')
-    select_sql = "select VNetIp from [dbo].[VNetServerHeartBeats] where servername='{}'".format(servername)
-    vnet_ip = read_sql(select_sql, conn_temp).values[0][0]
+    vnet_ips = load_vnet_ips(refresh)
+    if servername.upper() not in vnet_ips:
+        raise KeyError('No VNet IP for server {} in VNetServerHeartBeats'.format(servername))
+    vnet_ip = vnet_ips[servername.upper()]
     print(vnet_ip)
     return vnet_ip
 
-def read_sql(select_sql=None, engine=None, retry_num=3):
+def read_sql(select_sql=None, engine=None, retry_num=3, params=None):
     """
     Replace pd.read_sql and add retry logic in it
+    With params, select_sql is a parameterized statement using :name placeholders, so the server reuses its plan
     """
     count = 0
     df = pd.DataFrame()
     while count < retry_num:
         try:
-            df = pd.read_sql(select_sql, engine)
+            df = pd.read_sql(query_builder.as_statement(select_sql, params), engine, params=params)
             break
         except Exception as e:
             time.sleep(count)
@@ -496,5 +242,122 @@ def read_sql(select_sql=None, engine=None, retry_num=3):
             raise Exception('Error running SQL')
     return df
 
+def read_sql_chunks(select_sql=None, engine=None, chunksize=100000, params=None, arrow_dtypes=False, retry_num=3):
+    """
+    Streaming read_sql: yields DataFrames of at most chunksize rows, so memory is bounded by one chunk.
+    Rows are fetched from the server cursor as the chunks are consumed. Opening the query is retried,
+    an error after the first chunk is raised as is since the rows already yielded cannot be taken back.
+    arrow_dtypes=True gives pyarrow backed columns instead of object columns for strings
+    """
+    kwargs = {'params': params, 'chunksize': chunksize}
+    if arrow_dtypes:
+        kwargs['dtype_backend'] = 'pyarrow'
+    count = 0
+    while True:
+        try:
+            chunks = pd.read_sql(query_builder.as_statement(select_sql, params), engine, **kwargs)
+            chunk = next(chunks, None)
+            break
+        except Exception as e:
+            print('Error executing SQL query {}: {}'.format(count, e))
+            count += 1
+            if count == retry_num:
+                raise Exception('Error running SQL')
+            time.sleep(count)
+    while chunk is not None:
+        yield chunk
+        chunk = next(chunks, None)
+
+def read_sql_batches(select_sql=None, engine=None, chunksize=100000, params=None, retry_num=3):
+    """
+    Streaming read_sql as Arrow record batches, one per chunk
+    """
+    import pyarrow as pa
+    for chunk in read_sql_chunks(select_sql, engine, chunksize, params, arrow_dtypes=True, retry_num=retry_num):
+        yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+def read_sql_to_parquet(select_sql=None, engine=None, path=None, chunksize=100000, params=None, retry_num=3,
+                        compression='snappy'):
+    """
+    Write a query result straight to a Parquet file, one row group per chunk, without holding the whole result.
+    Returns the number of rows written
+    """
+    import pyarrow.parquet as pq
+    rows = 0
+    writer = None
+    schema = None
+    try:
+        for batch in read_sql_batches(select_sql, engine, chunksize, params, retry_num):
+            if writer is None:
+                schema = batch.schema
+                writer = pq.ParquetWriter(path, schema, compression=compression)
+            elif not batch.schema.equals(schema):
+                # Keep every row group on the first chunk's types, a chunk where a column is all NULL can type it differently
+                batch = batch.cast(schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def partition_bounds(start, end, freq='MS'):
+    """
+    Edges of the partitions covering [start, end], split on freq boundaries (month starts by default)
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    inner = [edge for edge in pd.date_range(start, end, freq=freq) if start < edge < end]
+    return [start] + inner + [end]
+
+def read_sql_partition(select_sql, engine, params, retry_num=3):
+    # One partition on its own pooled connection; unlike read_sql a failed partition is raised, not returned empty
+    for count in range(retry_num):
+        try:
+            with engine.connect() as conn:
+                return pd.read_sql(select_sql, conn, params=params)
+        except Exception as e:
+            print('Error executing SQL query {}: {}'.format(count, e))
+            error = e
+            time.sleep(count + 1)
+    raise error
+
+def read_sql_partitioned(select_sql=None, engine=None, partition_column=None, start=None, end=None, freq='MS',
+                         params=None, max_workers=None, retry_num=3):
+    """
+    Run a large query as range partitions on partition_column (month of Datetime_beginning_utc, Market_Date, ...)
+    concurrently over the engine's pooled connections and concatenate them back in partition order.
+    Without start/end the range is the min/max of partition_column in the query result, one extra query.
+    Rows with a NULL partition_column come back as one more partition, after the ranges.
+    select_sql may use :name parameters from params; it is wrapped as a subquery, so no ORDER BY inside it.
+    Threads are enough, the ODBC driver releases the GIL while waiting on the server
+    """
+    params = dict(params or {})
+    if start is None or end is None:
+        range_sql = text('SELECT MIN(q.[{0}]) AS range_start, MAX(q.[{0}]) AS range_end FROM ({1}) AS q'.format(partition_column, select_sql))
+        range_df = read_sql_partition(range_sql, engine, params, retry_num)
+        start = range_df.iloc[0, 0] if start is None else start
+        end = range_df.iloc[0, 1] if end is None else end
+        if pd.isnull(start) or pd.isnull(end):
+            return read_sql_partition(text(select_sql), engine, params, retry_num)
+
+    bounds = partition_bounds(start, end, freq)
+    partition_sql = 'SELECT * FROM ({0}) AS q WHERE q.[{1}] >= :partition_start AND q.[{1}] {2} :partition_end'
+    partitions = []
+    for i, (partition_start, partition_end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        # Half open partitions, the last one includes end
+        last = i == len(bounds) - 2
+        partitions.append((text(partition_sql.format(select_sql, partition_column, '<=' if last else '<')),
+                           {**params, 'partition_start': partition_start.to_pydatetime(),
+                            'partition_end': partition_end.to_pydatetime()}))
+    partitions.append((text('SELECT * FROM ({0}) AS q WHERE q.[{1}] IS NULL'.format(select_sql, partition_column)), params))
+    if max_workers is None:
+        max_workers = engine.pool.size() if hasattr(engine.pool, 'size') else 4
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partitions)))) as executor:
+        dfs = list(executor.map(lambda partition: read_sql_partition(partition[0], engine, partition[1], retry_num), partitions))
+    df = pd.concat(dfs, ignore_index=True)
+    print('Read {} rows in {} partitions of {} in {:.1f}s'.format(len(df), len(partitions), partition_column, time.time() - start_time))
+    return df
+
 if __name__ == "__main__":
     print('Main')
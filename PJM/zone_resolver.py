@@ -0,0 +1,45 @@
+import pandas as pd
+import regex as re
+
+
+def clean_key(label):
+    # Normalize a zone label to its lookup key: alphanumerics only, upper case
+    return re.sub(r'[^A-Za-z0-9]', '', str(label)).upper()
+
+
+def build_zone_index(aliases):
+    """Build the cleaned alias -> LocaleName hash index of one publication's aliases.
+
+    Each publication passes its own table, so a rename of one module never applies to the labels of another.
+    Keys are cleaned, so an alias also matches its case and punctuation variants ('DLCo', 'DLCO').
+    """
+    return {clean_key(alias): locale_name for alias, locale_name in aliases.items()}
+
+
+def fuzzy_match(label, zone_index):
+    # Match the words of the label in order against the cleaned aliases, e.g. 'Atlantic City' -> 'ATLANTICCITYELECTRIC'
+    pattern = re.compile('.*'.join(map(re.escape, str(label).split())), re.IGNORECASE)
+    for key, locale_name in zone_index.items():
+        if pattern.search(key):
+            return locale_name
+    return None
+
+
+def resolve_zones(labels, zone_index, fuzzy=False, rename_index=None):
+    """Resolve a column of zone labels to LocaleNames.
+
+    Every distinct label is resolved once through the hash index (and, with `fuzzy`, an in-order word match
+    for labels the index misses). Unresolved labels are kept as they are. `rename_index` then renames the
+    result, e.g. NSPL's 'ComEd' -> 'COMED' for names its zone table does not cover.
+    """
+    resolved = {}
+    for label in pd.unique(labels.dropna()):
+        locale_name = zone_index.get(clean_key(label))
+        if locale_name is None and fuzzy:
+            locale_name = fuzzy_match(label, zone_index)
+        locale_name = label if locale_name is None else locale_name
+        if rename_index is not None:
+            locale_name = rename_index.get(clean_key(locale_name), locale_name)
+        resolved[label] = locale_name
+
+    return labels.map(resolved).where(labels.notna(), labels)
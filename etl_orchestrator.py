@@ -0,0 +1,137 @@
+"""
+Run the nightly ETL suite as one dependency graph instead of separate Task Scheduler entries.
+
+Every task is one of the existing scripts, started in its own Python process from the script's folder (so sibling
+imports and relative log files behave as when the script is run by hand). Tasks whose dependencies have finished
+run concurrently, up to `max_workers` at a time. When a task fails, every task depending on it is skipped.
+
+Usage:
+1. Update the __main__ parameters of each script (base_path, data_extract, ...) as for a standalone run
+2. Set max_workers below and run: python etl_orchestrator.py
+3. Console output of every task is written to logs/<task>.log
+"""
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# task name -> (script, tasks that must succeed first)
+TASKS = {
+    # The deration factor cache is read by every ETL that derates hourly volume
+    'deration_sync': ('Database_operation/Data_Download_from_DB.py', []),
+    'aep_oh': ('utilities/aep_oh_etl.py', ['deration_sync']),
+    'aes_oh': ('utilities/aes_oh_etl.py', ['deration_sync']),
+    'duke_oh': ('utilities/duke_oh_etl.py', ['deration_sync']),
+    'fe_oh': ('utilities/fe_oh_etl.py', ['deration_sync']),
+    'pe_md': ('utilities/pe_md_etl.py', ['deration_sync']),
+    'bge_md': ('utilities/bge_md_etl.py', []),
+    'dpl_md': ('utilities/dpl_md_etl.py', []),
+    'dpl_de': ('utilities/dpl_de_etl.py', []),
+    'pepco_md': ('utilities/pepco_md_etl.py', []),
+    'nspl': ('PJM/NSPL.py', []),
+    'nits': ('PJM/NITS.py', []),
+    'plc_scaling': ('PJM/PLCScaling.py', []),
+    '5cp': ('PJM/5coincidentpeaks.py', []),
+    'black_start': ('PJM/Black_start.py', []),
+    'reactive': ('PJM/Reactive_revenue_requirements.py', []),
+    # The crosscheck compares the 5CP output with the PLC/NSPL table refreshed by PLCScaling
+    'crosscheck': ('PJM/Crosscheck_PJM_data.py', ['plc_scaling', '5cp']),
+}
+
+
+def select_tasks(tasks, only=None):
+    # The requested tasks plus everything they depend on
+    if only is None:
+        return dict(tasks)
+    selected = {}
+    pending = list(only)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected[name] = tasks[name]
+            pending.extend(tasks[name][1])
+    return selected
+
+
+def check_graph(tasks):
+    # Fail fast on unknown dependencies and cycles (Kahn's algorithm)
+    for name, (_, depends_on) in tasks.items():
+        unknown = [dependency for dependency in depends_on if dependency not in tasks]
+        if unknown:
+            raise ValueError(f'Task {name} depends on unknown tasks {unknown}')
+
+    remaining = {name: set(depends_on) for name, (_, depends_on) in tasks.items()}
+    while remaining:
+        ready = [name for name, depends_on in remaining.items() if not depends_on]
+        if not ready:
+            raise ValueError(f'Dependency cycle between tasks {sorted(remaining)}')
+        for name in ready:
+            del remaining[name]
+        for depends_on in remaining.values():
+            depends_on.difference_update(ready)
+
+
+def run_task(name, script, log_dir):
+    # Run one script in a child process from its own folder, with its output written to logs/<task>.log
+    script_path = os.path.join(ROOT, script)
+    start = time.time()
+    with open(os.path.join(log_dir, f'{name}.log'), 'w') as log_file:
+        result = subprocess.run([sys.executable, os.path.basename(script_path)], cwd=os.path.dirname(script_path),
+                                stdout=log_file, stderr=subprocess.STDOUT)
+
+    return result.returncode, time.time() - start
+
+
+def run_graph(tasks, max_workers=4, log_dir=os.path.join(ROOT, 'logs')):
+    """Run every task once its dependencies succeeded, at most `max_workers` at a time.
+
+    Returns {task: 'success' | 'failed' | 'skipped'}.
+    """
+    check_graph(tasks)
+    os.makedirs(log_dir, exist_ok=True)
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(status) < len(tasks):
+            for name, (script, depends_on) in tasks.items():
+                if name in status or name in running.values():
+                    continue
+                if any(status.get(dependency) in ('failed', 'skipped') for dependency in depends_on):
+                    status[name] = 'skipped'
+                    print(f'{name}: skipped, a dependency did not succeed')
+                elif all(status.get(dependency) == 'success' for dependency in depends_on):
+                    print(f'{name}: started')
+                    running[executor.submit(run_task, name, script, log_dir)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, duration = future.result()
+                status[name] = 'success' if returncode == 0 else 'failed'
+                print(f'{name}: {status[name]} in {duration:.0f}s')
+
+    return status
+
+
+def main(max_workers=4, only=None):
+    status = run_graph(select_tasks(TASKS, only), max_workers)
+    failed = [name for name, result in status.items() if result != 'success']
+    if failed:
+        print(f'Warning: ETL tasks did not succeed: {failed}')
+    else:
+        print('All ETL tasks succeeded')
+
+    return status
+
+
+if __name__ == "__main__":
+    max_workers = 4
+    # None runs the whole suite; a list such as ['crosscheck'] runs those tasks and their dependencies
+    only = None
+    main(max_workers, only)
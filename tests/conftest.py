@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+# The repo is a set of script folders, their modules import each other by folder
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ['utilities', 'PJM', 'Database_operation']:
+    sys.path.append(os.path.join(ROOT, folder))
+
+
+@pytest.fixture
+def sqlite_engine():
+    # In-memory SQLite stand-in for SQL Server, with a dbo schema so [dbo].[Table] names resolve
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def attach_dbo(dbapi_connection, connection_record):
+        dbapi_connection.execute("attach database ':memory:' as dbo")
+
+    yield engine
+    engine.dispose()
@@ -0,0 +1,141 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import bulk_loader
+import reconcile
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    with sqlite_engine.begin() as conn:
+        conn.execute(text('create table dbo.Load_HourlyVolumeHist (Datetime_beginning_utc datetime not null, '
+                          'EDCName varchar(50), CustomerClass varchar(50), VolumeType varchar(50), '
+                          'EGS_HourlyVolume float, Default_HourlyVolume float, Eligible_HourlyVolume float, '
+                          'VolumeComment varchar(255))'))
+        conn.execute(text('create table dbo.Load_DailyVolumeHist (FlowDate date not null, EDCName varchar(50), '
+                          'CustomerClass varchar(50), VolumeType varchar(50), EGS_DailyVolume float, '
+                          'Default_DailyVolume float, Eligible_DailyVolume float, VolumeComment varchar(255))'))
+    return sqlite_engine
+
+
+def hourly(start, hours, customer_class, volume_type, volume=1.0):
+    times = pd.date_range(start, periods=hours, freq='h', tz='America/New_York').tz_convert('UTC')
+    return pd.DataFrame({'Datetime_beginning_utc': times, 'EDCName': 'OH_AEP', 'CustomerClass': customer_class,
+                         'VolumeType': volume_type, 'EGS_HourlyVolume': volume, 'Default_HourlyVolume': volume,
+                         'Eligible_HourlyVolume': 2 * volume, 'VolumeComment': ''})
+
+
+def daily(start, days, customer_class):
+    return pd.DataFrame({'FlowDate': pd.date_range(start, periods=days).strftime('%Y-%m-%d'), 'EDCName': 'OH_AEP',
+                         'CustomerClass': customer_class, 'VolumeType': 'PLC_Scaled', 'EGS_DailyVolume': 1.0,
+                         'Default_DailyVolume': 1.0, 'Eligible_DailyVolume': 2.0, 'VolumeComment': ''})
+
+
+def rows(engine, table):
+    with engine.connect() as conn:
+        return pd.read_sql(text(f'select * from dbo.{table} order by 1, 3, 4'), conn)
+
+
+def test_load_and_reload(engine):
+    df = pd.concat([hourly('2024-01-01', 24, 'RES', 'Wholesale'), hourly('2024-01-01', 24, 'COM', 'UFE_volume')],
+                   ignore_index=True)
+
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly')
+    assert (stats['inserted'], stats['deleted']) == (48, 0)
+    first = rows(engine, 'Load_HourlyVolumeHist')
+    assert len(first) == 48
+
+    # Re-running the same load replaces its own rows and leaves the table unchanged
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly', batch_size=10)
+    assert (stats['inserted'], stats['deleted']) == (48, 48)
+    pd.testing.assert_frame_equal(rows(engine, 'Load_HourlyVolumeHist'), first)
+
+
+def test_load_scopes_by_combination(engine):
+    bulk_loader.load_processed_data(engine, pd.concat([hourly('2024-01-01', 24, 'RES', 'UFE_volume'),
+                                                       hourly('2024-01-01', 24, 'COM', 'Wholesale')]), 'hourly')
+
+    # RES Wholesale and COM UFE_volume cover the same hours, but neither combination is in the table yet
+    stats = bulk_loader.load_processed_data(engine, pd.concat([hourly('2024-01-01', 24, 'RES', 'Wholesale'),
+                                                               hourly('2024-01-01', 24, 'COM', 'UFE_volume')]), 'hourly')
+    assert stats['deleted'] == 0
+    assert len(rows(engine, 'Load_HourlyVolumeHist')) == 96
+
+
+def test_failed_load_rolls_back(engine):
+    bulk_loader.load_processed_data(engine, daily('2024-01-01', 5, 'RES'), 'daily')
+    before = rows(engine, 'Load_DailyVolumeHist')
+
+    # The last batch violates the not null FlowDate after the slice was deleted and the first batch inserted
+    df = daily('2024-01-01', 5, 'RES')
+    df.loc[4, 'FlowDate'] = None
+    with pytest.raises(Exception):
+        bulk_loader.load_processed_data(engine, df, 'daily', batch_size=2)
+    pd.testing.assert_frame_equal(rows(engine, 'Load_DailyVolumeHist'), before)
+
+    # Loads sharing a connection commit or roll back together
+    with pytest.raises(Exception):
+        with engine.begin() as conn:
+            bulk_loader.load_processed_data(conn, hourly('2024-01-01', 24, 'RES', 'Wholesale'), 'hourly')
+            bulk_loader.load_processed_data(conn, df, 'daily')
+    assert rows(engine, 'Load_HourlyVolumeHist').empty
+    pd.testing.assert_frame_equal(rows(engine, 'Load_DailyVolumeHist'), before)
+
+
+def test_upsert(engine, monkeypatch):
+    df = pd.concat([hourly('2024-01-01', 24, 'RES', 'Wholesale'), hourly('2024-01-01', 24, 'COM', 'Wholesale')],
+                   ignore_index=True)
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly', mode='upsert')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (48, 0, 0)
+
+    # Rows read back from the table hash like the processed rows, none needs a column by column check
+    statuses = []
+    classify = reconcile.classify
+
+    def recording_classify(new_prints, old_prints):
+        result = classify(new_prints, old_prints)
+        statuses.append(result[0].copy())
+        return result
+
+    monkeypatch.setattr(reconcile, 'classify', recording_classify)
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly', mode='upsert')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 0, 48)
+    assert set(statuses[0]) == {reconcile.UNCHANGED}
+
+    df.loc[0, 'Default_HourlyVolume'] = 5.0
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly', mode='upsert')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 1, 47)
+    assert rows(engine, 'Load_HourlyVolumeHist')['Default_HourlyVolume'].sum() == 52.0
+
+
+def test_upsert_rejects_duplicate_keys(engine):
+    df = hourly('2024-01-01', 24, 'RES', 'UFE_volume')
+    with pytest.raises(ValueError):
+        bulk_loader.load_processed_data(engine, pd.concat([df, df.iloc[:1]]), 'hourly', mode='upsert')
+    assert rows(engine, 'Load_HourlyVolumeHist').empty
+
+
+def test_upsert_ignores_round_trip_noise(engine):
+    df = hourly('2024-01-01', 24, 'RES', 'Wholesale', volume=1 / 3)
+    bulk_loader.load_processed_data(engine, df, 'hourly', mode='upsert')
+
+    # A DECIMAL column or a float conversion on the way back changes only the last digits
+    with engine.begin() as conn:
+        conn.execute(text('update dbo.Load_HourlyVolumeHist set Default_HourlyVolume = Default_HourlyVolume + 1e-10'))
+    stats = bulk_loader.load_processed_data(engine, df, 'hourly', mode='upsert')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 0, 24)
+
+
+def test_load_delete_from(engine):
+    bulk_loader.load_processed_data(engine, pd.concat([daily('2024-01-01', 5, 'RES'), daily('2024-01-01', 5, 'COM')]),
+                                    'daily')
+
+    # Everything from the 3rd on is replaced, whatever its combination and whether or not the load covers it
+    stats = bulk_loader.bulk_load(engine, daily('2024-01-03', 1, 'RES'), 'Load_DailyVolumeHist', 'FlowDate',
+                                  delete_from='2024-01-03')
+    assert (stats['inserted'], stats['deleted']) == (1, 6)
+    stats = bulk_loader.bulk_load(engine, daily('2024-01-01', 0, 'RES'), 'Load_DailyVolumeHist', 'FlowDate',
+                                  delete_from='2024-01-02')
+    assert (stats['inserted'], stats['deleted']) == (0, 3)
+    assert rows(engine, 'Load_DailyVolumeHist')['FlowDate'].tolist() == ['2024-01-01', '2024-01-01']
@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import crosscheck
+import reconcile
+
+KEYS = ['FlowMonth', 'LocaleName', 'PriceType']
+VALUES = ['PriceLevel', 'PriceComment']
+
+
+def create_table(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text('create table dbo.Load_PJMMonthlyPriceHist (FlowMonth varchar(10), LocaleName varchar(50), '
+                          'PriceType varchar(50), PriceLevel float, PriceComment float)'))
+        for row in rows:
+            conn.execute(text('insert into dbo.Load_PJMMonthlyPriceHist '
+                              'values (:month, :locale, :type, :level, :comment)'), row)
+
+
+def processed(rows):
+    return pd.DataFrame(rows, columns=KEYS + VALUES + ['PriceUnit'])
+
+
+def stage_tables(conn):
+    return conn.execute(text("select name from temp.sqlite_master where name like 'stage_%'")).fetchall()
+
+
+@pytest.fixture
+def table(sqlite_engine):
+    create_table(sqlite_engine, [
+        {'month': '2024-01-01', 'locale': 'AECO', 'type': 'NITS', 'level': 10.0, 'comment': 1.0},
+        {'month': '2024-01-01', 'locale': 'BGE', 'type': 'NITS', 'level': 20.0, 'comment': 1.0},
+        {'month': '2024-01-01', 'locale': 'DPL', 'type': 'NITS', 'level': 30.0, 'comment': None},
+        {'month': '2024-01-01', 'locale': 'PECO', 'type': 'NITS', 'level': 40.0, 'comment': 1.0},
+        {'month': '2023-12-01', 'locale': 'PECO', 'type': 'NITS', 'level': 40.0, 'comment': 1.0},
+        {'month': '2024-01-01', 'locale': 'PECO', 'type': 'Other', 'level': 50.0, 'comment': 1.0},
+    ])
+    return sqlite_engine
+
+
+def test_server_diff(table):
+    df = processed([['2024-01-01', 'AECO', 'NITS', 10.5, 1.0, '$'],
+                    ['2024-01-01', 'BGE', 'NITS', 22.0, 1.0, '$'],
+                    ['2024-01-01', 'DPL', 'NITS', 30.0, 1.0, '$'],
+                    ['2024-02-01', 'AECO', 'NITS', 11.0, 1.0, '$']])
+    with table.connect() as conn:
+        diff, latest = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES,
+                                              {'PriceLevel': 1, 'PriceComment': 1}, filters={'PriceType': 'NITS'},
+                                              suffixes=('_output', '_db'))
+        assert not conn.in_transaction()
+        assert stage_tables(conn) == []
+
+    status = dict(zip(diff['LocaleName'] + ' ' + diff['FlowMonth'], diff['Status']))
+    # AECO is within the tolerance, DPL's PriceComment is NULL in the database only, which a tolerance never flags,
+    # and the PECO row before the first processed month is out of scope
+    assert status == {'BGE 2024-01-01': reconcile.CHANGED, 'AECO 2024-02-01': reconcile.NEW,
+                      'PECO 2024-01-01': reconcile.DELETED}
+    changed = diff[diff['LocaleName'] == 'BGE'].iloc[0]
+    assert (changed['PriceLevel_output'], changed['PriceLevel_db'], changed['PriceUnit']) == (22.0, 20.0, '$')
+    assert latest == pd.Timestamp('2024-01-01')
+
+
+def test_server_diff_inclusive(table):
+    df = processed([['2024-01-01', 'AECO', 'NITS', 11.0, 1.0, '$'],
+                    ['2024-01-01', 'BGE', 'NITS', 20.5, 1.0, '$']])
+    with table.connect() as conn:
+        strict, _ = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES, {'PriceLevel': 1},
+                                           filters={'PriceType': 'NITS'})
+        inclusive, _ = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES, {'PriceLevel': 1},
+                                              filters={'PriceType': 'NITS'}, inclusive=True)
+
+    assert reconcile.CHANGED not in set(strict['Status'])
+    assert inclusive.loc[inclusive['Status'] == reconcile.CHANGED, 'LocaleName'].tolist() == ['AECO']
+
+
+def test_server_diff_missing_on_one_side(table):
+    # DPL's PriceComment is NULL in the database, BGE's is missing from the processed rows
+    df = processed([['2024-01-01', 'DPL', 'NITS', 30.0, 1.0, '$'],
+                    ['2024-01-01', 'BGE', 'NITS', 20.0, None, '$']])
+    with table.connect() as conn:
+        strict, _ = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES,
+                                           {'PriceLevel': 1, 'PriceComment': 1}, filters={'PriceType': 'NITS'})
+        exact, _ = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES,
+                                          filters={'PriceType': 'NITS'})
+        inclusive, _ = crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS, VALUES,
+                                              {'PriceLevel': 1, 'PriceComment': 1}, filters={'PriceType': 'NITS'},
+                                              inclusive=True)
+
+    assert reconcile.CHANGED not in set(strict['Status'])
+    assert sorted(exact.loc[exact['Status'] == reconcile.CHANGED, 'LocaleName']) == ['BGE', 'DPL']
+    assert sorted(inclusive.loc[inclusive['Status'] == reconcile.CHANGED, 'LocaleName']) == ['BGE', 'DPL']
+
+
+def test_server_diff_drops_stage_on_error(table):
+    df = processed([['2024-01-01', 'AECO', 'NITS', 10.0, 1.0, '$']])
+    with table.connect() as conn:
+        # PriceUnit is not a column of the reference table, the first read fails
+        with pytest.raises(Exception):
+            crosscheck.server_diff(conn, 'Load_PJMMonthlyPriceHist', df, KEYS + ['PriceUnit'], VALUES)
+        assert not conn.in_transaction()
+        assert stage_tables(conn) == []
@@ -0,0 +1,39 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import deration_cache
+
+
+def create_table(engine, rows=()):
+    with engine.begin() as conn:
+        conn.execute(text('create table dbo.Load_PJMHourlyDerationFactor '
+                          '(Datetime_beginning_utc datetime, LocaleName varchar(50), DerationFactor float)'))
+        for row in rows:
+            conn.execute(text('insert into dbo.Load_PJMHourlyDerationFactor values (:time, :locale, :factor)'), row)
+
+
+def test_first_sync_of_empty_table(sqlite_engine, tmp_path):
+    create_table(sqlite_engine)
+
+    assert deration_cache.sync_deration_cache(sqlite_engine, cache_dir=str(tmp_path)) == 0
+    assert not os.path.exists(tmp_path / deration_cache.CACHE_FILE)
+    with pytest.raises(FileNotFoundError):
+        deration_cache.get_deration('APS', cache_dir=str(tmp_path))
+
+
+def test_sync_then_incremental(sqlite_engine, tmp_path):
+    create_table(sqlite_engine, [{'time': f'2024-01-01 0{hour}:00:00.000000', 'locale': locale, 'factor': 1.0 + hour}
+                                 for hour in range(3) for locale in ['APS', 'DEOK']])
+
+    assert deration_cache.sync_deration_cache(sqlite_engine, cache_dir=str(tmp_path)) == 6
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("insert into dbo.Load_PJMHourlyDerationFactor values ('2024-01-01 03:00:00.000000', 'APS', 4.0)"))
+    deration_cache.sync_deration_cache(sqlite_engine, cache_dir=str(tmp_path))
+
+    aps = deration_cache.get_deration('APS', cache_dir=str(tmp_path))
+    assert aps['DerationFactor'].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert aps['Datetime_beginning_utc'].iloc[-1] == pd.Timestamp('2024-01-01 03:00', tz='UTC')
+    assert deration_cache.sync_deration_cache(sqlite_engine, cache_dir=str(tmp_path)) == 0
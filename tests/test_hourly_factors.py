@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import hourly_factors
+
+
+def factors(start, hours, locale, value=1.0):
+    return pd.DataFrame({'Datetime_beginning_utc': pd.date_range(start, periods=hours, freq='h', tz='UTC'),
+                         'LocaleName': locale, 'DerationFactor': value})
+
+
+def volumes(start, hours):
+    return pd.DataFrame({'Datetime_beginning_utc': pd.date_range(start, periods=hours, freq='h', tz='UTC'),
+                         'Volume': 1.0})
+
+
+def test_attach_factors():
+    table = factors('2024-01-01', 4, 'AECO')
+    table.loc[2, 'DerationFactor'] = 2.0
+    store = hourly_factors.build_factor_store(table.drop(index=1), 'DerationFactor')
+
+    df = hourly_factors.attach_factors(volumes('2024-01-01', 6), 'Datetime_beginning_utc', {'DerationFactor': store})
+    # The hour missing from the table and the hours after its last one are dropped
+    assert df['DerationFactor'].tolist() == [1.0, 2.0, 1.0]
+    assert df.index.tolist() == [0, 1, 2]
+
+
+def test_attach_factors_without_factors(capsys):
+    empty = hourly_factors.build_factor_store(factors('2024-01-01', 0, 'AECO'), 'DerationFactor')
+    df = hourly_factors.attach_factors(volumes('2024-01-01', 3), 'Datetime_beginning_utc', {'DerationFactor': empty})
+    assert df.empty
+    assert 'Dropping 3 hours' in capsys.readouterr().out
+
+    # BGE has only NaN factors, PECO none at all
+    table = pd.concat([factors('2024-01-01', 3, 'AECO'), factors('2024-01-01', 3, 'BGE', np.nan)])
+    store = hourly_factors.build_factor_store(table, 'DerationFactor', locale_column='LocaleName')
+    for locale, expected in [('AECO', 3), ('BGE', 0), ('PECO', 0)]:
+        df = hourly_factors.attach_factors(volumes('2024-01-01', 3), 'Datetime_beginning_utc',
+                                           {'DerationFactor': store}, locale)
+        assert len(df) == expected
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import outage_labels
+
+
+def branches(rows):
+    return pd.DataFrame(rows, columns=['Label', 'BusNameFrom', 'BusNameTo', 'NomkVFrom', 'NomkVTo', 'Circuit'])
+
+
+def idc_name(bus_from, bus_to, kv, circuit):
+    return f'{bus_from:<12}{kv} {bus_to:<12}{kv} {circuit} '
+
+
+@pytest.fixture
+def index():
+    branch_df = branches([['BUSA-BUSB 1', 'BUSA', 'BUSB', '345.0', '345.0', '1'],
+                          ['BUSC-BUSD 2', 'BUSC', 'BUSD', '138.0', '138.0', '2'],
+                          ['LINE X1', 'BUSE', 'BUSF', '69.0', '69.0', '1'],
+                          ['LINE X2', 'BUSE', 'BUSF', '69.0', '69.0', '2'],
+                          ['', 'BUSG', 'BUSH', '69.0', '69.0', '1']])
+    mapping_df = pd.DataFrame({'IDC_Name': ['MAPPED 1', 'MAPPED 1'], 'Label': ['BUSC-BUSD 2', 'OTHER']})
+    return outage_labels.build_label_index(branch_df, mapping_df)
+
+
+def resolve(index, rows):
+    outage_df = pd.DataFrame(rows, columns=['EMS_EQUIPMENT_NAME', 'IDC_EQUIPMENT_NAME', 'Label'])
+    labels, sources = outage_labels.resolve_labels(outage_df, index)
+    return list(zip(labels.where(labels.notna(), None), sources.where(sources.notna(), None)))
+
+
+def test_build_label_index(index):
+    assert index['IDC Name_1'][idc_name('BUSA', 'BUSB', '345.0', '1')] == 'BUSA-BUSB 1'
+    assert index['IDC Name_2'][idc_name('BUSB', 'BUSA', '345.0', '1')] == 'BUSA-BUSB 1'
+    # The first mapping of a duplicated IDC name wins, a Label_Update shared by two branches is left out
+    assert index['IDC_Name'] == {'MAPPED 1 ': 'BUSC-BUSD 2'}
+    assert index['Label_Update'] == {'BUSA-BUSB': 'BUSA-BUSB 1', 'BUSC-BUSD': 'BUSC-BUSD 2'}
+    # The first of the branches sharing a Label without its branch id wins, branches without a Label are left out
+    assert index['Label_nobranchid']['LINE'] == 'LINE X1'
+    assert '' not in index['Label']
+
+
+def test_resolve_labels_priority(index):
+    assert resolve(index, [
+        # Label_Update and the IDC names built from the branch buses replace the outage's Label
+        ['BUSA-BUSB', None, 'WRONG'],
+        [None, idc_name('BUSD', 'BUSC', '138.0', '2'), 'WRONG'],
+        # The EMS-IDC mapping and the EMS name variants only fill outages without a Label
+        [None, 'MAPPED 1 ', 'KEPT'],
+        [None, 'MAPPED 1 ', None],
+        ['LINEX2', None, None],
+        ['BUSC-BUSD 2', 'MAPPED 1 ', None],
+        ['LINE X', None, None],
+    ]) == [('BUSA-BUSB 1', 'Label_Update'), ('BUSC-BUSD 2', 'IDC Name_2'), ('KEPT', 'Outage'),
+           ('BUSC-BUSD 2', 'IDC_Name'), ('LINE X2', 'Label_nospace'), ('BUSC-BUSD 2', 'IDC_Name'), (None, None)]
+
+
+def test_resolve_labels_without_columns(index):
+    # Outage files without IDC names are resolved from the EMS names only
+    outage_df = pd.DataFrame({'EMS_EQUIPMENT_NAME': ['BUSC-BUSD', 'BUSC-BUSD 2', 'UNKNOWN']})
+    labels, sources = outage_labels.resolve_labels(outage_df, index)
+    assert labels.tolist()[:2] == ['BUSC-BUSD 2', 'BUSC-BUSD 2']
+    assert sources.tolist()[:2] == ['Label_Update', 'Label']
+    assert pd.isna(labels[2])
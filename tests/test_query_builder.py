@@ -0,0 +1,39 @@
+import pandas as pd
+from sqlalchemy import text
+
+import query_builder
+
+
+def test_in_list():
+    assert query_builder.in_list('edc', ['A']) == (':edc_0', {'edc_0': 'A'})
+    # Lists are padded to the next power of two with their last value
+    placeholders, params = query_builder.in_list('edc', ['A', 'B', 'C'])
+    assert placeholders == ':edc_0, :edc_1, :edc_2, :edc_3'
+    assert params == {'edc_0': 'A', 'edc_1': 'B', 'edc_2': 'C', 'edc_3': 'C'}
+    for count, size in [(2, 2), (4, 4), (5, 8), (1000, 1024)]:
+        assert len(query_builder.in_list('edc', range(count))[1]) == size
+
+
+def test_in_list_batches(sqlite_engine):
+    select_sql = 'SELECT value FROM numbers WHERE value IN ({values}) AND value >= :low'
+    batches = list(query_builder.in_list_batches(select_sql, 'values', [1, 2, 2, 3, 4, 5, 6, 1], {'low': 2}, 2))
+    # Duplicated values are sent once, 6 values in batches of 2
+    assert [params for _, params in batches] == [
+        {'low': 2, 'values_0': 1, 'values_1': 2}, {'low': 2, 'values_0': 3, 'values_1': 4},
+        {'low': 2, 'values_0': 5, 'values_1': 6}]
+    assert str(batches[0][0]) == 'SELECT value FROM numbers WHERE value IN (:values_0, :values_1) AND value >= :low'
+    assert len(list(query_builder.in_list_batches(select_sql, 'values', range(5), batch_size=4))) == 2
+    assert list(query_builder.in_list_batches(select_sql, 'values', [])) == []
+
+    with sqlite_engine.connect() as conn:
+        conn.execute(text('create table numbers (value int)'))
+        conn.execute(text('insert into numbers values (:value)'), [{'value': value} for value in range(10)])
+        found = pd.concat([pd.read_sql(statement, conn, params=params) for statement, params in batches])
+    assert found['value'].tolist() == [2, 3, 4, 5, 6]
+
+
+def test_as_statement():
+    assert query_builder.as_statement("SELECT '00:00'") == "SELECT '00:00'"
+    statement = query_builder.as_statement('SELECT :value', {'value': 1})
+    assert str(statement) == 'SELECT :value' and not isinstance(statement, str)
+    assert query_builder.as_statement(statement, {'value': 1}) is statement
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+import reconcile
+
+KEYS = ['FlowMonth', 'LocaleName']
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=KEYS + ['PriceLevel', 'PriceComment'])
+
+
+def statuses(diff):
+    return dict(zip(diff['LocaleName'], diff['Status']))
+
+
+def test_classify():
+    new = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'BGE', 2.0, 1.0], ['2024-01-01', 'DPL', 3.0, 1.0]])
+    old = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'BGE', 2.5, 1.0], ['2024-01-01', 'PECO', 4.0, 1.0]])
+    status, deleted, position = reconcile.classify(reconcile.fingerprints(new, KEYS, ['PriceLevel', 'PriceComment']),
+                                                   reconcile.fingerprints(old, KEYS, ['PriceLevel', 'PriceComment']))
+
+    assert status.tolist() == [reconcile.UNCHANGED, reconcile.CHANGED, reconcile.NEW]
+    assert old.loc[deleted, 'LocaleName'].tolist() == ['PECO']
+    assert position.tolist() == [0, 1, -1]
+
+
+def test_classify_duplicate_old_keys():
+    # The last of the duplicated old rows is the one matched, the others are neither matched nor deleted
+    new = frame([['2024-01-01', 'AECO', 2.0, 1.0]])
+    old = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'AECO', 2.0, 1.0]])
+    status, deleted, position = reconcile.classify(reconcile.fingerprints(new, KEYS, ['PriceLevel']),
+                                                   reconcile.fingerprints(old, KEYS, ['PriceLevel']))
+
+    assert status.tolist() == [reconcile.UNCHANGED]
+    assert len(deleted) == 0
+
+    diff = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'])
+    assert diff['Status'].tolist() == [reconcile.UNCHANGED]
+    assert diff['PriceLevel_old'].tolist() == [2.0]
+
+
+def test_diff_frames():
+    new = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'BGE', 2.0, 1.0], ['2024-01-01', 'DPL', 3.0, 1.0]])
+    old = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'BGE', 2.5, 1.0], ['2024-01-01', 'PECO', 4.0, 1.0]])
+    diff = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'])
+
+    assert statuses(diff) == {'AECO': reconcile.UNCHANGED, 'BGE': reconcile.CHANGED, 'DPL': reconcile.NEW,
+                              'PECO': reconcile.DELETED}
+    assert diff.columns.tolist() == KEYS + ['Status', 'PriceLevel_new', 'PriceLevel_old', 'PriceComment']
+    bge = diff[diff['LocaleName'] == 'BGE'].iloc[0]
+    assert (bge['PriceLevel_new'], bge['PriceLevel_old']) == (2.0, 2.5)
+    assert np.isnan(diff.loc[diff['LocaleName'] == 'DPL', 'PriceLevel_old'].iloc[0])
+
+
+def test_diff_frames_tolerance():
+    old = frame([['2024-01-01', locale, 10.0, 1.0] for locale in ['AECO', 'BGE', 'DPL']])
+    new = frame([['2024-01-01', 'AECO', 10.5, 1.0], ['2024-01-01', 'BGE', 11.0, 1.0], ['2024-01-01', 'DPL', 11.5, 1.0]])
+
+    strict = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'], {'PriceLevel': 1})
+    assert statuses(strict) == {'AECO': reconcile.UNCHANGED, 'BGE': reconcile.UNCHANGED, 'DPL': reconcile.CHANGED}
+    inclusive = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'], {'PriceLevel': 1}, inclusive=True)
+    assert statuses(inclusive) == {'AECO': reconcile.UNCHANGED, 'BGE': reconcile.CHANGED, 'DPL': reconcile.CHANGED}
+
+
+def test_diff_frames_missing_values():
+    # AECO is missing on the new side only, BGE on the old side only, DPL on both
+    new = frame([['2024-01-01', 'AECO', np.nan, 1.0], ['2024-01-01', 'BGE', 2.0, 1.0], ['2024-01-01', 'DPL', np.nan, 1.0]])
+    old = frame([['2024-01-01', 'AECO', 1.0, 1.0], ['2024-01-01', 'BGE', np.nan, 1.0], ['2024-01-01', 'DPL', np.nan, 1.0]])
+
+    exact = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'])
+    assert statuses(exact) == {'AECO': reconcile.CHANGED, 'BGE': reconcile.CHANGED, 'DPL': reconcile.UNCHANGED}
+    strict = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'], {'PriceLevel': 1})
+    assert statuses(strict) == {'AECO': reconcile.UNCHANGED, 'BGE': reconcile.UNCHANGED, 'DPL': reconcile.UNCHANGED}
+    inclusive = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'], {'PriceLevel': 1}, inclusive=True)
+    assert statuses(inclusive) == {'AECO': reconcile.CHANGED, 'BGE': reconcile.CHANGED, 'DPL': reconcile.CHANGED}
+
+
+def test_diff_frames_decimals():
+    # 1.0000004 and 0.9999996 round to different values at 6 decimals but are within half a unit of the last one
+    new = frame([['2024-01-01', 'AECO', 1.0000004, 1.0], ['2024-01-01', 'BGE', 2.0, 1.0], ['2024-01-01', 'DPL', 3.0, 1.0]])
+    old = frame([['2024-01-01', 'AECO', 0.9999996, 1.0], ['2024-01-01', 'BGE', 2.00001, 1.0],
+                 ['2024-01-01', 'DPL', np.nan, 1.0]])
+
+    assert set(reconcile.diff_frames(new, old, KEYS, ['PriceLevel'])['Status']) == {reconcile.CHANGED}
+    diff = reconcile.diff_frames(new, old, KEYS, ['PriceLevel'], decimals=6)
+    assert statuses(diff) == {'AECO': reconcile.UNCHANGED, 'BGE': reconcile.CHANGED, 'DPL': reconcile.CHANGED}
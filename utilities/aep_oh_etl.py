@@ -52,9 +52,11 @@ Usage:
 1. Undate the base_path
 2. Update the data_extract to select the way of loading data: download from website ('True') or use local data ('False')
 3. If using local data, change the file names in main function to the file names of local files.
-4. Put deration factor file under the base_path, and update the name of deration factor file.
+4. Sync the deration factor cache (Database_operation/Data_Download_from_DB.py), and update the deration LocaleName.
 5. Make sure ETL report template is in base_path
-6. Run the script to process the data and report warnings
+6. Set load_to_db to also bulk load the processed hourly, daily and monthly volume into the history tables, either
+   replacing the covered period or upserting only new and changed rows (load_mode)
+7. Run the script to process the data and report warnings
 
 Automation:
 1. Use  windows task scheduler for automation
@@ -72,6 +74,15 @@ import matplotlib.dates as mdates
 from jinja2 import Environment, FileSystemLoader
 import base64
 import datetime
+import sys
+
+import bulk_loader
+import checkpoints
+import continuity
+import deration_cache
+import hourly_factors
+import incremental
+import parallel
 
 # Ignore the warning on unreadable excel header
 warnings.filterwarnings("ignore", category=UserWarning, message="Cannot parse header or footer so it will be ignored")
@@ -172,27 +183,7 @@ def process_and_download_links(excel_links, keywords, download_path):
     return downloaded_files
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
-def load_volume_data(cres_file_path, sso_file_path, pipp_file_path, deration_factor_path=None):
+def load_volume_data(cres_file_path, sso_file_path, pipp_file_path, deration_locale=None):
     # Load the raw data files
     cres_df = pd.read_excel(cres_file_path, header=4)
     sso_df = pd.read_excel(sso_file_path, header=4)
@@ -201,7 +192,7 @@ def load_volume_data(cres_file_path, sso_file_path, pipp_file_path, deration_fac
     for sheet_name in pipp_sheets:
         pipp_sheets[sheet_name] = pd.read_excel(pipp_file_path, sheet_name=sheet_name, header=5)
 
-    deration_factor = pd.read_csv(deration_factor_path) if deration_factor_path else None
+    deration_factor = deration_cache.get_deration(deration_locale) if deration_locale else None
 
     return cres_df, sso_df, pipp_sheets, deration_factor
 
@@ -238,8 +229,8 @@ def preprocess_hourly_data(cres_df, sso_df):
     sso_df["datetime_beginning_utc"] = sso_df["datetime_beginning_ept"].dt.tz_convert("UTC")
 
     # Continuity Check
-    check_continuity(cres_df, 'datetime_beginning_utc', 'H', 'CRES Hourly data')
-    check_continuity(sso_df, 'datetime_beginning_utc', 'H', 'SSO Hourly data')
+    continuity.report_gaps(continuity.find_gaps(cres_df, 'datetime_beginning_utc', 'H'), 'CRES Hourly data')
+    continuity.report_gaps(continuity.find_gaps(sso_df, 'datetime_beginning_utc', 'H'), 'SSO Hourly data')
 
     return cres_df, sso_df
 
@@ -256,8 +247,8 @@ def preprocess_monthly_data(cres_df, sso_df):
     sso_df['FlowMonth'] = pd.to_datetime(sso_df['Year'] + '-' + sso_df['Month'] + '-01').dt.strftime('%Y-%m-%d')
 
     # Continuity Check
-    check_continuity(cres_df, 'FlowMonth', 'M', 'CRES Monthly data')
-    check_continuity(sso_df, 'FlowMonth', 'M', 'SSO Monthly data')
+    continuity.report_gaps(continuity.find_gaps(cres_df, 'FlowMonth', 'M'), 'CRES Monthly data')
+    continuity.report_gaps(continuity.find_gaps(sso_df, 'FlowMonth', 'M'), 'SSO Monthly data')
 
     return cres_df, sso_df
 
@@ -300,7 +291,7 @@ def preprocess_UFE_data(UFE_df):
     UFE_df["Datetime_beginning_utc"] = UFE_df["Datetime_beginning_ept"].dt.tz_convert("UTC")
 
     # Continuity Check
-    check_continuity(UFE_df, 'Datetime_beginning_utc', 'H', 'UFE Hourly data')
+    continuity.report_gaps(continuity.find_gaps(UFE_df, 'Datetime_beginning_utc', 'H'), 'UFE Hourly data')
 
     return UFE_df
 
@@ -316,13 +307,13 @@ def process_deration_factor(deration_factor, edc_name):
     })
 
     # Continuity Check
-    check_continuity(deration_factor_df, 'Datetime_beginning_utc', 'H', 'deration_factor Hourly data')
+    continuity.report_gaps(continuity.find_gaps(deration_factor_df, 'Datetime_beginning_utc', 'H'), 'deration_factor Hourly data')
 
     return deration_factor_df
 
 
-def process_hourly_cres_data(cres_df, edc_name, deration_factor):
-    merged_df = cres_df.merge(deration_factor, left_on='datetime_beginning_utc', right_on='Datetime_beginning_utc')
+def process_hourly_cres_data(cres_df, edc_name, deration_store):
+    merged_df = hourly_factors.attach_factors(cres_df, 'datetime_beginning_utc', {'DerationFactor': deration_store})
     cres_com_ind = {
         'Datetime_beginning_utc': merged_df['datetime_beginning_utc'],
         'EDCName': edc_name,
@@ -350,8 +341,8 @@ def process_hourly_cres_data(cres_df, edc_name, deration_factor):
     return df_combined
 
 
-def process_hourly_sso_data(sso_df, edc_name, deration_factor):
-    merged_df = sso_df.merge(deration_factor, left_on='datetime_beginning_utc', right_on='Datetime_beginning_utc')
+def process_hourly_sso_data(sso_df, edc_name, deration_store):
+    merged_df = hourly_factors.attach_factors(sso_df, 'datetime_beginning_utc', {'DerationFactor': deration_store})
     sso_com_ind = {
         'Datetime_beginning_utc': merged_df['datetime_beginning_utc'],
         'EDCName': edc_name,
@@ -378,7 +369,7 @@ def process_hourly_sso_data(sso_df, edc_name, deration_factor):
     return pd.concat([sso_df_com_ind, sso_df_res], ignore_index=True)
 
 
-def process_hourly_pipp_data(pipp_sheets, edc_name, deration_factor):
+def process_hourly_pipp_data(pipp_sheets, edc_name, deration_store):
     pipp_df_list = []
     for sheet_name, sheet_df in pipp_sheets.items():
         # Convert 'Date' column to datetime format
@@ -396,7 +387,7 @@ def process_hourly_pipp_data(pipp_sheets, edc_name, deration_factor):
                                                                                         ambiguous='infer')
         sheet_df["datetime_beginning_utc"] = sheet_df["datetime_beginning_ept"].dt.tz_convert("UTC")
 
-        merged_df = sheet_df.merge(deration_factor, left_on='datetime_beginning_utc', right_on='Datetime_beginning_utc')
+        merged_df = hourly_factors.attach_factors(sheet_df, 'datetime_beginning_utc', {'DerationFactor': deration_store})
 
         pipp_data = {
             'Datetime_beginning_utc': merged_df['datetime_beginning_utc'],
@@ -414,7 +405,7 @@ def process_hourly_pipp_data(pipp_sheets, edc_name, deration_factor):
         pipp_df_list.append(pipp_df)
     combined_df = pd.concat(pipp_df_list, ignore_index=True)
     # Continuity Check
-    check_continuity(combined_df, 'Datetime_beginning_utc', 'H', 'PIPP Hourly data')
+    continuity.report_gaps(continuity.find_gaps(combined_df, 'Datetime_beginning_utc', 'H'), 'PIPP Hourly data')
 
     return combined_df
 
@@ -516,7 +507,7 @@ def process_monthly_pipp_data(pipp_sheets, edc_name):
 
     combined_df = pd.concat(pipp_df_list, ignore_index=True)
     # Continuity Check
-    check_continuity(combined_df, 'FlowMonth', 'M', 'PIPP Monthly data')
+    continuity.report_gaps(continuity.find_gaps(combined_df, 'FlowMonth', 'M'), 'PIPP Monthly data')
 
     return combined_df
 
@@ -587,7 +578,7 @@ def process_daily_PLC_data(plc_df, edc_name):
     plc_df = pd.DataFrame(output_df)
 
     # Continuity Check
-    check_continuity(plc_df, 'FlowDate', 'D', 'PLC Daily data')
+    continuity.report_gaps(continuity.find_gaps(plc_df, 'FlowDate', 'D'), 'PLC Daily data')
 
     return plc_df
 
@@ -610,7 +601,7 @@ def process_daily_NSPL_data(nspl_df, edc_name):
     nspl_df = pd.DataFrame(output_df)
 
     # Continuity Check
-    check_continuity(nspl_df, 'FlowDate', 'D', 'NSPL Daily data')
+    continuity.report_gaps(continuity.find_gaps(nspl_df, 'FlowDate', 'D'), 'NSPL Daily data')
 
     return nspl_df
 
@@ -622,7 +613,7 @@ def process_daily_PIPP_data(PIPP_daily_sheets, edc_name):
     sheet_df_1['MONTH'] = pd.to_datetime(sheet_df_1['MONTH']).dt.strftime('%Y-%m-%d')
 
     # Continuity Check
-    check_continuity(sheet_df_1, 'MONTH', 'M', 'PIPP daily data sheet 1')
+    continuity.report_gaps(continuity.find_gaps(sheet_df_1, 'MONTH', 'M'), 'PIPP daily data sheet 1')
 
     daily_volume_df_prior16 = pd.DataFrame()
     for date, PLC_volume, NSPL_volume in zip(sheet_df_1['MONTH'], sheet_df_1['PLC in MW per day'],
@@ -662,7 +653,7 @@ def process_daily_PIPP_data(PIPP_daily_sheets, edc_name):
     sheet_df_2['DATE'] = pd.to_datetime(sheet_df_2['DATE']).dt.strftime('%Y-%m-%d')
 
     # Continuity Check
-    check_continuity(sheet_df_2, 'DATE', 'D', 'PIPP daily data sheet 2')
+    continuity.report_gaps(continuity.find_gaps(sheet_df_2, 'DATE', 'D'), 'PIPP daily data sheet 2')
 
     # Create a dataframe with daily dates and corresponding volume
     pipp_PLC_df = pd.DataFrame({
@@ -818,7 +809,7 @@ def process_GovtAggr_data(GovtAggr_sheets, GovtAggr_file_path, edc_name):
                                                               ignore_index=True)
 
     # Continuity Check
-    check_continuity(GovtAggr_processed_df, 'FlowMonth', 'M', 'GovtAggr data')
+    continuity.report_gaps(continuity.find_gaps(GovtAggr_processed_df, 'FlowMonth', 'M'), 'GovtAggr data')
 
     return GovtAggr_processed_df
 
@@ -1203,8 +1194,8 @@ def save_processed_data(processed_df, output_path, data_type):
         print(f"Data processing complete. The file '{output_path}' has been created.")
 
 
-def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_AEPOHIO_RESID_AGG.csv'):
-
+def extract_data(base_path, data_extract, run_date=None):
+    # run_date only makes downloaded files expire daily in the stage fingerprint
     if data_extract:
         # Download data from aep_oh website
         print('Downloading data...')
@@ -1224,132 +1215,258 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
             downloaded_path = process_and_download_links(excel_links, keyword_dict[url], base_path)
             file_paths.update(downloaded_path)
 
-        # Update input data file path
-        cres_hourly_file_path = file_paths['CRES Hourly']
-        sso_hourly_file_path = file_paths['SSO Hourly']
-        pipp_hourly_file_path = file_paths['PIPP Hourly']
-
-        cres_monthly_file_path = file_paths['CRES Customer Counts']
-        sso_monthly_file_path = file_paths['SSO Customer Counts']
-        pipp_monthly_file_path = file_paths['PIPP Customer Counts']
-
-        plc_daily_file_path = file_paths['PLC']
-        nspl_daily_file_path = file_paths['NSPL']
-        pipp_daily_file_path = file_paths['PIPP NSPL-PLC']
-
-        ufe_file_path = file_paths['UFE']
-        govt_aggr_file_path = file_paths['Govt Aggr']
-
     else:
         # Define local file path
-        cres_hourly_file_path = f'{base_path}/CRES Hourly_aep_oh_1.xlsx'
-        sso_hourly_file_path = f'{base_path}/SSO Hourly_aep_oh_1.xlsx'
-        pipp_hourly_file_path = f'{base_path}/PIPP Hourly_aep_oh_1.xlsx'
-
-        cres_monthly_file_path = f'{base_path}/CRES Customer Counts_aep_oh_1.xlsx'
-        sso_monthly_file_path = f'{base_path}/SSO Customer Counts_aep_oh_1.xlsx'
-        pipp_monthly_file_path = f'{base_path}/PIPP Customer Counts_aep_oh_1.xlsx'
-
-        plc_daily_file_path = f'{base_path}/PLC_aep_oh_1.xls'
-        nspl_daily_file_path = f'{base_path}/NSPL_aep_oh_1.xls'
-        pipp_daily_file_path = f'{base_path}/PIPP NSPL-PLC_aep_oh_1.xls'
-        ufe_file_path = f'{base_path}/UFE_aep_oh_1.xlsx'
-        govt_aggr_file_path = f'{base_path}/Govt Aggr_aep_oh_1.xls'
-
-    deration_factor_path = f'{base_path}/{deration_factor_filename}'
-
-    # Output path
-    output_path = f'{base_path}/output_data'
-    # Create output directory if it does not exist
-    os.makedirs(output_path, exist_ok=True)
+        file_paths = {
+            'CRES Hourly': f'{base_path}/CRES Hourly_aep_oh_1.xlsx',
+            'SSO Hourly': f'{base_path}/SSO Hourly_aep_oh_1.xlsx',
+            'PIPP Hourly': f'{base_path}/PIPP Hourly_aep_oh_1.xlsx',
+            'CRES Customer Counts': f'{base_path}/CRES Customer Counts_aep_oh_1.xlsx',
+            'SSO Customer Counts': f'{base_path}/SSO Customer Counts_aep_oh_1.xlsx',
+            'PIPP Customer Counts': f'{base_path}/PIPP Customer Counts_aep_oh_1.xlsx',
+            'PLC': f'{base_path}/PLC_aep_oh_1.xls',
+            'NSPL': f'{base_path}/NSPL_aep_oh_1.xls',
+            'PIPP NSPL-PLC': f'{base_path}/PIPP NSPL-PLC_aep_oh_1.xls',
+            'UFE': f'{base_path}/UFE_aep_oh_1.xlsx',
+            'Govt Aggr': f'{base_path}/Govt Aggr_aep_oh_1.xls'
+        }
 
-    hourly_output_path = f'{output_path}/aep_oh_HourlyVolume_processed.xlsx'
-    monthly_output_path = f'{output_path}/aep_oh_CustomerCount_processed.xlsx'
-    daily_output_path = f'{output_path}/aep_oh_NSPL_PLC_processed.xlsx'
-    ufe_output_path = f'{output_path}/aep_oh_UFE_processed.xlsx'
+    return {'file_paths': file_paths}
 
-    govt_aggr_output_path = f'{output_path}/aep_oh_GovtAggr_processed.xlsx'
-    etl_report_output_path = f'{output_path}/ETL_report'
 
-    # Load data
+def load_data(file_paths, deration_locale):
     print('Loading data...')
-    cres_hourly_df, sso_hourly_df, pipp_hourly_sheets, deration_factor = load_volume_data(cres_hourly_file_path,
-                                                                                          sso_hourly_file_path,
-                                                                                          pipp_hourly_file_path,
-                                                                                          deration_factor_path)
+    cres_hourly_df, sso_hourly_df, pipp_hourly_sheets, deration_factor = load_volume_data(file_paths['CRES Hourly'],
+                                                                                          file_paths['SSO Hourly'],
+                                                                                          file_paths['PIPP Hourly'],
+                                                                                          deration_locale)
+
+    cres_monthly_df, sso_monthly_df, pipp_monthly_sheets, _ = load_volume_data(file_paths['CRES Customer Counts'],
+                                                                               file_paths['SSO Customer Counts'],
+                                                                               file_paths['PIPP Customer Counts'])
+
+    plc_df, nspl_df, pipp_daily_sheets, _ = load_volume_data(file_paths['PLC'], file_paths['NSPL'],
+                                                             file_paths['PIPP NSPL-PLC'])
+
+    return {'cres_hourly_df': cres_hourly_df, 'sso_hourly_df': sso_hourly_df, 'pipp_hourly_sheets': pipp_hourly_sheets,
+            'deration_factor': deration_factor, 'cres_monthly_df': cres_monthly_df, 'sso_monthly_df': sso_monthly_df,
+            'pipp_monthly_sheets': pipp_monthly_sheets, 'plc_df': plc_df, 'nspl_df': nspl_df,
+            'pipp_daily_sheets': pipp_daily_sheets, 'ufe_df': load_UFE_data(file_paths['UFE']),
+            'govt_aggr_sheets': load_GovtAggr_data(file_paths['Govt Aggr'])}
+
+
+def transform_hourly_branch(cres_hourly_df, sso_hourly_df, pipp_hourly_sheets, deration_factor, ufe_df, edc_name,
+                            output_path, hourly_start):
+    # Hourly volume and the UFE volume derived from it, the raw rows are trimmed to the window before any parsing
+    cres_hourly_df = incremental.trim_raw(cres_hourly_df, 'DATE', hourly_start)
+    sso_hourly_df = incremental.trim_raw(sso_hourly_df, 'DATE', hourly_start)
+    pipp_hourly_sheets = incremental.trim_sheets(pipp_hourly_sheets, 'DATE', hourly_start)
+    cres_hourly_df, sso_hourly_df = preprocess_hourly_data(cres_hourly_df, sso_hourly_df)
+    cres_hourly_df = incremental.since(cres_hourly_df, 'datetime_beginning_utc', hourly_start)
+    sso_hourly_df = incremental.since(sso_hourly_df, 'datetime_beginning_utc', hourly_start)
+    ufe_df = preprocess_UFE_data(ufe_df)
+    ufe_df = incremental.since(ufe_df, 'Datetime_beginning_utc', hourly_start)
 
-    deration_factor = deration_factor[deration_factor['LocaleName'] == 'AEPOHIO_RESID_AGG']
+    deration_factor_processed = process_deration_factor(deration_factor, edc_name)
+    # Index the deration factor by hour once; CRES, SSO and PIPP gather from it instead of merging
+    deration_store = hourly_factors.build_factor_store(deration_factor_processed, 'DerationFactor')
+    cres_hourly_processed = process_hourly_cres_data(cres_hourly_df, edc_name, deration_store)
+    sso_hourly_processed = process_hourly_sso_data(sso_hourly_df, edc_name, deration_store)
+    pipp_hourly_processed = process_hourly_pipp_data(pipp_hourly_sheets, edc_name, deration_store)
+    pipp_hourly_processed = incremental.since(pipp_hourly_processed, 'Datetime_beginning_utc', hourly_start)
+    sso_hourly_processed = decompose_hourly_data(sso_hourly_processed, pipp_hourly_processed, '2016-06-01')
 
-    cres_monthly_df, sso_monthly_df, pipp_monthly_sheets, _ = load_volume_data(cres_monthly_file_path,
-                                                                               sso_monthly_file_path,
-                                                                               pipp_monthly_file_path)
+    final_hourly_df = combine_data(cres_hourly_processed, sso_hourly_processed, pipp_hourly_processed, 'hourly')
+    ufe_processed = process_UFE_data(ufe_df, final_hourly_df, edc_name)
 
-    plc_df, nspl_df, pipp_daily_sheets, _ = load_volume_data(plc_daily_file_path, nspl_daily_file_path,
-                                                             pipp_daily_file_path)
+    # Merge the reprocessed window with the previously processed history
+    final_hourly_df = incremental.merge_with_previous(final_hourly_df, output_path, edc_name, 'hourly',
+                                                      'Datetime_beginning_utc', hourly_start)
+    ufe_processed = incremental.merge_with_previous(ufe_processed, output_path, edc_name, 'UFE',
+                                                    'Datetime_beginning_utc', hourly_start)
 
-    ufe_df = load_UFE_data(ufe_file_path)
-    govt_aggr_sheets = load_GovtAggr_data(govt_aggr_file_path)
+    return {'final_hourly_df': final_hourly_df, 'ufe_processed': ufe_processed}
 
-    print('Processing data...')
-    # Preprocess data
-    cres_hourly_df, sso_hourly_df = preprocess_hourly_data(cres_hourly_df, sso_hourly_df)
+
+def transform_monthly_branch(cres_monthly_df, sso_monthly_df, pipp_monthly_sheets, edc_name, output_path, monthly_start):
+    pipp_monthly_sheets = incremental.trim_sheets(pipp_monthly_sheets, 'MONTH', monthly_start, monthly=True)
     cres_monthly_df, sso_monthly_df = preprocess_monthly_data(cres_monthly_df, sso_monthly_df)
-    ufe_df = preprocess_UFE_data(ufe_df)
-    plc_df = handle_PLC_missing_data(plc_df, nspl_df)
-    # Process data
-    edc_name = "OH_AEP"
-    deration_factor_processed = process_deration_factor(deration_factor, edc_name)
-    cres_hourly_processed = process_hourly_cres_data(cres_hourly_df, edc_name, deration_factor_processed)
-    sso_hourly_processed = process_hourly_sso_data(sso_hourly_df, edc_name, deration_factor_processed)
-    pipp_hourly_processed = process_hourly_pipp_data(pipp_hourly_sheets, edc_name, deration_factor_processed)
-    sso_hourly_processed = decompose_hourly_data(sso_hourly_processed, pipp_hourly_processed, '2016-06-01')
+    cres_monthly_df = incremental.since(cres_monthly_df, 'FlowMonth', monthly_start)
+    sso_monthly_df = incremental.since(sso_monthly_df, 'FlowMonth', monthly_start)
 
     cres_monthly_processed = process_monthly_cres_data(cres_monthly_df, edc_name)
     sso_monthly_processed = process_monthly_sso_data(sso_monthly_df, edc_name)
     pipp_monthly_processed = process_monthly_pipp_data(pipp_monthly_sheets, edc_name)
+    pipp_monthly_processed = incremental.since(pipp_monthly_processed, 'FlowMonth', monthly_start)
     sso_monthly_processed = decompose_monthly_data(sso_monthly_processed, pipp_monthly_processed, '2016-06-01')
 
+    final_monthly_df = combine_data(cres_monthly_processed, sso_monthly_processed, pipp_monthly_processed, 'monthly')
+    final_monthly_df = incremental.merge_with_previous(final_monthly_df, output_path, edc_name, 'monthly',
+                                                       'FlowMonth', monthly_start)
+
+    return {'final_monthly_df': final_monthly_df}
+
+
+def transform_daily_branch(plc_df, nspl_df, pipp_daily_sheets, edc_name, output_path, daily_start):
+    # PLC and NSPL, missing PLC is filled from the day before so the raw rows are only trimmed afterwards
+    plc_df = handle_PLC_missing_data(plc_df, nspl_df)
+    plc_df = incremental.trim_raw(plc_df, 'DATE', daily_start)
+    nspl_df = incremental.trim_raw(nspl_df, 'DATE', daily_start)
+    # Both PIPP sheets are always processed, the one before Jun 2016 is left empty by a later window
+    pipp_daily_sheets = {
+        'Prior to Jun 1 2016': incremental.trim_raw(pipp_daily_sheets['Prior to Jun 1 2016'], 'MONTH', daily_start,
+                                                    monthly=True),
+        'Jun 1 2016 Forward': incremental.trim_raw(pipp_daily_sheets['Jun 1 2016 Forward'], 'DATE', daily_start)}
     plc_daily_processed = process_daily_PLC_data(plc_df, edc_name)
     nspl_daily_processed = process_daily_NSPL_data(nspl_df, edc_name)
     pipp_daily_processed = process_daily_PIPP_data(pipp_daily_sheets, edc_name)
     plc_daily_processed, nspl_daily_processed = decompose_daily_data(plc_daily_processed, nspl_daily_processed,
                                                                      pipp_daily_processed, '2016-06-01')
+    plc_daily_processed = incremental.since(plc_daily_processed, 'FlowDate', daily_start)
+    nspl_daily_processed = incremental.since(nspl_daily_processed, 'FlowDate', daily_start)
+    pipp_daily_processed = incremental.since(pipp_daily_processed, 'FlowDate', daily_start)
 
-    govt_aggr_processed = process_GovtAggr_data(govt_aggr_sheets, govt_aggr_file_path, edc_name)
-
-    # Combine all dataframes
-    final_hourly_df = combine_data(cres_hourly_processed, sso_hourly_processed, pipp_hourly_processed, 'hourly')
-    final_monthly_df = combine_data(cres_monthly_processed, sso_monthly_processed, pipp_monthly_processed, 'monthly')
     final_daily_df = combine_data(plc_daily_processed, nspl_daily_processed, pipp_daily_processed, 'daily')
+    final_daily_df = incremental.merge_with_previous(final_daily_df, output_path, edc_name, 'daily',
+                                                     'FlowDate', daily_start)
 
-    # Calculate ufe data
-    ufe_processed = process_UFE_data(ufe_df, final_hourly_df, edc_name)
+    return {'final_daily_df': final_daily_df}
+
+
+def transform_govt_aggr_branch(govt_aggr_sheets, govt_aggr_file_path, edc_name):
+    return {'govt_aggr_processed': process_GovtAggr_data(govt_aggr_sheets, govt_aggr_file_path, edc_name)}
+
+
+def transform_data(loaded, file_paths, edc_name, output_path, watermarks, incremental_mode, lookback_days,
+                   max_workers=None):
+    print('Processing data...')
+    # Incremental mode only transforms the rows past each dataset's watermark minus the restatement lookback
+    hourly_start = incremental.window_start(output_path, watermarks, edc_name, 'hourly', lookback_days) if incremental_mode else None
+    monthly_start = incremental.window_start(output_path, watermarks, edc_name, 'monthly', lookback_days, monthly=True) if incremental_mode else None
+    daily_start = incremental.window_start(output_path, watermarks, edc_name, 'daily', lookback_days) if incremental_mode else None
+    ufe_start = incremental.window_start(output_path, watermarks, edc_name, 'UFE', lookback_days) if incremental_mode else None
+    # UFE is computed from the hourly volume, so both are reprocessed over the same window
+    hourly_start = incremental.earliest(hourly_start, ufe_start)
+
+    # The hourly (with UFE), monthly, daily and Govt Aggr pipelines are independent until the report
+    branches = {
+        'hourly': (transform_hourly_branch, (loaded['cres_hourly_df'], loaded['sso_hourly_df'],
+                                             loaded['pipp_hourly_sheets'], loaded['deration_factor'], loaded['ufe_df'],
+                                             edc_name, output_path, hourly_start)),
+        'monthly': (transform_monthly_branch, (loaded['cres_monthly_df'], loaded['sso_monthly_df'],
+                                               loaded['pipp_monthly_sheets'], edc_name, output_path, monthly_start)),
+        'daily': (transform_daily_branch, (loaded['plc_df'], loaded['nspl_df'], loaded['pipp_daily_sheets'],
+                                           edc_name, output_path, daily_start)),
+        'govt_aggr': (transform_govt_aggr_branch, (loaded['govt_aggr_sheets'], file_paths['Govt Aggr'], edc_name)),
+    }
+    processed = {}
+    for branch_output in parallel.run_branches(branches, max_workers).values():
+        processed.update(branch_output)
+
+    return processed
+
+
+def validate_data(processed):
+    report_keystats_table = generate_keystats(processed['final_monthly_df'], processed['final_hourly_df'],
+                                              processed['final_daily_df'], processed['ufe_processed'],
+                                              processed['govt_aggr_processed'])
+
+    return {'report_keystats_table': report_keystats_table}
 
-    # Plot data for correction
+
+def report_data(processed, report_keystats_table, etl_report_output_path, max_workers=None):
+    # Plot data for correction, one worker per dataset
     print('Saving plots...')
     plot_path = {}
-    plot_path.update(plot_monthly_data(final_monthly_df, etl_report_output_path))
-    plot_path.update(plot_hourly_data(final_hourly_df, etl_report_output_path))
-    plot_path.update(plot_daily_data(final_daily_df, etl_report_output_path))
-    plot_path.update(plot_UFE_data(ufe_processed, etl_report_output_path))
-    plot_path.update(plot_GovtAggr_data(govt_aggr_processed, etl_report_output_path))
+    plots = {
+        'monthly': (plot_monthly_data, (processed['final_monthly_df'], etl_report_output_path)),
+        'hourly': (plot_hourly_data, (processed['final_hourly_df'], etl_report_output_path)),
+        'daily': (plot_daily_data, (processed['final_daily_df'], etl_report_output_path)),
+        'UFE': (plot_UFE_data, (processed['ufe_processed'], etl_report_output_path)),
+        'GovtAggr': (plot_GovtAggr_data, (processed['govt_aggr_processed'], etl_report_output_path)),
+    }
+    for dataset_plot_path in parallel.run_branches(plots, max_workers).values():
+        plot_path.update(dataset_plot_path)
 
     # Generate ETL report
     report_plots_path = save_plot_path(plot_path)
-    report_keystats_table = generate_keystats(final_monthly_df, final_hourly_df, final_daily_df, ufe_processed,
-                                              govt_aggr_processed)
     generate_report(etl_report_output_path, report_keystats_table, report_plots_path)
 
-    # Save processed data
+    return {'report_plots_path': report_plots_path}
+
+
+def save_data(processed, output_path, edc_name, watermarks):
     print('Saving data...')
-    save_processed_data(final_hourly_df, hourly_output_path, 'hourly')
-    save_processed_data(final_monthly_df, monthly_output_path, 'monthly')
-    save_processed_data(final_daily_df, daily_output_path, 'daily')
-    save_processed_data(ufe_processed, ufe_output_path, 'UFE')
-    save_processed_data(govt_aggr_processed, govt_aggr_output_path, 'GovtAggr')
+    save_processed_data(processed['final_hourly_df'], f'{output_path}/aep_oh_HourlyVolume_processed.xlsx', 'hourly')
+    save_processed_data(processed['final_monthly_df'], f'{output_path}/aep_oh_CustomerCount_processed.xlsx', 'monthly')
+    save_processed_data(processed['final_daily_df'], f'{output_path}/aep_oh_NSPL_PLC_processed.xlsx', 'daily')
+    save_processed_data(processed['ufe_processed'], f'{output_path}/aep_oh_UFE_processed.xlsx', 'UFE')
+    save_processed_data(processed['govt_aggr_processed'], f'{output_path}/aep_oh_GovtAggr_processed.xlsx', 'GovtAggr')
+
+    # Advance the watermarks only once everything is saved
+    incremental.save_state(output_path, watermarks, edc_name,
+                           {'hourly': (processed['final_hourly_df'], 'Datetime_beginning_utc'),
+                            'monthly': (processed['final_monthly_df'], 'FlowMonth'),
+                            'daily': (processed['final_daily_df'], 'FlowDate'),
+                            'UFE': (processed['ufe_processed'], 'Datetime_beginning_utc')})
+
+    return {'saved_at': datetime.datetime.now().isoformat()}
+
+
+def load_to_database(processed, load_mode='replace', db='LoadStaging'):
+    # Database connections are configured in Database_operation/db_operations.py
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Database_operation'))
+    import db_operations as dbop
+
+    print('Loading data into database...')
+    conn, engine = dbop.db_connect(db)
+    conn.close()
+    # Hourly volume and UFE share Load_HourlyVolumeHist and go in as one load, every table in one transaction
+    hourly_df = pd.concat([processed['final_hourly_df'], processed['ufe_processed']], ignore_index=True)
+    with engine.begin() as conn:
+        stats = [bulk_loader.load_processed_data(conn, hourly_df, 'hourly', load_mode),
+                 bulk_loader.load_processed_data(conn, processed['final_daily_df'], 'daily', load_mode),
+                 bulk_loader.load_processed_data(conn, processed['final_monthly_df'], 'monthly', load_mode)]
+
+    return {'loaded_rows': bulk_loader.report_loads(stats)}
+
+
+def main(base_path, data_extract=True, deration_locale='AEPOHIO_RESID_AGG', incremental_mode=False,
+         lookback_days=incremental.DEFAULT_LOOKBACK_DAYS, resume=True, max_workers=None, load_to_db=False,
+         load_mode='replace'):
+    edc_name = "OH_AEP"
+
+    # Output path
+    output_path = f'{base_path}/output_data'
+    # Create output directory if it does not exist
+    os.makedirs(output_path, exist_ok=True)
+    etl_report_output_path = f'{output_path}/ETL_report'
+
+    # Every stage is checkpointed, a re-run resumes from the first stage that is stale or did not complete
+    runner = checkpoints.StageRunner(f'{output_path}/checkpoints', resume=resume)
+    run_date = datetime.date.today().isoformat() if data_extract else None
+    file_paths = runner.run('extract', extract_data, base_path, data_extract, run_date)['file_paths']
+    loaded = runner.run('load', load_data, file_paths, deration_locale,
+                        depends_on=os.path.join(deration_cache.CACHE_DIR, deration_cache.WATERMARK_FILE))
+    watermarks = incremental.load_watermarks(output_path) if incremental_mode else {}
+    # Branches and plots run in worker processes; max_workers=1 runs them sequentially
+    processed = runner.run('transform', transform_data, loaded, file_paths, edc_name, output_path, watermarks,
+                           incremental_mode, lookback_days, max_workers)
+    report_keystats_table = runner.run('validate', validate_data, processed)['report_keystats_table']
+    runner.run('report', report_data, processed, report_keystats_table, etl_report_output_path, max_workers)
+    runner.run('save', save_data, processed, output_path, edc_name, watermarks)
+    if load_to_db:
+        runner.run('db_load', load_to_database, processed, load_mode)
 
 if __name__ == "__main__":
     base_path = 'C:\\Users\\5DIntern3_2024\\Work\\AEP_Ohio'
     data_extract = False
-    deration_factor_filename = 'DerationFactor_AEPOHIO_RESID_AGG.csv'
-    main(base_path, data_extract, deration_factor_filename)
+    deration_locale = 'AEPOHIO_RESID_AGG'
+    # Reprocess only the last months (plus restatement lookback) and merge them into the previous output
+    incremental_mode = False
+    # Bulk load the processed output into Load_HourlyVolumeHist / Load_DailyVolumeHist / Load_MonthlyVolumeHist
+    load_to_db = False
+    # 'upsert' writes only new and changed rows (keyed on Datetime_beginning_utc/FlowDate/FlowMonth, EDCName,
+    # CustomerClass, VolumeType), 'replace' rewrites the whole period covered by the output
+    load_mode = 'upsert' if incremental_mode else 'replace'
+    main(base_path, data_extract, deration_locale, incremental_mode, load_to_db=load_to_db, load_mode=load_mode)
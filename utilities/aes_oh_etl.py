@@ -10,6 +10,10 @@ from jinja2 import Environment, FileSystemLoader
 import base64
 import datetime
 
+import continuity
+import data_repair
+import deration_cache
+
 # Fetch and parse the HTML content
 def fetch_html_content(url):
     response = requests.get(url)
@@ -106,8 +110,8 @@ def process_and_download_links(excel_links, keywords, download_path):
     return downloaded_files
 
 
-def load_deration_factor(deration_factor_path):
-    deration_factor = pd.read_csv(deration_factor_path)
+def load_deration_factor(locale_name):
+    deration_factor = deration_cache.get_deration(locale_name)
 
     return deration_factor
 
@@ -842,111 +846,31 @@ def generate_report(etl_report_output_path, report_keystats_table, report_plots)
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def correct_abnormal_data(hourly_volume_processed):
-    raw_df = hourly_volume_processed.copy()
-    customer_class_list = raw_df['CustomerClass'].unique()
-    hourly_volume_cleaned_list = []
-    for customer_class in customer_class_list:
-        hourly_volume_processed = raw_df[raw_df['CustomerClass'] == customer_class]
-        # Deal with first half of missing data
-        start_abnormal = '2024-02-28 05:00:00'
-        end_abnormal = '2024-02-29 04:00:00'
-
-        def calculate_average_first_half(row, df, column_name):
-            time = row['Datetime_beginning_utc']
-            val_48h_ago = df.loc[df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=48)), column_name]
-            val_24h_ago = df.loc[df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=24)), column_name]
-            val_48h_after = df.loc[df['Datetime_beginning_utc'] == (time + pd.Timedelta(hours=48)), column_name]
-
-            # Ensure we have values for all required times
-            if not (val_48h_ago.empty or val_24h_ago.empty or val_48h_after.empty):
-                return (val_48h_ago.values[0] + val_24h_ago.values[0] + val_48h_after.values[0]) / 3
-            else:
-                return row[column_name]
-
-        # Apply the function to the abnormal period
-        for column_name in ['EGS_HourlyVolume', 'Default_HourlyVolume', 'Eligible_HourlyVolume']:
-            hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) & (
-                        hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal), column_name] = \
-            hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) & (
-                        hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal)].apply(
-                calculate_average_first_half, df=hourly_volume_processed, column_name=column_name, axis=1)
-
-        # Deal with second half of missing data
-        start_abnormal = '2024-02-29 05:00:00'
-        end_abnormal = '2024-03-01 04:00:00'
-
-        def calculate_average_second_half(row, df, column_name):
-            time = row['Datetime_beginning_utc']
-            val_48h_ago = df.loc[df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=48)), column_name]
-            val_24h_after = df.loc[df['Datetime_beginning_utc'] == (time + pd.Timedelta(hours=24)), column_name]
-            val_48h_after = df.loc[df['Datetime_beginning_utc'] == (time + pd.Timedelta(hours=48)), column_name]
-
-            # Ensure we have values for all required times
-            if not (val_48h_ago.empty or val_48h_after.empty or val_24h_after.empty):
-                return (val_48h_ago.values[0] + val_48h_after.values[0] + val_24h_after.values[0]) / 3
-            else:
-                return row[column_name]
-
-        # Apply the function to the abnormal period
-        for column_name in ['EGS_HourlyVolume', 'Default_HourlyVolume', 'Eligible_HourlyVolume']:
-            hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) & (
-                        hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal), column_name] = \
-            hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) & (
-                        hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal)].apply(
-                calculate_average_second_half, df=hourly_volume_processed, column_name=column_name, axis=1)
-        hourly_volume_cleaned_list.append(hourly_volume_processed)
-
-    # Combine dataframe and sort values
-    hourly_volume_processed = pd.concat(hourly_volume_cleaned_list, ignore_index=True)
-
-    # Deal with the last 4 abnormal records for PIPP
-    start_abnormal = '2024-03-21 01:00:00'
-    end_abnormal = '2024-03-21 04:00:00'
     column_to_fix = ['EGS_HourlyVolume', 'Default_HourlyVolume', 'Eligible_HourlyVolume']
 
-    def fix_abnormal_pipp(row, df, column_name):
-        time = row['Datetime_beginning_utc']
-        val_24h_ago = df.loc[(df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=24))) & (df['CustomerClass'] == 'PIPP'), column_name]
-        val_48h_ago = df.loc[(df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=48))) & (df['CustomerClass'] == 'PIPP'), column_name]
-        val_72h_ago = df.loc[(df['Datetime_beginning_utc'] == (time - pd.Timedelta(hours=72))) & (df['CustomerClass'] == 'PIPP'), column_name]
-        return (val_24h_ago.values[0] + val_48h_ago.values[0] + val_72h_ago.values[0]) / 3
-
-    for column_name in column_to_fix:
-        hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) &
-                                    (hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal) &
-                                    (hourly_volume_processed['CustomerClass'] == 'PIPP'), column_name] = \
-            hourly_volume_processed.loc[(hourly_volume_processed['Datetime_beginning_utc'] >= start_abnormal) &
-                                        (hourly_volume_processed['Datetime_beginning_utc'] <= end_abnormal) &
-                                        (hourly_volume_processed['CustomerClass'] == 'PIPP')].apply(
-                fix_abnormal_pipp, df=hourly_volume_processed, column_name=column_name, axis=1)
+    # Deal with first half of missing data: average of 48h ago, 24h ago and 48h after
+    hourly_volume_processed = data_repair.impute_from_neighbors(
+        hourly_volume_processed, 'Datetime_beginning_utc', column_to_fix, '2024-02-28 05:00:00', '2024-02-29 04:00:00',
+        day_offsets=[-2, -1, 2], group_columns=['CustomerClass'])
+
+    # Deal with second half of missing data: average of 48h ago, 24h after and 48h after
+    hourly_volume_processed = data_repair.impute_from_neighbors(
+        hourly_volume_processed, 'Datetime_beginning_utc', column_to_fix, '2024-02-29 05:00:00', '2024-03-01 04:00:00',
+        day_offsets=[-2, 1, 2], group_columns=['CustomerClass'])
+
+    # Deal with the last 4 abnormal records for PIPP: average of the previous three days
+    hourly_volume_processed = data_repair.impute_from_neighbors(
+        hourly_volume_processed, 'Datetime_beginning_utc', column_to_fix, '2024-03-21 01:00:00', '2024-03-21 04:00:00',
+        day_offsets=[-1, -2, -3], group_columns=['CustomerClass'],
+        mask=hourly_volume_processed['CustomerClass'] == 'PIPP')
 
     hourly_volume_processed = hourly_volume_processed.sort_values(by=['Datetime_beginning_utc', 'CustomerClass'],
                                                                   ignore_index=True)
     return hourly_volume_processed
 
 
-def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_DAY.csv'):
+def main(base_path, data_extract=True, deration_locale='DAY'):
 
     if data_extract:
         # Download data from duke_oh website
@@ -1018,12 +942,10 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
         }
         PIPP_file_path = f'{base_path}/2013_2017_PIPP_aes_oh_1.xlsx'
 
-    # Deration File paths
-    deration_factor_path = f'{base_path}/{deration_factor_filename}'
 
     # Load data
     print('Loading data...')
-    deration_factor = load_deration_factor(deration_factor_path)
+    deration_factor = load_deration_factor(deration_locale)
 
     hourly_load_sheets = {}
     for year in hourly_load_file_path:
@@ -1099,17 +1021,20 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
 
     # Check Continuity
     print('Checking continuity...')
-    for customer_class in ['RES', 'COM', 'IND', 'PIPP']:
-        check_continuity(hourly_volume_processed[hourly_volume_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} hourly volume')
-        check_continuity(ufe_processed[ufe_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} UFE volume')
-        check_continuity(monthly_customer_count_processed[monthly_customer_count_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'D', f'{customer_class} monthly volume')
-        check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (
-                daily_volume_processed['VolumeType'] == 'PLC_Scaled')], 'FlowDate', 'D', f'{customer_class} NSPL daily volume')
-        check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (
-                daily_volume_processed['VolumeType'] == 'PLC_Scaled')], 'FlowDate', 'D', f'{customer_class} PLC daily volume')
+    customer_classes = ['RES', 'COM', 'IND', 'PIPP']
+    hourly_checked = hourly_volume_processed[hourly_volume_processed['CustomerClass'].isin(customer_classes)]
+    ufe_checked = ufe_processed[ufe_processed['CustomerClass'].isin(customer_classes)]
+    monthly_checked = monthly_customer_count_processed[monthly_customer_count_processed['CustomerClass'].isin(customer_classes)]
+    daily_checked = daily_volume_processed[daily_volume_processed['CustomerClass'].isin(customer_classes) &
+                                           daily_volume_processed['VolumeType'].isin(['NSPL_Scaled', 'PLC_Scaled'])]
+    continuity.report_gaps(continuity.find_gaps(hourly_checked, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'hourly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(ufe_checked, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'UFE volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(monthly_checked, 'FlowMonth', 'D', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Save processed data
     print('Saving data...')
@@ -1121,6 +1046,6 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
 if __name__ == "__main__":
     base_path = 'C:\\Users\\5DIntern3_2024\\Work\\AES_Ohio'
     data_extract = False
-    deration_factor_filename = 'DerationFactor_DAY.csv'
-    main(base_path, data_extract, deration_factor_filename)
+    deration_locale = 'DAY'
+    main(base_path, data_extract, deration_locale)
 
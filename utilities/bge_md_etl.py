@@ -10,6 +10,9 @@ from jinja2 import Environment, FileSystemLoader
 import base64
 from datetime import datetime, timedelta
 
+import continuity
+import data_corrections
+
 
 def load_hourly_volume_data(hourly_volume_file_path, start_str, end_str):
     # Initialize start and end dates
@@ -84,7 +87,7 @@ def load_daily_volume_data(daily_volume_file_path):
     return combined_df
 
 
-def process_hourly_volume(hourly_volume_df, edc_name):
+def process_hourly_volume(hourly_volume_df, edc_name, audit=None):
     df = hourly_volume_df.copy()
     df['CustomerClass'] = df['WEBSupplier'].str[:3]
     df['SupplierType'] = df['WEBSupplier'].str[-1:]
@@ -100,45 +103,25 @@ def process_hourly_volume(hourly_volume_df, edc_name):
 
     grouped_df['Datetime_beginning_ept'] = grouped_df['DateHour'].apply(parse_dates)
 
+    # Fix duplication in raw data on 2014-11-02
+    grouped_df = data_corrections.apply_corrections(grouped_df, edc_name, 'hourly_raw', audit=audit)
+
+    # Duplicate 2013 to 2020 Nov 01:00:00 to match the ept format
+    fall_back_hours = pd.to_datetime(['2020-11-01 01:00:00', '2019-11-03 01:00:00', '2018-11-04 01:00:00', '2017-11-05 01:00:00',
+                                      '2016-11-06 01:00:00', '2015-11-01 01:00:00', '2014-11-02 01:00:00', '2013-11-03 01:00:00'])
+    grouped_df = pd.concat([grouped_df[grouped_df['Datetime_beginning_ept'].isin(fall_back_hours)], grouped_df], ignore_index=True)
+    grouped_df = grouped_df.sort_values(by=['CustomerClass', 'SupplierType', 'Datetime_beginning_ept'], kind='stable', ignore_index=True)
+    grouped_df['Datetime_beginning_ept'] = grouped_df['Datetime_beginning_ept'].dt.round('H')
+
+    # Fix DST labels of the repeated fall-back hours and the EPT pattern issue on 2016-03-13, once for all classes and supplier types
+    grouped_df = data_corrections.apply_corrections(grouped_df, edc_name, 'hourly_ept', audit=audit,
+                                                    group_columns=['CustomerClass', 'SupplierType'])
+
     customer_class_ls = grouped_df['CustomerClass'].unique().tolist()
     hourly_volume_list = []
     for customer_class in customer_class_ls:
         for supplier_type in ['X', 'C']:
-            sub_df = grouped_df[(grouped_df['CustomerClass'] == customer_class) & (grouped_df['SupplierType'] == supplier_type)]
-
-            # Fix duplication in raw data on 2014-11-02
-            sub_df.loc[(sub_df['Datetime_beginning_ept'] == '2014-11-02 01:00:00'), ['SumOfkWh_Premise_With_UFE',
-                                                                                     'SumOfkWh_PJM_Settlement']] = \
-            sub_df.loc[(sub_df['Datetime_beginning_ept'] == '2014-11-02 01:00:00'), ['SumOfkWh_Premise_With_UFE',
-                                                                                     'SumOfkWh_PJM_Settlement']] / 2
-            # Duplicate 2013 to 2020 Nov 01:00:00 to match the ept format
-            duplicate_list = []
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2020-11-01 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2019-11-03 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2018-11-04 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2017-11-05 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2016-11-06 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2015-11-01 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2014-11-02 01:00:00'])
-            duplicate_list.append(sub_df[sub_df['Datetime_beginning_ept'] == '2013-11-03 01:00:00'])
-
-            duplicate_list.append(sub_df)
-            sub_df = pd.concat(duplicate_list,  ignore_index=True)
-            sub_df = sub_df.sort_values(by=['Datetime_beginning_ept'], ignore_index=True)
-            sub_df['Datetime_beginning_ept'] = sub_df['Datetime_beginning_ept'].dt.round('H')
-
-            index = sub_df[sub_df['Datetime_beginning_ept'] == '2021-11-07 02:00:00'].index[0]
-            sub_df.loc[index, 'Datetime_beginning_ept'] -= pd.Timedelta(hours=1)
-
-            index = sub_df[sub_df['Datetime_beginning_ept'] == '2022-11-06 02:00:00'].index[0]
-            sub_df.loc[index, 'Datetime_beginning_ept'] -= pd.Timedelta(hours=1)
-
-            index = sub_df[sub_df['Datetime_beginning_ept'] == '2023-11-05 02:00:00'].index[0]
-            sub_df.loc[index, 'Datetime_beginning_ept'] -= pd.Timedelta(hours=1)
-
-            # Fix EPT pattern issue on 2016-03-13
-            index = sub_df[sub_df['Datetime_beginning_ept'] == '2016-03-13 02:00:00'].index[0]
-            sub_df.loc[index, 'Datetime_beginning_ept'] += pd.Timedelta(hours=1)
+            sub_df = grouped_df[(grouped_df['CustomerClass'] == customer_class) & (grouped_df['SupplierType'] == supplier_type)].reset_index(drop=True)
 
             sub_df['Datetime_beginning_utc'] = sub_df['Datetime_beginning_ept'].dt.tz_localize(tz='America/New_York', ambiguous='infer').dt.tz_convert("UTC")
 
@@ -512,26 +495,6 @@ def generate_report(etl_report_output_path, report_keystats_table, plot_path, ed
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def main(base_path):
 
     # File paths
@@ -554,7 +517,8 @@ def main(base_path):
     # Process data
     print('Processing data...')
     edc_name = "MD_BGE"
-    hourly_volume_processed = process_hourly_volume(hourly_volume_df, edc_name)
+    correction_audit = []
+    hourly_volume_processed = process_hourly_volume(hourly_volume_df, edc_name, audit=correction_audit)
     daily_volume_processed, monthly_volume_processed = process_daily_volume(daily_volume_df, edc_name)
 
     # Output path
@@ -582,26 +546,22 @@ def main(base_path):
     # Check Continuity
     print('Checking continuity...')
     # Check monthly data continuity
-    customer_class_list = monthly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(monthly_volume_processed[monthly_volume_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'M', f'{customer_class} monthly volume')
+    continuity.report_gaps(continuity.find_gaps(monthly_volume_processed, 'FlowMonth', 'M', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
 
-    customer_class_list = hourly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(hourly_volume_processed[hourly_volume_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} hourly volume')
+    continuity.report_gaps(continuity.find_gaps(hourly_volume_processed, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'hourly volume', ['CustomerClass'])
 
-    customer_class_list = daily_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in ['NSPL_Unscaled', 'PLC_Unscaled']:
-            check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (daily_volume_processed['VolumeType'] == volume_type)], 'FlowDate', 'D', f'{customer_class} {volume_type} daily volume')
+    daily_checked = daily_volume_processed[daily_volume_processed['VolumeType'].isin(['NSPL_Unscaled', 'PLC_Unscaled'])]
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Save processed data
     print('Saving data...')
     save_processed_data(hourly_volume_processed, hourly_output_path, 'hourly')
     save_processed_data(monthly_volume_processed, monthly_output_path, 'monthly')
     save_processed_data(daily_volume_processed, daily_output_path, 'daily')
+    data_corrections.save_audit(correction_audit, f'{output_path}/{edc_name}_Corrections_audit.xlsx')
 
 if __name__ == "__main__":
     base_path = 'C:\\Users\\5DIntern3_2024\\Work\\BGE_MD'
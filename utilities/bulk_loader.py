@@ -0,0 +1,204 @@
+import contextlib
+import time
+
+import pandas as pd
+from sqlalchemy import Date, DateTime, MetaData, Table, and_, bindparam, delete, or_, select, update
+from sqlalchemy.engine import Engine
+
+import reconcile
+
+# Processed output of the utility ETLs goes to these tables: (table, date column, columns in table order)
+TARGET_TABLES = {
+    'hourly': ('Load_HourlyVolumeHist', 'Datetime_beginning_utc',
+               ['Datetime_beginning_utc', 'EDCName', 'CustomerClass', 'VolumeType',
+                'EGS_HourlyVolume', 'Default_HourlyVolume', 'Eligible_HourlyVolume', 'VolumeComment']),
+    'daily': ('Load_DailyVolumeHist', 'FlowDate',
+              ['FlowDate', 'EDCName', 'CustomerClass', 'VolumeType',
+               'EGS_DailyVolume', 'Default_DailyVolume', 'Eligible_DailyVolume', 'VolumeComment']),
+    'monthly': ('Load_MonthlyVolumeHist', 'FlowMonth',
+                ['FlowMonth', 'EDCName', 'CustomerClass', 'VolumeType',
+                 'EGS_MonthlyVolume', 'Default_MonthlyVolume', 'Eligible_MonthlyVolume', 'VolumeComment']),
+}
+# Rows per executemany call; with fast_executemany (set on every db_operations engine) each batch is one round trip
+DEFAULT_BATCH_SIZE = 50000
+# Volume columns are compared at this many decimals in upserts, a float or DECIMAL round trip changes the last digits
+UPSERT_DECIMALS = 6
+DEFAULT_SCOPE_COLUMNS = ('EDCName', 'CustomerClass', 'VolumeType')
+# Natural keys for upserts, the date column first
+NATURAL_KEYS = {
+    'Load_HourlyVolumeHist': ['Datetime_beginning_utc', 'EDCName', 'CustomerClass', 'VolumeType'],
+    'Load_DailyVolumeHist': ['FlowDate', 'EDCName', 'CustomerClass', 'VolumeType'],
+    'Load_MonthlyVolumeHist': ['FlowMonth', 'EDCName', 'CustomerClass', 'VolumeType'],
+    'Load_PJMPLCNSPL': ['FlowMonth', 'LocaleName', 'VolumeType'],
+    'Load_PJMMonthlyPriceHist': ['FlowMonth', 'LocaleName', 'PriceType'],
+}
+
+
+def to_naive_utc(df):
+    # Timestamps as naive UTC, the *_utc columns are datetime on the server
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_convert('UTC').dt.tz_localize(None)
+    return df
+
+
+def to_database_values(df):
+    # Naive UTC timestamps and missing values as NULL, ready for executemany
+    df = to_naive_utc(df)
+    return df.astype(object).where(df.notna(), None)
+
+
+def begin(engine):
+    # A transaction of its own on an engine; a connection is used as it is, the load joins the caller's transaction
+    return engine.begin() if isinstance(engine, Engine) else contextlib.nullcontext(engine)
+
+
+def batches(df, batch_size=DEFAULT_BATCH_SIZE):
+    # List-of-dict batches for executemany
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size].to_dict('records')
+
+
+def scope_condition(target, df, date_column, scope_columns):
+    # The slice of the table a load replaces: every distinct combination of scope column values between its own
+    # first and last date, rows of other combinations are never touched
+    scope_columns = list(scope_columns)
+    if not scope_columns:
+        return and_(target.c[date_column] >= df[date_column].min(), target.c[date_column] <= df[date_column].max())
+    ranges = df.groupby(scope_columns, dropna=False, sort=False)[date_column].agg(['min', 'max']).reset_index()
+    slices = []
+    for row in ranges.itertuples(index=False):
+        conditions = [target.c[column] == (None if pd.isna(value) else value) for column, value in zip(scope_columns, row)]
+        slices.append(and_(*conditions, target.c[date_column] >= row[-2], target.c[date_column] <= row[-1]))
+    return or_(*slices)
+
+
+def bulk_load(engine, df, table, date_column, scope_columns=DEFAULT_SCOPE_COLUMNS, batch_size=DEFAULT_BATCH_SIZE,
+              schema='dbo', delete_from=None):
+    """Replace the slice of `table` covered by `df` with its rows, in one transaction.
+
+    The slice (for each combination of scope column values in `df`, its rows between that combination's first and
+    last date) is deleted before the rows are inserted in large batches, so re-running a load leaves the table
+    unchanged. A failure rolls the whole load back; given a connection instead of an engine, the load runs in the
+    caller's transaction. With `delete_from`, every row of the table on or after that date is deleted instead, even
+    when `df` is empty. Returns {'table', 'deleted', 'inserted', 'seconds', 'rows_per_second'}.
+    """
+    if df.empty and delete_from is None:
+        print(f'Nothing to load into {table}')
+        return {'table': table, 'deleted': 0, 'inserted': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+
+    start = time.time()
+    with begin(engine) as conn:
+        target = Table(table, MetaData(), schema=schema, autoload_with=conn)
+        df = to_database_values(as_table_types(df, target, [date_column]))
+        if delete_from is None:
+            condition = scope_condition(target, df, date_column, scope_columns)
+        else:
+            condition = target.c[date_column] >= table_value(target, date_column, delete_from)
+        deleted = conn.execute(delete(target).where(condition)).rowcount
+        for batch in batches(df, batch_size):
+            conn.execute(target.insert(), batch)
+
+    seconds = time.time() - start
+    rows_per_second = len(df) / seconds if seconds > 0 else float(len(df))
+    print(f'Loaded {len(df)} rows into {table} ({deleted} replaced) in {seconds:.1f}s, {rows_per_second:.0f} rows/s')
+
+    return {'table': table, 'deleted': deleted, 'inserted': len(df), 'seconds': seconds,
+            'rows_per_second': rows_per_second}
+
+
+def as_table_types(df, target, columns):
+    # Date keys compared as dates / timestamps whether they come as 'YYYY-MM-DD' strings or from the database;
+    # timestamps in one resolution, so both sides hash alike
+    df = df.copy()
+    for column in columns:
+        if isinstance(target.c[column].type, DateTime):
+            df[column] = pd.to_datetime(df[column]).dt.as_unit('ns')
+        elif isinstance(target.c[column].type, Date):
+            df[column] = pd.to_datetime(df[column]).dt.date
+    return df
+
+
+def table_value(target, column, value):
+    # A single date as the column's Python type, for a bound parameter
+    if isinstance(target.c[column].type, DateTime):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(target.c[column].type, Date):
+        return pd.Timestamp(value).date()
+    return value
+
+
+def upsert(engine, df, table, key_columns=None, batch_size=DEFAULT_BATCH_SIZE, schema='dbo', decimals=None):
+    """Write only the new and changed rows of `df`, matched to `table` on its natural keys, in one transaction.
+
+    The existing rows of the keys' slice (each combination of non-date key values between its first and last date
+    in `df`) are read back and diffed by row fingerprint; new rows are inserted and changed rows updated in batches.
+    Rows missing from `df` are left in place. Natural keys must be unique in `df`, duplicates raise a ValueError
+    before anything is written. Returns the bulk_load statistics plus 'updated' and 'unchanged'.
+    """
+    key_columns = key_columns or NATURAL_KEYS[table]
+    value_columns = [column for column in df.columns if column not in key_columns]
+    if df.empty:
+        print(f'Nothing to upsert into {table}')
+        return {'table': table, 'deleted': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'seconds': 0.0,
+                'rows_per_second': 0.0}
+    duplicated = df[df.duplicated(key_columns, keep=False)]
+    if not duplicated.empty:
+        raise ValueError(f'{len(duplicated)} rows share their natural key ({", ".join(key_columns)}) in the upsert '
+                         f'into {table}, e.g. {duplicated[key_columns].iloc[0].tolist()}')
+
+    start = time.time()
+    with begin(engine) as conn:
+        target = Table(table, MetaData(), schema=schema, autoload_with=conn)
+        # Both sides keep their column dtypes until after the diff, so unchanged rows hash the same
+        df = as_table_types(to_naive_utc(df), target, key_columns)
+        slice_condition = scope_condition(target, df, key_columns[0], key_columns[1:])
+        existing = pd.read_sql(select(*[target.c[column] for column in df.columns]).where(slice_condition), conn)
+        existing = as_table_types(existing, target, key_columns)
+
+        diff = reconcile.diff_frames(df, existing, key_columns, value_columns, suffixes=('', '_db'), decimals=decimals)
+        new_rows = to_database_values(diff.loc[diff['Status'] == reconcile.NEW, list(df.columns)])
+        changed_rows = to_database_values(diff.loc[diff['Status'] == reconcile.CHANGED, list(df.columns)])
+
+        for batch in batches(new_rows, batch_size):
+            conn.execute(target.insert(), batch)
+        # Bind names must differ from the column names in an executemany UPDATE
+        statement = (update(target)
+                     .where(and_(*[target.c[column] == bindparam(f'key_{column}') for column in key_columns]))
+                     .values({column: bindparam(f'value_{column}') for column in value_columns}))
+        changed_rows = changed_rows.rename(columns={column: f'key_{column}' for column in key_columns} |
+                                                   {column: f'value_{column}' for column in value_columns})
+        for batch in batches(changed_rows, batch_size):
+            conn.execute(statement, batch)
+
+    seconds = time.time() - start
+    written = len(new_rows) + len(changed_rows)
+    rows_per_second = len(df) / seconds if seconds > 0 else float(len(df))
+    print(f'Upserted {table}: {len(new_rows)} inserted, {len(changed_rows)} updated, '
+          f'{len(df) - written} unchanged in {seconds:.1f}s, {rows_per_second:.0f} rows/s checked')
+
+    return {'table': table, 'deleted': 0, 'inserted': len(new_rows), 'updated': len(changed_rows),
+            'unchanged': len(df) - written, 'seconds': seconds, 'rows_per_second': rows_per_second}
+
+
+def load_processed_data(engine, processed_df, data_type, mode='replace', batch_size=DEFAULT_BATCH_SIZE, schema='dbo'):
+    """Load one processed ETL output ('hourly', 'daily' or 'monthly') into its history table.
+
+    `mode` 'replace' rewrites the slice the output covers, 'upsert' writes only its new and changed rows.
+    Pass a connection to load several outputs in one transaction.
+    """
+    table, date_column, columns = TARGET_TABLES[data_type]
+    if mode == 'upsert':
+        return upsert(engine, processed_df[columns], table, batch_size=batch_size, schema=schema,
+                      decimals=UPSERT_DECIMALS)
+    return bulk_load(engine, processed_df[columns], table, date_column, batch_size=batch_size, schema=schema)
+
+
+def report_loads(stats):
+    # One line summary over several loads
+    inserted = sum(item['inserted'] for item in stats)
+    seconds = sum(item['seconds'] for item in stats)
+    print(f'Bulk load complete: {inserted} rows in {seconds:.1f}s, '
+          f'{inserted / seconds if seconds > 0 else float(inserted):.0f} rows/s')
+    return inserted
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import pandas as pd
+
+# Stage level checkpoints: every stage's output is saved under <checkpoint_dir>/<stage>/ with a manifest holding
+# the stage fingerprint, so a re-run resumes from the first stage that is stale or did not complete
+MANIFEST_FILE = 'manifest.json'
+
+
+def file_signature(path):
+    # Input files are identified by path, size and modification time rather than by hashing their content
+    stat = os.stat(path)
+    return f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def fingerprint(*values):
+    """Hash the stage parameters. Paths of existing files contribute their signature, so an updated input file
+    makes the stage stale. DataFrames are skipped: they are outputs of earlier stages, already covered by the
+    upstream fingerprint that every stage fingerprint is chained to.
+    """
+    def describe(value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return '<frame>'
+        if isinstance(value, dict):
+            return {str(key): describe(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [describe(item) for item in value]
+        if isinstance(value, str) and os.path.isfile(value):
+            return file_signature(value)
+        return repr(value)
+
+    return hashlib.sha256(json.dumps(describe(list(values)), sort_keys=True).encode()).hexdigest()
+
+
+def save_frame(df, path):
+    # Parquet when the frame round trips (raw Excel sheets may have non string headers or mixed object columns)
+    if all(isinstance(column, str) for column in df.columns):
+        try:
+            df.to_parquet(path + '.parquet')
+            return os.path.basename(path) + '.parquet'
+        except (ValueError, TypeError, NotImplementedError):
+            pass
+    with open(path + '.pkl', 'wb') as f:
+        pickle.dump(df, f)
+    return os.path.basename(path) + '.pkl'
+
+
+def load_frame(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_artifact(stage_dir, outputs):
+    """Save a stage output ({name: value}) and return its manifest entries.
+
+    Values may be DataFrames, dicts of DataFrames (e.g. Excel sheets) or anything JSON serializable.
+    """
+    entries = {}
+    for name, value in outputs.items():
+        if isinstance(value, pd.DataFrame):
+            entries[name] = {'frame': save_frame(value, os.path.join(stage_dir, name))}
+        elif isinstance(value, dict) and value and all(isinstance(item, pd.DataFrame) for item in value.values()):
+            entries[name] = {'frames': {str(key): save_frame(item, os.path.join(stage_dir, f'{name}__{index}'))
+                                        for index, (key, item) in enumerate(value.items())}}
+        else:
+            entries[name] = {'value': value}
+
+    return entries
+
+
+def load_artifact(stage_dir, entries):
+    outputs = {}
+    for name, entry in entries.items():
+        if 'frame' in entry:
+            outputs[name] = load_frame(os.path.join(stage_dir, entry['frame']))
+        elif 'frames' in entry:
+            outputs[name] = {key: load_frame(os.path.join(stage_dir, file_name)) for key, file_name in entry['frames'].items()}
+        else:
+            outputs[name] = entry['value']
+
+    return outputs
+
+
+class StageRunner:
+    """Run the stages of one ETL in order, reusing checkpointed outputs whose fingerprint still matches.
+
+    Each stage fingerprint chains the previous one, so once a stage is rerun every later stage is rerun too.
+    """
+
+    def __init__(self, checkpoint_dir, resume=True):
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume
+        self.upstream = ''
+        self.stale = not resume
+
+    def run(self, stage, func, *args, depends_on=None, **kwargs):
+        # `depends_on` adds inputs the stage reads on its own (e.g. a cache file) to its fingerprint
+        stage_fingerprint = fingerprint(self.upstream, stage, args, kwargs, depends_on)
+        stage_dir = os.path.join(self.checkpoint_dir, stage)
+        manifest_path = os.path.join(stage_dir, MANIFEST_FILE)
+        self.upstream = stage_fingerprint
+
+        if not self.stale and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest['fingerprint'] == stage_fingerprint and manifest['status'] == 'complete':
+                print(f'Stage {stage}: reusing checkpoint from {manifest["completed_at"]}')
+                return load_artifact(stage_dir, manifest['outputs'])
+
+        # Everything from the first stale or failed stage onwards is recomputed
+        self.stale = True
+        print(f'Stage {stage}: running')
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        os.makedirs(stage_dir)
+        outputs = func(*args, **kwargs) or {}
+
+        manifest = {'stage': stage, 'fingerprint': stage_fingerprint, 'status': 'complete',
+                    'completed_at': pd.Timestamp.now().isoformat(), 'outputs': save_artifact(stage_dir, outputs)}
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        return outputs
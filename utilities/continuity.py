@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# Shared continuity check: every group of a long frame is checked in one pass on integer period ordinals
+EPOCH = pd.Timestamp('1970-01-01')
+ANNUAL_MONTHS = {'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+                 'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12}
+
+
+def to_ordinals(times, freq):
+    """Integer period number of every timestamp: hours or days since the epoch, months or years since year 0.
+
+    `freq` is 'H', 'D', 'M' (month start) or 'AS-JUN' style annual periods. Tz-aware times are counted in UTC.
+    """
+    freq = freq.upper()
+    if freq in ('H', 'D'):
+        if times.dt.tz is not None:
+            times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+        return (times - EPOCH) // pd.Timedelta(hours=1 if freq == 'H' else 24)
+    if freq in ('M', 'MS'):
+        return times.dt.year * 12 + times.dt.month - 1
+    if freq.startswith(('A', 'Y')):
+        return times.dt.year
+
+    raise ValueError(f'Unsupported continuity frequency "{freq}"')
+
+
+def from_ordinals(ordinals, freq, tz=None):
+    freq = freq.upper()
+    if freq in ('H', 'D'):
+        times = EPOCH + pd.to_timedelta(ordinals * (1 if freq == 'H' else 24), unit='h')
+        return times.dt.tz_localize('UTC').dt.tz_convert(tz) if tz is not None else times
+    if freq in ('M', 'MS'):
+        return pd.to_datetime(pd.DataFrame({'year': ordinals // 12, 'month': ordinals % 12 + 1, 'day': 1}))
+    month = ANNUAL_MONTHS.get(freq.split('-')[-1], 1) if '-' in freq else 1
+    return pd.to_datetime(pd.DataFrame({'year': ordinals, 'month': month, 'day': 1}))
+
+
+def find_gaps(df, time_column, freq, group_columns=None):
+    """Find the missing periods between the first and last period of every group.
+
+    Returns one row per gap: the group keys, GapStart, GapEnd and MissingPeriods.
+    """
+    group_columns = list(group_columns or [])
+    times = pd.to_datetime(df[time_column])
+    periods = df[group_columns].copy()
+    periods['Ordinal'] = to_ordinals(times, freq)
+    periods = periods.dropna(subset=['Ordinal']).drop_duplicates()
+    periods['Ordinal'] = periods['Ordinal'].astype(np.int64)
+    periods = periods.sort_values(by=group_columns + ['Ordinal'], ignore_index=True)
+
+    # A step of more than one period inside a group is a gap
+    if group_columns:
+        step = periods.groupby(group_columns, sort=False)['Ordinal'].diff()
+    else:
+        step = periods['Ordinal'].diff()
+    gaps = periods[step > 1].copy()
+    gaps['MissingPeriods'] = (step[step > 1] - 1).astype(np.int64)
+    gaps['GapEnd'] = gaps['Ordinal'] - 1
+    gaps['GapStart'] = gaps['Ordinal'] - gaps['MissingPeriods']
+
+    tz = times.dt.tz
+    gaps['GapStart'] = from_ordinals(gaps['GapStart'], freq, tz).to_numpy() if not gaps.empty else pd.Series(dtype='datetime64[ns]')
+    gaps['GapEnd'] = from_ordinals(gaps['GapEnd'], freq, tz).to_numpy() if not gaps.empty else pd.Series(dtype='datetime64[ns]')
+
+    return gaps[group_columns + ['GapStart', 'GapEnd', 'MissingPeriods']].reset_index(drop=True)
+
+
+def report_gaps(gaps, table_name, group_columns=None):
+    # Print the gap table the way the per-module checks did and return one warning message per group with gaps
+    group_columns = list(group_columns or [])
+    if gaps.empty:
+        print(f"Continuity Check: No Missing Value in {table_name}")
+        return []
+
+    messages = []
+    groups = gaps.groupby(group_columns, sort=False) if group_columns else [((), gaps)]
+    for keys, group in groups:
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        name = ' '.join(str(key) for key in keys + (table_name,))
+        ranges = [str(start) if start == end else f'{start} to {end}'
+                  for start, end in zip(group['GapStart'], group['GapEnd'])]
+        print(f"Continuity Check: Find Missing Values in {name}: {', '.join(ranges)}")
+        messages.append(f"Continuity Check Warning: Find missing values in output {', '.join(ranges)} {name} data")
+
+    return messages
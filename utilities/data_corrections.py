@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_repair
+
+# Registry of hard-coded data corrections, one row per (EDCName, Dataset, Key, Column, Operation)
+CORRECTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_corrections.csv')
+
+# Natural keys used to locate the source row of copy_from corrections
+DATASET_KEYS = {
+    'hourly': ['Datetime_beginning_utc', 'CustomerClass', 'VolumeType'],
+    'ufe': ['Datetime_beginning_utc', 'CustomerClass', 'VolumeType'],
+    'daily': ['FlowDate', 'CustomerClass', 'VolumeType'],
+    'monthly': ['FlowMonth', 'CustomerClass', 'VolumeType'],
+}
+
+_registry_cache = {}
+
+
+def parse_assignments(text):
+    # 'FlowMonth=2017-06-01;CustomerClass=RES' -> {'FlowMonth': '2017-06-01', 'CustomerClass': 'RES'}
+    return dict(item.split('=', 1) for item in text.split(';') if item)
+
+
+def load_corrections(path=CORRECTIONS_PATH):
+    # Parse the registry once per process
+    if path not in _registry_cache:
+        registry = pd.read_csv(path, dtype=str, keep_default_na=False)
+        registry['KeyColumns'] = registry['Key'].apply(lambda key: tuple(parse_assignments(key)))
+        _registry_cache[path] = registry
+
+    return _registry_cache[path]
+
+
+def coerce_values(values, column):
+    # Cast registry strings to the dtype of the data column they are matched against or written to
+    values = pd.Series(list(values), dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = pd.to_datetime(values)
+        if column.dt.tz is not None:
+            values = values.dt.tz_localize(column.dt.tz) if values.dt.tz is None else values.dt.tz_convert(column.dt.tz)
+        return values
+    if pd.api.types.is_numeric_dtype(column) or pd.api.types.infer_dtype(column, skipna=True) in ('integer', 'floating', 'mixed-integer-float'):
+        return pd.to_numeric(values)
+
+    return values
+
+
+def match_corrections(df, corrections, group_columns=None):
+    # Join the data to every correction sharing the same key columns at once, returning (_row, CorrectionID) pairs
+    matches = []
+    for key_columns, group in corrections.groupby('KeyColumns', sort=False):
+        keys = pd.DataFrame(list(group['Key'].apply(parse_assignments)), columns=list(key_columns))
+        for column in key_columns:
+            keys[column] = coerce_values(keys[column], df[column]).to_numpy()
+        keys['CorrectionID'] = group['CorrectionID'].to_numpy()
+
+        rows = df[list(key_columns)].assign(_row=np.arange(len(df)))
+        matches.append(rows.merge(keys, on=list(key_columns))[['_row', 'CorrectionID']])
+
+    matches = pd.concat(matches, ignore_index=True).sort_values(by=['CorrectionID', '_row'], ignore_index=True)
+
+    # Keep only the requested occurrence for corrections that target one of several matching rows,
+    # counted within each group of `group_columns` values when given
+    matches = matches.merge(corrections[['CorrectionID', 'Occurrence']], on='CorrectionID')
+    occurrence_keys = [matches['CorrectionID']]
+    for column in group_columns or []:
+        occurrence_keys.append(df[column].iloc[matches['_row']].reset_index(drop=True))
+    occurrence = matches.groupby(occurrence_keys).cumcount().astype(str)
+    matches = matches[(matches['Occurrence'] == '') | (matches['Occurrence'] == occurrence)]
+
+    return matches[['_row', 'CorrectionID']]
+
+
+def copy_from_source(original, dataset, column, rows, overrides):
+    # Read `column` from the rows whose natural key equals the target key with `overrides` applied
+    key_columns = DATASET_KEYS[dataset]
+    lookup = data_repair.build_lookup(original, key_columns, [column])
+    values = np.full(len(rows), np.nan)
+    for override, positions in pd.Series(np.arange(len(rows))).groupby(list(overrides)):
+        source = original.iloc[rows[positions.to_numpy()]][key_columns].reset_index(drop=True)
+        for key_column, key_value in parse_assignments(override).items():
+            source[key_column] = coerce_values([key_value] * len(source), original[key_column]).to_numpy()
+        values[positions.to_numpy()] = lookup.reindex(pd.MultiIndex.from_frame(source))[column].to_numpy(dtype=float)
+
+    return values
+
+
+def apply_corrections(df, edc_name, dataset, registry=None, audit=None, group_columns=None):
+    """Apply every registered correction for `edc_name` and `dataset` to `df` in a single pass.
+
+    Every correction reads the uncorrected data. When `audit` is a list, a frame with the old and new
+    value of every corrected cell is appended to it. With `group_columns`, the Occurrence of a correction
+    is counted within each group, e.g. per CustomerClass.
+    """
+    registry = load_corrections() if registry is None else registry
+    corrections = registry[(registry['EDCName'] == edc_name) & (registry['Dataset'] == dataset)]
+    if corrections.empty:
+        return df
+
+    original = df
+    df = df.copy()
+    matches = match_corrections(df, corrections, group_columns)
+
+    unmatched = corrections.loc[~corrections['CorrectionID'].isin(matches['CorrectionID']), 'CorrectionID']
+    for correction_id in unmatched:
+        print(f'Warning: Correction {correction_id} for {edc_name} {dataset} did not match any rows.')
+
+    work = matches.merge(corrections[['CorrectionID', 'Column', 'Operation', 'Value']], on='CorrectionID')
+    work['Column'] = work['Column'].str.split(';')
+    work = work.explode('Column', ignore_index=True)
+
+    audit_list = []
+    for (column, operation), group in work.groupby(['Column', 'Operation'], sort=False):
+        rows = group['_row'].to_numpy()
+        position = df.columns.get_loc(column)
+        old_values = original[column].iloc[rows]
+
+        if operation == 'set':
+            new_values = coerce_values(group['Value'], original[column])
+        elif operation == 'scale':
+            new_values = old_values.reset_index(drop=True) * group['Value'].astype(float).to_numpy()
+        elif operation == 'shift_hours':
+            new_values = old_values.reset_index(drop=True) + pd.to_timedelta(group['Value'].astype(float).to_numpy(), unit='h')
+        elif operation == 'copy_from':
+            new_values = pd.Series(copy_from_source(original, dataset, column, rows, group['Value']))
+            new_values = new_values.fillna(old_values.reset_index(drop=True))
+        else:
+            raise ValueError(f'Unknown correction operation "{operation}" in {group["CorrectionID"].iloc[0]}')
+
+        df.iloc[rows, position] = new_values.to_numpy()
+        audit_list.append(pd.DataFrame({'CorrectionID': group['CorrectionID'].to_numpy(), 'EDCName': edc_name,
+                                        'Dataset': dataset, 'Row': df.index[rows], 'Column': column, 'Operation': operation,
+                                        'OldValue': old_values.to_numpy(), 'NewValue': new_values.to_numpy()}))
+
+    print(f'Applied {matches["CorrectionID"].nunique()} corrections to {len(matches)} rows of {edc_name} {dataset}.')
+    if audit is not None and audit_list:
+        audit.append(pd.concat(audit_list, ignore_index=True))
+
+    return df
+
+
+def save_audit(audit, output_path):
+    """Write the audit frames collected by apply_corrections to `output_path` (Excel), one row per corrected cell."""
+    if not audit:
+        print('No data corrections applied, no audit file written.')
+        return
+    audit_df = pd.concat(audit, ignore_index=True)
+    # Old and new values of different columns are mixed, keep them as text
+    audit_df[['OldValue', 'NewValue']] = audit_df[['OldValue', 'NewValue']].astype(str)
+    audit_df.to_excel(output_path, index=False)
+    print(f"Correction audit of {len(audit_df)} cells saved to '{output_path}'.")
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+
+def build_lookup(df, key_columns, value_columns):
+    # Index the value columns by their keys once so shifted lookups are a single reindex
+    return df.set_index(list(key_columns))[list(value_columns)]
+
+
+def lookup_shifted(lookup, keys, shift_column, offset):
+    # Fetch the values at each key with `shift_column` moved by `offset` (NaN when absent)
+    keys = keys.copy()
+    keys[shift_column] = keys[shift_column] + offset
+    if keys.shape[1] == 1:
+        index = pd.Index(keys[shift_column])
+    else:
+        index = pd.MultiIndex.from_frame(keys)
+
+    return lookup.reindex(index).to_numpy(dtype=float)
+
+
+def impute_from_neighbors(df, time_column, value_columns, start, end, day_offsets, group_columns=None, mask=None):
+    """Replace values inside [start, end] with the average of the same hour `day_offsets` days away.
+
+    Neighbors are looked up within the same `group_columns` values. Rows missing any neighbor keep their
+    original values.
+    """
+    df = df.copy()
+    window = (df[time_column] >= start) & (df[time_column] <= end)
+    if mask is not None:
+        window &= mask
+    if not window.any():
+        return df
+
+    key_columns = list(group_columns or []) + [time_column]
+    lookup = build_lookup(df, key_columns, value_columns)
+    keys = df.loc[window, key_columns]
+    neighbors = np.stack([lookup_shifted(lookup, keys, time_column, pd.Timedelta(days=days)) for days in day_offsets])
+
+    complete = ~np.isnan(neighbors).any(axis=0)
+    original = df.loc[window, value_columns].to_numpy(dtype=float)
+    df.loc[window, value_columns] = np.where(complete, neighbors.mean(axis=0), original)
+
+    return df
+
+
+def forward_fill_periods(df, period_column, group_columns, value_columns, freq='D', fill_periods=None):
+    """Reindex every group onto a complete `freq` grid of `period_column` and forward fill the gaps.
+
+    Only the inserted periods and the periods listed in `fill_periods` are filled: their `value_columns` from
+    the prior period of the same group, and the other columns of inserted periods (EDCName, VolumeComment, ...)
+    likewise. Missing values of the existing rows are left as they are.
+    """
+    group_columns = list(group_columns)
+    value_columns = list(value_columns)
+    key_columns = group_columns + [period_column]
+    df = df.copy()
+    targeted = pd.Series(False, index=df.index)
+    if fill_periods is not None:
+        targeted = df[period_column].isin(pd.to_datetime(fill_periods))
+        df.loc[targeted, value_columns] = np.nan
+
+    complete_range = pd.date_range(start=df[period_column].min(), end=df[period_column].max(), freq=freq)
+    groups = df[group_columns].drop_duplicates()
+    grid = pd.MultiIndex.from_frame(groups.merge(pd.DataFrame({period_column: complete_range}), how='cross'))
+
+    df = df.set_index(key_columns)
+    inserted = ~grid.isin(df.index)
+    targeted = grid.isin(df.index[targeted.to_numpy()])
+    df = df.reindex(grid)
+    filled = df.groupby(level=group_columns).ffill()
+
+    fill_rows = inserted | targeted
+    df.loc[fill_rows, value_columns] = filled.loc[fill_rows, value_columns]
+    other_columns = [column for column in df.columns if column not in value_columns]
+    df.loc[inserted, other_columns] = filled.loc[inserted, other_columns]
+
+    return df.reset_index()
+
+
+def average_neighbor_periods(df, period_column, group_columns, value_columns, neighbors):
+    """Replace the values of each target period with the mean of its neighbor periods within each group.
+
+    `neighbors` maps a target period to the list of periods it is averaged from. All targets are computed
+    from the unrepaired values in one indexed lookup.
+    """
+    group_columns = list(group_columns)
+    value_columns = list(value_columns)
+    key_columns = group_columns + [period_column]
+    df = df.copy()
+
+    pairs = pd.DataFrame([(target, source) for target, sources in neighbors.items() for source in sources],
+                         columns=['target', period_column])
+    groups = df[group_columns].drop_duplicates()
+    keys = groups.merge(pairs, how='cross')
+
+    lookup = build_lookup(df, key_columns, value_columns)
+    keys[value_columns] = lookup.reindex(pd.MultiIndex.from_frame(keys[key_columns])).to_numpy(dtype=float)
+    averages = keys.groupby(group_columns + ['target'])[value_columns].mean()
+
+    targets = df[period_column].isin(list(neighbors))
+    target_keys = df.loc[targets, group_columns].copy()
+    target_keys['target'] = df.loc[targets, period_column]
+    df.loc[targets, value_columns] = averages.reindex(pd.MultiIndex.from_frame(target_keys)).to_numpy()
+
+    return df
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import pandas as pd
+from sqlalchemy import text
+
+# Parameterized IN lists, shared with the Database_operation scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Database_operation'))
+import query_builder
+
+# Local Parquet copy of [dbo].[Load_PJMHourlyDerationFactor] for all locales, synced incrementally
+DERATION_TABLE = '[dbo].[Load_PJMHourlyDerationFactor]'
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+CACHE_FILE = 'Load_PJMHourlyDerationFactor.parquet'
+WATERMARK_FILE = 'Load_PJMHourlyDerationFactor.watermarks.json'
+KEY_COLUMNS = ['LocaleName', 'Datetime_beginning_utc']
+
+
+def to_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize('UTC') if timestamp.tz is None else timestamp.tz_convert('UTC')
+
+
+def read_watermarks(cache_dir=CACHE_DIR):
+    # {LocaleName: latest Datetime_beginning_utc already cached}, empty before the first sync
+    path = os.path.join(cache_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {locale_name: pd.Timestamp(watermark) for locale_name, watermark in json.load(f)['Watermarks'].items()}
+
+
+def write_watermarks(df, cache_dir=CACHE_DIR):
+    watermarks = df.groupby('LocaleName')['Datetime_beginning_utc'].max()
+    with open(os.path.join(cache_dir, WATERMARK_FILE), 'w') as f:
+        json.dump({'Watermarks': {locale_name: watermark.isoformat() for locale_name, watermark in watermarks.items()},
+                   'Rows': len(df), 'SyncedAt': pd.Timestamp.now(tz='UTC').isoformat()}, f, indent=2)
+
+
+def sync_deration_cache(engine, cache_dir=CACHE_DIR, full_refresh=False):
+    """Pull the deration factor rows newer than each locale's high-water mark and merge them into the cache.
+
+    The server's latest hour per LocaleName is checked first, so only locales with new rows (or locales not
+    cached yet) are queried. `full_refresh` rebuilds the cache from the whole table, e.g. after PJM restates
+    history. Returns the number of rows fetched.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, CACHE_FILE)
+    if full_refresh or not os.path.exists(cache_path):
+        watermarks, cached = {}, None
+    else:
+        watermarks, cached = read_watermarks(cache_dir), pd.read_parquet(cache_path)
+
+    latest = pd.read_sql(text(f"SELECT LocaleName, MAX(Datetime_beginning_utc) AS Latest FROM {DERATION_TABLE} "
+                              f"GROUP BY LocaleName"), engine)
+    latest['Latest'] = pd.to_datetime(latest['Latest'].astype(str), utc=True)
+
+    # Locales that share a watermark (usually all of them, synced together) are fetched with one IN list query
+    stale = {}
+    for locale_name, server_latest in zip(latest['LocaleName'], latest['Latest']):
+        watermark = watermarks.get(locale_name)
+        if watermark is None or server_latest > watermark:
+            stale.setdefault(watermark, []).append(locale_name)
+
+    new_rows_list = []
+    for watermark, locale_names in stale.items():
+        if watermark is None:
+            query = f"SELECT * FROM {DERATION_TABLE} WHERE LocaleName IN ({{locale_names}})"
+            params = {}
+        else:
+            # The table stores naive UTC timestamps
+            query = (f"SELECT * FROM {DERATION_TABLE} WHERE LocaleName IN ({{locale_names}}) "
+                     f"AND Datetime_beginning_utc > :watermark")
+            params = {'watermark': watermark.tz_localize(None).to_pydatetime()}
+        for statement, statement_params in query_builder.in_list_batches(query, 'locale_names', locale_names, params):
+            new_rows_list.append(pd.read_sql(statement, engine, params=statement_params))
+        print(f"Fetched deration factor rows for {len(locale_names)} locales newer than {watermark}")
+
+    new_rows = pd.concat(new_rows_list, ignore_index=True) if new_rows_list else pd.DataFrame()
+    if new_rows.empty:
+        # Also the first sync of an empty table: there is nothing to cache yet, so no cache file is written
+        print("Deration factor cache is up to date" if cached is not None else f"No deration factor rows in {DERATION_TABLE}")
+        return 0
+
+    new_rows['Datetime_beginning_utc'] = pd.to_datetime(new_rows['Datetime_beginning_utc'].astype(str), utc=True)
+    df = new_rows if cached is None else pd.concat([cached, new_rows], ignore_index=True)
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep='last').sort_values(by=KEY_COLUMNS, ignore_index=True)
+
+    # Write to a temporary file first so an interrupted sync never leaves a partial cache behind
+    df.to_parquet(cache_path + '.tmp', index=False)
+    os.replace(cache_path + '.tmp', cache_path)
+    write_watermarks(df, cache_dir)
+
+    return len(new_rows)
+
+
+def get_deration(locale_name, start=None, end=None, cache_dir=CACHE_DIR):
+    """Read the hourly deration factor of one LocaleName from the local cache, optionally within [start, end]."""
+    cache_path = os.path.join(cache_dir, CACHE_FILE)
+    if not os.path.exists(cache_path):
+        raise FileNotFoundError(f'Deration factor cache not found at {cache_path}, run Database_operation/Data_Download_from_DB.py first')
+
+    filters = [('LocaleName', '==', locale_name)]
+    if start is not None:
+        filters.append(('Datetime_beginning_utc', '>=', to_utc(start)))
+    if end is not None:
+        filters.append(('Datetime_beginning_utc', '<=', to_utc(end)))
+    deration_factor = pd.read_parquet(cache_path, filters=filters)
+
+    if deration_factor.empty:
+        print(f"Warning: No deration factor cached for {locale_name} between {start} and {end}")
+
+    return deration_factor.reset_index(drop=True)
@@ -6,6 +6,8 @@ from jinja2 import Environment, FileSystemLoader
 import base64
 from datetime import datetime
 
+import continuity
+
 
 def find_xlsx_files_path(folder_path, keywords):
     file_paths = {}
@@ -481,26 +483,6 @@ def generate_report(etl_report_output_path, report_keystats_table, plot_path, ed
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def main(base_path):
     # Load hourly data
     print('Loading data...')
@@ -570,20 +552,16 @@ def main(base_path):
     print('Checking continuity...')
 
     # Check monthly data continuity
-    customer_class_list = monthly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(monthly_volume_processed[monthly_volume_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'M', f'{customer_class} monthly volume')
-
-    customer_class_list = hourly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in hourly_volume_processed['VolumeType'].unique():
-            check_continuity(hourly_volume_processed[(hourly_volume_processed['CustomerClass'] == customer_class) & (hourly_volume_processed['VolumeType'] == volume_type)],'Datetime_beginning_utc', 'H', f'{customer_class} {volume_type} hourly volume')
-
-    customer_class_list = daily_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in ['NSPL_Scaled', 'PLC_Unscaled']:
-            check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (daily_volume_processed['VolumeType'] == volume_type)], 'FlowDate', 'D', f'{customer_class} {volume_type} daily volume')
+    continuity.report_gaps(continuity.find_gaps(monthly_volume_processed, 'FlowMonth', 'M', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+
+    continuity.report_gaps(continuity.find_gaps(hourly_volume_processed, 'Datetime_beginning_utc', 'H',
+                                                ['CustomerClass', 'VolumeType']),
+                           'hourly volume', ['CustomerClass', 'VolumeType'])
+
+    daily_checked = daily_volume_processed[daily_volume_processed['VolumeType'].isin(['NSPL_Scaled', 'PLC_Unscaled'])]
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Save processed data
     print('Saving data...')
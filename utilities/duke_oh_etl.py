@@ -58,7 +58,7 @@ Usage:
 1. Undate the base_path
 2. Update the data_extract to select the way of loading data: download from website ('True') or use local data ('False')
 3. If using local data, change the file names in main function to the file names of local files.
-4. Put deration factor file under the base_path, and update the name of deration factor file.
+4. Sync the deration factor cache (Database_operation/Data_Download_from_DB.py), and update the deration LocaleName.
 5. Make sure ETL report template is in base_path
 6. Run the script to process the data and report warnings
 
@@ -80,6 +80,10 @@ import base64
 import datetime
 import numpy as np
 
+import continuity
+import data_corrections
+import deration_cache
+
 
 # Fetch and parse the HTML content
 def fetch_html_content(url):
@@ -177,8 +181,8 @@ def process_and_download_links(excel_links, keywords, download_path):
     return downloaded_files
 
 
-def load_deration_factor(deration_factor_path):
-    deration_factor = pd.read_csv(deration_factor_path)
+def load_deration_factor(locale_name):
+    deration_factor = deration_cache.get_deration(locale_name)
 
     return deration_factor
 
@@ -228,26 +232,6 @@ def load_pipp_data(pipp_file_path):
     return pipp_sheets
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def process_deration_factor(deration_factor, edc_name):
     deration_factor['Datetime_beginning_utc'] = deration_factor['Datetime_beginning_utc'].astype(str)
     deration_factor['Datetime_beginning_utc'] = pd.to_datetime(deration_factor['Datetime_beginning_utc'])
@@ -660,14 +644,9 @@ def process_daily_volume_data(daily_load_sheet, edc_name):
     return combined_df
 
 
-def deal_with_monthly_abnormal(monthly_volume_processed):
-    monthly_df = monthly_volume_processed.copy()
-    for column_name in ['EGS_MonthlyVolume', 'Default_MonthlyVolume', 'Eligible_MonthlyVolume']:
-        for customer_class in ['COM', 'IND', 'PIPP', 'RES']:
-            prior_value = monthly_df.loc[(monthly_df['FlowMonth'] == '2015-05-31') & (monthly_df['CustomerClass'] == customer_class), column_name].values[0]
-            monthly_df.loc[(monthly_df['FlowMonth'] == '2015-06-01') & (monthly_df['CustomerClass'] == customer_class), column_name] = prior_value
-            post_value = monthly_df.loc[(monthly_df['FlowMonth'] == '2015-06-03') & (monthly_df['CustomerClass'] == customer_class), column_name].values[0]
-            monthly_df.loc[(monthly_df['FlowMonth'] == '2015-06-02') & (monthly_df['CustomerClass'] == customer_class), column_name] = post_value
+def deal_with_monthly_abnormal(monthly_volume_processed, edc_name, audit=None):
+    # 2015-06-01 takes the prior day and 2015-06-02 the next day, see data_corrections.csv
+    monthly_df = data_corrections.apply_corrections(monthly_volume_processed, edc_name, 'monthly', audit=audit)
     return monthly_df
 
 
@@ -930,26 +909,6 @@ def generate_report(etl_report_output_path, report_keystats_table, report_plots)
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def save_processed_data(processed_df, output_path, data_type):
     if data_type == 'hourly':
         # Reorder columns
@@ -986,7 +945,7 @@ def save_processed_data(processed_df, output_path, data_type):
         print(f"Data processing complete. The file '{output_path}' has been created.")
 
 
-def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_DEOK.csv'):
+def main(base_path, data_extract=True, deration_locale='DEOK'):
     # Load Data
     if data_extract:
         # Download data from duke_oh website
@@ -1067,12 +1026,10 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
             'post18': f'{base_path}/Hourly_PIPP_duke_oh_1.xlsx'
         }
 
-    # Deration File paths
-    deration_factor_path = f'{base_path}/{deration_factor_filename}'
 
     # Load data
     print('Loading data...')
-    deration_factor = load_deration_factor(deration_factor_path)
+    deration_factor = load_deration_factor(deration_locale)
 
     hourly_load_sheets = {}
     for year in hourly_load_file_path:
@@ -1117,7 +1074,8 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
     daily_volume_processed = handle_daily_missing_data(daily_volume_processed)
 
     # Handle abnormal data in monthly customer count on 2015-06-01 and 2015-06-02
-    monthly_volume_processed = deal_with_monthly_abnormal(monthly_volume_processed)
+    correction_audit = []
+    monthly_volume_processed = deal_with_monthly_abnormal(monthly_volume_processed, edc_name, audit=correction_audit)
 
     # Output path
     output_path = f'{base_path}/output_data'
@@ -1144,20 +1102,17 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
 
     # Check Continuity
     print('Checking continuity...')
-    for customer_class in ['RES', 'COM', 'IND', 'PIPP']:
-        check_continuity(hourly_volume_processed[hourly_volume_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} hourly volume')
-        check_continuity(monthly_volume_processed[monthly_volume_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'D', f'{customer_class} monthly volume')
-
-    check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == 'PIPP') & (
-            daily_volume_processed['VolumeType'] == 'NSPL_Scaled')], 'FlowDate', 'D', 'PIPP NSPL daily volume')
-    check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == 'Blended') & (
-            daily_volume_processed['VolumeType'] == 'NSPL_Scaled')], 'FlowDate', 'D', 'Blended NSPL daily volume')
-    check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == 'PIPP') & (
-            daily_volume_processed['VolumeType'] == 'PLC_Scaled')], 'FlowDate', 'D', 'PIPP PLC daily volume')
-    check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == 'Blended') & (
-            daily_volume_processed['VolumeType'] == 'PLC_Scaled')], 'FlowDate', 'D', 'Blended PLC daily volume')
+    customer_classes = ['RES', 'COM', 'IND', 'PIPP']
+    hourly_checked = hourly_volume_processed[hourly_volume_processed['CustomerClass'].isin(customer_classes)]
+    monthly_checked = monthly_volume_processed[monthly_volume_processed['CustomerClass'].isin(customer_classes)]
+    daily_checked = daily_volume_processed[daily_volume_processed['CustomerClass'].isin(['PIPP', 'Blended']) &
+                                           daily_volume_processed['VolumeType'].isin(['NSPL_Scaled', 'PLC_Scaled'])]
+    continuity.report_gaps(continuity.find_gaps(hourly_checked, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'hourly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(monthly_checked, 'FlowMonth', 'D', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Change PLC to unscaled
     daily_volume_processed.loc[daily_volume_processed['VolumeType'] == 'PLC_Scaled', 'VolumeType'] = 'PLC_unscaled'
@@ -1167,9 +1122,10 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
     save_processed_data(hourly_volume_processed, hourly_output_path, 'hourly')
     save_processed_data(monthly_volume_processed, monthly_output_path, 'monthly')
     save_processed_data(daily_volume_processed, daily_output_path, 'daily')
+    data_corrections.save_audit(correction_audit, f'{output_path}/duke_oh_Corrections_audit.xlsx')
 
 if __name__ == "__main__":
     base_path = 'C:\\Users\\5DIntern3_2024\\Work\\DUKE_Ohio'
     data_extract = False
-    deration_factor_filename = 'DerationFactor_DEOK.csv'
-    main(base_path, data_extract, deration_factor_filename)
+    deration_locale = 'DEOK'
+    main(base_path, data_extract, deration_locale)
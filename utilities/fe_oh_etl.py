@@ -10,6 +10,11 @@ from dateutil import parser
 import base64
 import datetime
 
+import continuity
+import data_corrections
+import deration_cache
+import hourly_factors
+
 # Fetch and parse the HTML content
 def fetch_html_content(url):
     response = requests.get(url)
@@ -108,8 +113,8 @@ def process_and_download_links(excel_links, keywords, download_path):
     return downloaded_files
 
 
-def load_deration_factor(deration_factor_path):
-    deration_factor = pd.read_csv(deration_factor_path)
+def load_deration_factor(locale_name):
+    deration_factor = deration_cache.get_deration(locale_name)
 
     return deration_factor
 
@@ -213,17 +218,15 @@ def process_deration_factor(deration_factor, edc_name):
     return deration_factor_df
 
 
-def process_ufe_data(ufe_sheets):
+def process_ufe_data(ufe_sheets, edc_name, audit=None):
 
     ufe_df_prior_23 = ufe_sheets['UFE Factors 2019+'].copy()
     ufe_df_prior_23['date'] = pd.to_datetime(ufe_df_prior_23['Date'].str.split(' ').str[0], errors='coerce')
     ufe_df_prior_23.loc[ufe_df_prior_23['Hour'].notna(), 'date'] = pd.to_datetime(
         ufe_df_prior_23.loc[ufe_df_prior_23['Hour'].notna(), 'Date'])
 
-    # Hard Code to fix data format issue on 2023-03-13 01:00 EPT
-    ufe_df_prior_23.loc[(ufe_df_prior_23['Date'] == '11/6/2022  01:00 d'), 'Hour'] = 1
-    ufe_df_prior_23.loc[(ufe_df_prior_23['Date'] == '11/6/2022  01:00 s'), 'Hour'] = 2
-    ufe_df_prior_23.loc[(ufe_df_prior_23['Date'] == '03/12/2023 03:00d'), 'Hour'] = 2
+    # Fix daylight saving hours written into the Date column, see data_corrections.csv
+    ufe_df_prior_23 = data_corrections.apply_corrections(ufe_df_prior_23, edc_name, 'ufe_raw', audit=audit)
 
     ufe_df_prior_23.loc[ufe_df_prior_23['Hour'].isna(), 'Hour'] = \
         ufe_df_prior_23.loc[ufe_df_prior_23['Hour'].isna(), 'Date'].str.split(' ').str[1].str[:2].astype(int)
@@ -289,7 +292,11 @@ def process_ufe_data(ufe_sheets):
     return ufe_df_processed
 
 
-def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_factor_processed, edc_name):
+def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_factor_processed, edc_name, audit=None):
+    # Index the deration and UFE factors by hour once; every era gathers from them instead of merging twice
+    factor_stores = {'DerationFactor': hourly_factors.build_factor_store(deration_factor_processed, 'DerationFactor'),
+                     'UFE Factor': hourly_factors.build_factor_store(ufe_df_processed, 'UFE Factor')}
+
     # Process prior 2022 data
     hourly_df_prior22 = hourly_volume_sheets['OH Hrly Load 073122'].copy()
 
@@ -315,11 +322,8 @@ def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_facto
                                                                                         ambiguous='infer')
     hourly_df_prior22["Datetime_beginning_utc"] = hourly_df_prior22["datetime_beginning_ept"].dt.tz_convert("UTC")
 
-    # Merge with deration factor and ufe
-    hourly_df_prior22 = hourly_df_prior22.merge(deration_factor_processed, left_on='Datetime_beginning_utc',
-                                                right_on='Datetime_beginning_utc')
-    hourly_df_prior22 = hourly_df_prior22.merge(ufe_df_processed, left_on='Datetime_beginning_utc',
-                                                right_on='Datetime_beginning_utc')
+    # Attach deration factor and ufe
+    hourly_df_prior22 = hourly_factors.attach_factors(hourly_df_prior22, 'Datetime_beginning_utc', factor_stores)
 
     hourly_volume_list = []
     ufe_volume_list = []
@@ -376,16 +380,8 @@ def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_facto
     hourly_df_post22['date'] = hourly_df_post22['Unnamed: 0_level_0_Date/Hour'].str.split(' ').str[0]
     hourly_df_post22['hour'] = hourly_df_post22['Unnamed: 0_level_0_Date/Hour'].str.split(' ').str[1]
 
-    # Hard Code to fix data format issue on 2023-03-13 01:00 EPT
-    hourly_df_post22.loc[(hourly_df_post22['Unnamed: 0_level_0_Date/Hour'] == '03/13/2023  01:00'), 'hour'] = '01:00'
-    # Hard Code to fix wrong daylight saving duplicates issue on 11/06/2022 01:00
-    hourly_df_post22.loc[(hourly_df_post22['Unnamed: 0_level_0_Date/Hour'] == '11/06/2022 01:00 s'), 'hour'] = '02:00'
-    # Hard Code to fix wrong daylight saving duplicates issue on 03/12/2023 03:00
-    hourly_df_post22.loc[(hourly_df_post22['Unnamed: 0_level_0_Date/Hour'] == '03/12/2023 03:00d'), 'hour'] = '02:00'
-    # Hard Code to fix wrong daylight saving duplicates issue on 11/05/2023 01:00
-    hourly_df_post22.loc[(hourly_df_post22['Unnamed: 0_level_0_Date/Hour'] == '2023-11-05 01::00s'), 'hour'] = '02:00'
-    # Hard Code to fix wrong daylight saving duplicates issue on 10/03/2024 02:00
-    hourly_df_post22.loc[(hourly_df_post22['Unnamed: 0_level_0_Date/Hour'] == '2024-03-10 03:00d'), 'hour'] = '02:00'
+    # Fix data format and daylight saving duplicate issues in the raw Date/Hour, see data_corrections.csv
+    hourly_df_post22 = data_corrections.apply_corrections(hourly_df_post22, edc_name, 'hourly_raw', audit=audit)
 
     hourly_df_post22['hour_beginning'] = hourly_df_post22['hour'].str[:2].astype(int) - 1
 
@@ -405,11 +401,8 @@ def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_facto
                                                                                        ambiguous='infer')
     hourly_df_post22["Datetime_beginning_utc"] = hourly_df_post22["datetime_beginning_ept"].dt.tz_convert("UTC")
 
-    # Merge with deration factor and ufe
-    hourly_df_post22 = hourly_df_post22.merge(deration_factor_processed, left_on='Datetime_beginning_utc',
-                                              right_on='Datetime_beginning_utc')
-    hourly_df_post22 = hourly_df_post22.merge(ufe_df_processed, left_on='Datetime_beginning_utc',
-                                              right_on='Datetime_beginning_utc')
+    # Attach deration factor and ufe
+    hourly_df_post22 = hourly_factors.attach_factors(hourly_df_post22, 'Datetime_beginning_utc', factor_stores)
 
     for customer_class in ['Commerical', 'Industrial', 'Residential']:
         hourly_volume_data = {
@@ -514,11 +507,8 @@ def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_facto
     # Deal with data overlap
     pipp_df_prior23 = pipp_df_prior23[pipp_df_prior23['date'] <= '05/31/2023']
 
-    # Merge with deration factor and ufe
-    pipp_df_prior23 = pipp_df_prior23.merge(deration_factor_processed, left_on='Datetime_beginning_utc',
-                                            right_on='Datetime_beginning_utc')
-    pipp_df_prior23 = pipp_df_prior23.merge(ufe_df_processed, left_on='Datetime_beginning_utc',
-                                            right_on='Datetime_beginning_utc')
+    # Attach deration factor and ufe
+    pipp_df_prior23 = hourly_factors.attach_factors(pipp_df_prior23, 'Datetime_beginning_utc', factor_stores)
 
     hourly_pipp_data = {
         'Datetime_beginning_utc': pipp_df_prior23["Datetime_beginning_utc"],
@@ -576,11 +566,8 @@ def process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_facto
                                                                                      ambiguous='infer')
     pipp_df_post23["Datetime_beginning_utc"] = pipp_df_post23["datetime_beginning_ept"].dt.tz_convert("UTC")
 
-    # Merge with deration factor and ufe
-    pipp_df_post23 = pipp_df_post23.merge(deration_factor_processed, left_on='Datetime_beginning_utc',
-                                          right_on='Datetime_beginning_utc')
-    pipp_df_post23 = pipp_df_post23.merge(ufe_df_processed, left_on='Datetime_beginning_utc',
-                                          right_on='Datetime_beginning_utc')
+    # Attach deration factor and ufe
+    pipp_df_post23 = hourly_factors.attach_factors(pipp_df_post23, 'Datetime_beginning_utc', factor_stores)
 
     hourly_pipp_data = {
         'Datetime_beginning_utc': pipp_df_post23["Datetime_beginning_utc"],
@@ -1215,27 +1202,7 @@ def generate_report(etl_report_output_path, report_keystats_table, report_plots)
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
-def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_ATSI.csv'):
+def main(base_path, data_extract=True, deration_locale='ATSI'):
 
     if data_extract:
         # Download data from duke_oh website
@@ -1274,12 +1241,10 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
         ufe_file_path = f'{base_path}/UFE_fe_oh_1.xls'
 
 
-    # Deration File paths
-    deration_factor_path = f'{base_path}/{deration_factor_filename}'
 
     # Load data
     print('Loading data...')
-    deration_factor = load_deration_factor(deration_factor_path)
+    deration_factor = load_deration_factor(deration_locale)
 
     hourly_volume_sheets = load_hourly_volume_data(hourly_volume_file_path)
     ufe_sheets = load_ufe_data(ufe_file_path)
@@ -1290,10 +1255,12 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
     print('Processing data...')
     edc_name = "OH_FE"
     deration_factor_processed = process_deration_factor(deration_factor, edc_name)
-    ufe_df_processed = process_ufe_data(ufe_sheets)
+    correction_audit = []
+    ufe_df_processed = process_ufe_data(ufe_sheets, edc_name, audit=correction_audit)
     monthly_customer_count_processed = process_monthly_customer_count(monthly_sheets, edc_name)
     daily_volume_processed = process_daily_volume(daily_volume_sheets, edc_name)
-    hourly_volume_processed, ufe_processed = process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_factor_processed, edc_name)
+    hourly_volume_processed, ufe_processed = process_hourly_volume(hourly_volume_sheets, ufe_df_processed, deration_factor_processed, edc_name,
+                                                                   audit=correction_audit)
 
     # Cutoff monthly data by 2010-01-01
     monthly_customer_count_processed = monthly_customer_count_processed[monthly_customer_count_processed['FlowMonth'] >= '2010-01-01']
@@ -1337,17 +1304,20 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
 
     # Check Continuity
     print('Checking continuity...')
-    for customer_class in ['RES', 'COM', 'IND', 'PIPP']:
-        check_continuity(hourly_volume_processed[hourly_volume_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} hourly volume')
-        check_continuity(ufe_processed[ufe_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} UFE volume')
-        check_continuity(monthly_customer_count_processed[monthly_customer_count_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'M', f'{customer_class} monthly volume')
-        check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (
-                daily_volume_processed['VolumeType'] == 'NSPL_Scaled')], 'FlowDate', 'D', f'{customer_class} NSPL daily volume')
-        check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (
-                daily_volume_processed['VolumeType'] == 'PLC_Scaled')], 'FlowDate', 'D', f'{customer_class} PLC daily volume')
+    customer_classes = ['RES', 'COM', 'IND', 'PIPP']
+    hourly_checked = hourly_volume_processed[hourly_volume_processed['CustomerClass'].isin(customer_classes)]
+    ufe_checked = ufe_processed[ufe_processed['CustomerClass'].isin(customer_classes)]
+    monthly_checked = monthly_customer_count_processed[monthly_customer_count_processed['CustomerClass'].isin(customer_classes)]
+    daily_checked = daily_volume_processed[daily_volume_processed['CustomerClass'].isin(customer_classes) &
+                                           daily_volume_processed['VolumeType'].isin(['NSPL_Scaled', 'PLC_Scaled'])]
+    continuity.report_gaps(continuity.find_gaps(hourly_checked, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'hourly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(ufe_checked, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'UFE volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(monthly_checked, 'FlowMonth', 'M', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Change Volume type of PLC and NSPL from scaled to unscaled
     daily_volume_processed.loc[daily_volume_processed['VolumeType'] == 'NSPL_Scaled', 'VolumeType'] = 'NSPL_unscaled'
@@ -1359,10 +1329,11 @@ def main(base_path, data_extract=True, deration_factor_filename='DerationFactor_
     save_processed_data(monthly_customer_count_processed, monthly_output_path, 'monthly')
     save_processed_data(daily_volume_processed, daily_output_path, 'daily')
     save_processed_data(ufe_processed, ufe_output_path, 'ufe')
+    data_corrections.save_audit(correction_audit, f'{output_path}/fe_oh_Corrections_audit.xlsx')
 
 if __name__ == "__main__":
     base_path = 'C:\\Users\\5DIntern3_2024\\Work\\FE_Ohio'
     data_extract = False
-    deration_factor_filename = 'DerationFactor_ATSI.csv'
-    main(base_path, data_extract, deration_factor_filename)
+    deration_locale = 'ATSI'
+    main(base_path, data_extract, deration_locale)
 
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Hourly factors (deration, UFE) are kept as dense float arrays indexed by hours since the epoch, one per locale
+EPOCH = pd.Timestamp('1970-01-01', tz='UTC')
+
+
+def hour_ordinal(times):
+    # Whole hours since the epoch for tz-aware (or UTC naive) timestamps, -1 for missing timestamps
+    times = pd.to_datetime(pd.Series(times), utc=True)
+    return ((times - EPOCH) // pd.Timedelta(hours=1)).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def build_factor_store(df, value_column, time_column='Datetime_beginning_utc', locale_column=None):
+    """Build {locale: (first hour ordinal, dense factor array)} from a long factor table.
+
+    Hours missing from the table are NaN. Without `locale_column` the whole table is stored under None.
+    When an hour appears twice the last value wins. A table or locale without any factor is stored as an
+    empty array, its rows are dropped by attach_factors.
+    """
+    groups = df.groupby(locale_column, sort=False) if locale_column else [(None, df)]
+    store = {}
+    for locale, group in groups:
+        group = group[group[time_column].notna() & group[value_column].notna()]
+        if group.empty:
+            store[locale] = (0, np.empty(0))
+            continue
+        hours = hour_ordinal(group[time_column])
+        first_hour = hours.min()
+        values = np.full(hours.max() - first_hour + 1, np.nan)
+        values[hours - first_hour] = group[value_column].to_numpy(dtype=float)
+        store[locale] = (first_hour, values)
+
+    return store
+
+
+def gather_factors(store, times, locale=None):
+    # O(1) gather of the factor at every timestamp, NaN outside the stored range or for a locale not in the store
+    first_hour, values = store.get(locale, (0, np.empty(0)))
+    positions = hour_ordinal(times) - first_hour
+    inside = pd.Series(times).notna().to_numpy() & (positions >= 0) & (positions < len(values))
+    factors = np.full(len(positions), np.nan)
+    factors[inside] = values[positions[inside]]
+
+    return factors
+
+
+def attach_factors(df, time_column, stores, locale=None):
+    """Attach one column per entry of `stores` ({column: store}) gathered at `time_column`.
+
+    Like the inner merges it replaces, rows without a factor for every column are dropped and the index
+    is reset.
+    """
+    factors = {column: gather_factors(store, df[time_column], locale) for column, store in stores.items()}
+    complete = np.logical_and.reduce([~np.isnan(values) for values in factors.values()])
+    if not complete.all():
+        print(f'Warning: Dropping {(~complete).sum()} hours without {", ".join(stores)}.')
+
+    df = df[complete].reset_index(drop=True)
+    for column, values in factors.items():
+        df[column] = values[complete]
+
+    return df
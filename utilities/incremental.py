@@ -0,0 +1,105 @@
+import json
+import os
+
+import pandas as pd
+
+# Incremental ETL state lives next to the processed output: one watermark per (EDCName, dataset) and a Parquet
+# copy of every processed dataset that later runs merge their new rows into
+STATE_DIR = 'incremental'
+WATERMARK_FILE = 'watermarks.json'
+DEFAULT_LOOKBACK_DAYS = 62
+
+
+def load_watermarks(output_path):
+    path = os.path.join(output_path, STATE_DIR, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(output_path, watermarks):
+    os.makedirs(os.path.join(output_path, STATE_DIR), exist_ok=True)
+    with open(os.path.join(output_path, STATE_DIR, WATERMARK_FILE), 'w') as f:
+        json.dump(watermarks, f, indent=2)
+
+
+def previous_output_path(output_path, edc_name, dataset):
+    return os.path.join(output_path, STATE_DIR, f'{edc_name}_{dataset}.parquet')
+
+
+def window_start(output_path, watermarks, edc_name, dataset, lookback_days=DEFAULT_LOOKBACK_DAYS, monthly=False):
+    """First period to reprocess: the watermark minus the restatement lookback.
+
+    Returns None (full history) when the dataset has no watermark or no previous output yet.
+    """
+    watermark = watermarks.get(edc_name, {}).get(dataset)
+    if watermark is None or not os.path.exists(previous_output_path(output_path, edc_name, dataset)):
+        print(f'No watermark for {edc_name} {dataset}, processing full history.')
+        return None
+
+    start = pd.Timestamp(watermark) - pd.Timedelta(days=lookback_days)
+    start = start.normalize().replace(day=1) if monthly else start.normalize()
+    print(f'Processing {edc_name} {dataset} from {start} (watermark {watermark}, lookback {lookback_days} days).')
+
+    return start
+
+
+def earliest(*starts):
+    # Shared window of datasets derived from each other; a full history run if any of them needs one
+    if any(start is None for start in starts):
+        return None
+    return min(starts)
+
+
+def as_utc(values):
+    # Compare tz-aware timestamps and 'YYYY-MM-DD' FlowDate/FlowMonth strings on the same UTC axis
+    return pd.to_datetime(values, utc=True)
+
+
+def since(df, column, start):
+    # Rows at or after `start`; everything when running a full history
+    if start is None:
+        return df
+    return df[as_utc(df[column]) >= start].reset_index(drop=True)
+
+
+def trim_raw(df, column, start, monthly=False):
+    # Raw rows from the day (month) before `start` on, so the transforms only parse the window while DST inference and
+    # the exact `since` cut afterwards still see whole local days; everything when running a full history
+    if start is None:
+        return df
+    cutoff = (start.tz_localize(None) if start.tzinfo is not None else start).normalize() - pd.Timedelta(days=1)
+    cutoff = cutoff.replace(day=1) if monthly else cutoff
+    dates = pd.to_datetime(df[column].astype(str), errors='coerce')
+    return df[~(dates < cutoff)].reset_index(drop=True)
+
+
+def trim_sheets(sheets, column, start, monthly=False):
+    # trim_raw for every sheet of a workbook, sheets left without rows are dropped
+    if start is None:
+        return sheets
+    trimmed = {name: trim_raw(df, column, start, monthly) for name, df in sheets.items()}
+    return {name: df for name, df in trimmed.items() if not df.empty}
+
+
+def merge_with_previous(df, output_path, edc_name, dataset, column, start):
+    # Previously processed rows before the window plus the reprocessed window
+    if start is None:
+        return df
+    previous = pd.read_parquet(previous_output_path(output_path, edc_name, dataset))
+    previous = previous[as_utc(previous[column]) < start]
+
+    return pd.concat([previous, df], ignore_index=True).sort_values(by=column, kind='stable', ignore_index=True)
+
+
+def save_state(output_path, watermarks, edc_name, datasets):
+    """Persist the processed datasets ({dataset: (df, column)}) and advance their watermarks.
+
+    Called only after the outputs are saved, so a failed run keeps the previous watermarks.
+    """
+    os.makedirs(os.path.join(output_path, STATE_DIR), exist_ok=True)
+    for dataset, (df, column) in datasets.items():
+        df.to_parquet(previous_output_path(output_path, edc_name, dataset), index=False)
+        watermarks.setdefault(edc_name, {})[dataset] = as_utc(df[column]).max().isoformat()
+    save_watermarks(output_path, watermarks)
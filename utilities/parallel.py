@@ -0,0 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def run_branches(branches, max_workers=None):
+    """Run independent pipeline branches ({name: (func, args)}) in worker processes and join their results.
+
+    Branch functions must be module level so they can be sent to the workers. `max_workers=1` runs the
+    branches one after another in this process, which is easier to debug.
+    """
+    if max_workers == 1:
+        return {name: func(*args) for name, (func, args) in branches.items()}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(func, *args) for name, (func, args) in branches.items()}
+        # Re-raises the first branch failure here, after the pool has been shut down
+        return {name: future.result() for name, future in futures.items()}
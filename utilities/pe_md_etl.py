@@ -6,6 +6,11 @@ from jinja2 import Environment, FileSystemLoader
 import base64
 from datetime import datetime
 
+import continuity
+import data_corrections
+import deration_cache
+
+
 def load_hourly_volume_data(file_paths_hourly):
     # Res 23
     hourly_df_23_res = pd.read_excel(file_paths_hourly['hourly_volume_23'], sheet_name='RESIDENTIAL', header=[0, 1])
@@ -839,26 +844,6 @@ def generate_report(etl_report_output_path, report_keystats_table, plot_path, ed
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 def main(base_path):
     # File Paths
     file_paths_hourly = {
@@ -889,13 +874,11 @@ def main(base_path):
     # Daily Volume Files
     file_path_daily = f'{base_path}\PE_PLC_NSPL_by Type.xlsx'
 
-    deration_factor_path = f'{base_path}\DerationFactor_APS.csv'
-
     ufe_file_path = f'{base_path}\PE_UFE.xlsx'
 
     # Read Excel Files
     hourly_df_23, hourly_df_19, hourly_df_10 = load_hourly_volume_data(file_paths_hourly)
-    deration_df = pd.read_csv(deration_factor_path)
+    deration_df = deration_cache.get_deration('APS')
     monthly_df_23, monthly_df_13 = load_monthly_volume_data(file_paths_monthly)
     daily_volume_df = load_daily_volume_data(file_path_daily)
     ufe_df = load_ufe_data(ufe_file_path)
@@ -919,9 +902,9 @@ def main(base_path):
     # Process UFE volume
     ufe_processed = process_ufe_data(hourly_volume_processed, ufe_df, edc_name)
 
-    # Fix abnormal data
-    monthly_volume_processed.loc[(monthly_volume_processed['FlowMonth'] == '2017-06-01') & (monthly_volume_processed['CustomerClass'] == 'RES'), 'Eligible_MonthlyVolume'] = 225052
-    monthly_volume_processed.loc[(monthly_volume_processed['FlowMonth'] == '2017-07-01') & (monthly_volume_processed['CustomerClass'] == 'RES'), 'Eligible_MonthlyVolume'] = 228506
+    # Fix abnormal data registered in data_corrections.csv
+    correction_audit = []
+    monthly_volume_processed = data_corrections.apply_corrections(monthly_volume_processed, edc_name, 'monthly', audit=correction_audit)
     monthly_volume_processed['EGS_MonthlyVolume'] = monthly_volume_processed['Eligible_MonthlyVolume'] - monthly_volume_processed['Default_MonthlyVolume']
 
     # Output path
@@ -947,28 +930,17 @@ def main(base_path):
     report_keystats_table = generate_keystats(monthly_volume_processed, hourly_volume_processed, daily_volume_processed)
     generate_report(etl_report_output_path, report_keystats_table, plot_path, edc_name)
 
-    # Check Continuity
+    # Check Continuity of every customer class (and daily volume type) in one pass per dataset
     print('Checking continuity...')
-    # Check monthly data continuity
-    customer_class_list = monthly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(monthly_volume_processed[monthly_volume_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'M', f'{customer_class} monthly volume')
-
-    customer_class_list = hourly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(hourly_volume_processed[hourly_volume_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} hourly volume')
-
-    customer_class_list = daily_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in ['NSPL_Unscaled', 'PLC_Unscaled']:
-            check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (daily_volume_processed['VolumeType'] == volume_type)], 'FlowDate', 'D', f'{customer_class} {volume_type} daily volume')
-
-    customer_class_list = ufe_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(ufe_processed[ufe_processed['CustomerClass'] == customer_class],
-                         'Datetime_beginning_utc', 'H', f'{customer_class} ufe volume')
+    continuity.report_gaps(continuity.find_gaps(monthly_volume_processed, 'FlowMonth', 'M', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+    continuity.report_gaps(continuity.find_gaps(hourly_volume_processed, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'hourly volume', ['CustomerClass'])
+    daily_unscaled = daily_volume_processed[daily_volume_processed['VolumeType'].isin(['NSPL_Unscaled', 'PLC_Unscaled'])]
+    continuity.report_gaps(continuity.find_gaps(daily_unscaled, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
+    continuity.report_gaps(continuity.find_gaps(ufe_processed, 'Datetime_beginning_utc', 'H', ['CustomerClass']),
+                           'ufe volume', ['CustomerClass'])
 
     # Save processed data
     print('Saving data...')
@@ -976,6 +948,7 @@ def main(base_path):
     save_processed_data(monthly_volume_processed, monthly_output_path, 'monthly')
     save_processed_data(daily_volume_processed, daily_output_path, 'daily')
     save_processed_data(ufe_processed, ufe_output_path, 'UFE')
+    data_corrections.save_audit(correction_audit, f'{output_path}/{edc_name}_Corrections_audit.xlsx')
 
 
 if __name__ == "__main__":
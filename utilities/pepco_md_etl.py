@@ -6,6 +6,9 @@ from jinja2 import Environment, FileSystemLoader
 import base64
 from datetime import datetime
 
+import continuity
+import data_repair
+
 
 def find_xlsx_files_path(folder_path, keywords):
     file_paths = {}
@@ -196,42 +199,31 @@ def process_daily_volume(daily_volume_df, edc_name):
     daily_volume_processed['EGS_DailyVolume'] = daily_volume_processed['Eligible_DailyVolume'] - daily_volume_processed['Default_DailyVolume']
     daily_volume_processed = daily_volume_processed.sort_values(by=['FlowDate', 'CustomerClass', 'VolumeType'], ignore_index=True)
 
-    # Forward fill daily missing values
+    # Forward fill daily missing values from the prior day of the same customer class and volume type
     missing_date_df = pd.concat(missing_date_list, ignore_index=True)
     value_columns = ['EGS_DailyVolume', 'Default_DailyVolume', 'Eligible_DailyVolume']
     missing_date = list(missing_date_df['FlowDate'].unique())
     missing_date.append(datetime.strptime('2017-08-14 00:00:00', '%Y-%m-%d %H:%M:%S'))
-    for date in missing_date:
-        for customer_class in ['Type 1 Non-RES', 'Type 2 Non-RES', 'RES']:
-            for volume_type in daily_volume_processed['VolumeType'].unique():
-                daily_volume_processed.loc[(daily_volume_processed['FlowDate'] == date) &
-                                           (daily_volume_processed['CustomerClass'] == customer_class) &
-                                           (daily_volume_processed['VolumeType'] == volume_type), value_columns] = \
-                    daily_volume_processed.loc[(daily_volume_processed['FlowDate'] == date - pd.to_timedelta(1, unit="d")) &
-                                               (daily_volume_processed['CustomerClass'] == customer_class) &
-                                               (daily_volume_processed['VolumeType'] == volume_type), value_columns].values
+    daily_volume_processed = data_repair.forward_fill_periods(daily_volume_processed, 'FlowDate', ['CustomerClass', 'VolumeType'],
+                                                              value_columns, freq='D', fill_periods=missing_date)
+    daily_volume_processed = daily_volume_processed[['FlowDate', 'EDCName', 'CustomerClass', 'VolumeType', 'EGS_DailyVolume',
+                                                     'Default_DailyVolume', 'Eligible_DailyVolume', 'VolumeComment']]
+    daily_volume_processed = daily_volume_processed.sort_values(by=['FlowDate', 'CustomerClass', 'VolumeType'], ignore_index=True)
 
     daily_volume_processed['FlowDate'] = daily_volume_processed['FlowDate'].dt.strftime('%Y-%m-%d')
     # Concat monthly data
     monthly_volume_processed = pd.concat(customer_count_list, ignore_index=True)
     monthly_volume_processed = monthly_volume_processed.groupby(['FlowMonth', 'EDCName', 'CustomerClass', 'VolumeType', 'VolumeComment'], as_index=False).mean()
 
-    # Fix abnormal data in monthly customer count
+    # Fix abnormal data in monthly customer count with the average of neighbor months
     columns = ['EGS_MonthlyVolume', 'Default_MonthlyVolume', 'Eligible_MonthlyVolume']
-    for customer_class in monthly_volume_processed['CustomerClass'].unique():
-        monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-08-01'), columns] =\
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-07-01'), columns].values/3 + \
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-06-01'), columns].values/3 + \
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-10-01'), columns].values/3
-
-        monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-09-01'), columns] =\
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-07-01'), columns].values/3 + \
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-10-01'), columns].values/3 + \
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2017-11-01'), columns].values/3
-
-        monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2022-12-01'), columns] =\
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2022-11-01'), columns].values/2 + \
-            monthly_volume_processed.loc[(monthly_volume_processed['CustomerClass'] == customer_class) & (monthly_volume_processed['FlowMonth'] == '2023-01-01'), columns].values/2
+    neighbor_months = {
+        '2017-08-01': ['2017-06-01', '2017-07-01', '2017-10-01'],
+        '2017-09-01': ['2017-07-01', '2017-10-01', '2017-11-01'],
+        '2022-12-01': ['2022-11-01', '2023-01-01'],
+    }
+    monthly_volume_processed = data_repair.average_neighbor_periods(monthly_volume_processed, 'FlowMonth', ['CustomerClass'],
+                                                                    columns, neighbor_months)
 
     # Calculate EGS_MonthlyVolume
     monthly_volume_processed['Eligible_MonthlyVolume'] = monthly_volume_processed['Eligible_MonthlyVolume'].round(0)
@@ -477,26 +469,6 @@ def generate_report(etl_report_output_path, report_keystats_table, plot_path, ed
     print(f'Report saved to {etl_report_output_path}/etl_report.html')
 
 
-def check_continuity(df, date_column, freq, table_name):
-    df = df.copy()
-    # Ensure the date column is in datetime format
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if freq == 'M':
-        complete_range = pd.date_range(start=df[date_column].min().replace(day=1), end=df[date_column].max(), freq='MS')
-    else:
-        complete_range = pd.date_range(start=df[date_column].min(), end=df[date_column].max(), freq=freq)
-
-    # Identify missing dates and hours
-    missing_dates_hours = complete_range[~complete_range.isin(df[date_column])]
-
-    if missing_dates_hours.empty:
-        print(f"Continuity Check: No Missing Value in {table_name}")
-    else:
-        print(f"Continuity Check: Find Missing Values in {table_name}:")
-        print(missing_dates_hours)
-
-
 
 def main(base_path):
     # Load hourly data
@@ -563,21 +535,7 @@ def main(base_path):
     monthly_volume_processed = pd.concat([monthly_volume_processed, monthly_volume_df_hist], ignore_index=True)
     monthly_volume_processed = monthly_volume_processed.sort_values(by=['FlowMonth', 'CustomerClass'], ignore_index=True)
 
-    # Handling missing values in daily volume
-    monthly_df_list = []
-    customer_class_list = daily_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in ['NSPL_Scaled', 'PLC_Unscaled']:
-            df_raw = daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (daily_volume_processed['VolumeType'] == volume_type)]
-            complete_range = pd.date_range(start=daily_volume_processed['FlowDate'].min(), end=daily_volume_processed['FlowDate'].max(), freq='D')
-            missing_dates_hours = complete_range[~complete_range.isin(df_raw['FlowDate'])]
-            missing_df = missing_dates_hours.strftime('%Y-%m-%d').to_frame(name='FlowDate')
-            df_processed = pd.concat([missing_df, df_raw], ignore_index=True)
-            df_processed = df_processed.sort_values(by=['FlowDate'], ignore_index=True)
-            df_processed = df_processed.ffill()
-            monthly_df_list.append(df_processed)
-    daily_volume_processed = pd.concat(monthly_df_list, ignore_index=True)
-    # Combine with historical data
+    # Combine with historical data (missing dates are already forward filled in process_daily_volume)
     daily_volume_processed = pd.concat([daily_volume_processed, daily_volume_df_hist], ignore_index=True)
     daily_volume_processed = daily_volume_processed.sort_values(by=['FlowDate', 'CustomerClass', 'VolumeType'], ignore_index=True)
 
@@ -607,20 +565,16 @@ def main(base_path):
     print('Checking continuity...')
 
     # Check monthly data continuity
-    customer_class_list = monthly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        check_continuity(monthly_volume_processed[monthly_volume_processed['CustomerClass'] == customer_class],
-                         'FlowMonth', 'M', f'{customer_class} monthly volume')
-
-    customer_class_list = hourly_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in hourly_volume_processed['VolumeType'].unique():
-            check_continuity(hourly_volume_processed[(hourly_volume_processed['CustomerClass'] == customer_class) & (hourly_volume_processed['VolumeType'] == volume_type)],'Datetime_beginning_utc', 'H', f'{customer_class} {volume_type} hourly volume')
-
-    customer_class_list = daily_volume_processed['CustomerClass'].unique()
-    for customer_class in customer_class_list:
-        for volume_type in ['NSPL_Scaled', 'PLC_Unscaled']:
-            check_continuity(daily_volume_processed[(daily_volume_processed['CustomerClass'] == customer_class) & (daily_volume_processed['VolumeType'] == volume_type)], 'FlowDate', 'D', f'{customer_class} {volume_type} daily volume')
+    continuity.report_gaps(continuity.find_gaps(monthly_volume_processed, 'FlowMonth', 'M', ['CustomerClass']),
+                           'monthly volume', ['CustomerClass'])
+
+    continuity.report_gaps(continuity.find_gaps(hourly_volume_processed, 'Datetime_beginning_utc', 'H',
+                                                ['CustomerClass', 'VolumeType']),
+                           'hourly volume', ['CustomerClass', 'VolumeType'])
+
+    daily_checked = daily_volume_processed[daily_volume_processed['VolumeType'].isin(['NSPL_Scaled', 'PLC_Unscaled'])]
+    continuity.report_gaps(continuity.find_gaps(daily_checked, 'FlowDate', 'D', ['CustomerClass', 'VolumeType']),
+                           'daily volume', ['CustomerClass', 'VolumeType'])
 
     # Save processed data
     print('Saving data...')
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Processed-vs-database reconciliation on 64 bit row fingerprints: one hash of the key columns identifies a row,
+# one hash of the value columns tells whether it changed, so rows are classified with vectorized set operations
+NEW = 'new'
+CHANGED = 'changed'
+DELETED = 'deleted'
+UNCHANGED = 'unchanged'
+
+
+def normalize(df, columns, decimals=None):
+    # Hash tz-aware and naive timestamps of the same instant alike and absorb float noise of the database round trip
+    df = df[columns].copy()
+    for column in columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_convert('UTC').dt.tz_localize(None)
+        elif decimals is not None and pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].round(decimals)
+
+    return df
+
+
+def fingerprints(df, key_columns, value_columns, decimals=None):
+    """KeyHash and ValueHash (uint64) of every row, aligned with the index of `df`.
+
+    Keys must be unique; both sides must use the same dtypes for the key columns (e.g. 'YYYY-MM-DD' strings).
+    """
+    return pd.DataFrame({
+        'KeyHash': pd.util.hash_pandas_object(normalize(df, key_columns), index=False),
+        'ValueHash': pd.util.hash_pandas_object(normalize(df, value_columns, decimals), index=False),
+    }, index=df.index)
+
+
+def classify(new_prints, old_prints):
+    """Status of every new row (new / changed / unchanged) and the positions of old rows missing from the new side.
+
+    Changed means the value hash differs; tolerances are applied by diff_frames.
+    """
+    old_prints = old_prints.drop_duplicates(subset='KeyHash', keep='last')
+    position = pd.Index(old_prints['KeyHash']).get_indexer(new_prints['KeyHash'])
+    matched = position >= 0
+    same_value = np.zeros(len(new_prints), dtype=bool)
+    same_value[matched] = new_prints['ValueHash'].to_numpy()[matched] == old_prints['ValueHash'].to_numpy()[position[matched]]
+
+    status = np.where(~matched, NEW, np.where(same_value, UNCHANGED, CHANGED))
+    deleted = np.flatnonzero(~old_prints['KeyHash'].isin(new_prints['KeyHash']).to_numpy())
+
+    return pd.Series(status, index=new_prints.index), old_prints.index[deleted], position
+
+
+def diff_frames(df_new, df_old, key_columns, value_columns, tolerances=None, suffixes=('_new', '_old'),
+                inclusive=False, decimals=None):
+    """Structured diff of two frames holding the same keys.
+
+    Returns the key columns, Status, every value column twice (with `suffixes`) and the other columns of `df_new`.
+    A value column listed in `tolerances` ({column: tolerance}) only counts as changed when the absolute difference
+    exceeds the tolerance, a value missing on one side never does; other value columns must match exactly (missing
+    on both sides counts as equal). inclusive=True, as in crosscheck.server_diff, also counts a difference equal to
+    the tolerance and a tolerance column value missing on either side. `decimals` absorbs float noise of a database
+    round trip: float columns without a tolerance are equal when they round to the same value (within half a unit
+    of the last decimal).
+    """
+    tolerances = tolerances or {}
+    new_prints = fingerprints(df_new, key_columns, value_columns, decimals)
+    old_prints = fingerprints(df_old, key_columns, value_columns, decimals)
+    status, deleted_index, position = classify(new_prints, old_prints)
+
+    if inclusive and tolerances:
+        # Missing on both sides hashes alike, but still counts as a change
+        missing = df_new[[column for column in value_columns if column in tolerances]].isna().any(axis=1).to_numpy()
+        status.iloc[np.flatnonzero((status.to_numpy() == UNCHANGED) & missing)] = CHANGED
+
+    # Matched rows whose values hash differently are compared column by column with their tolerance
+    old_unique = df_old.loc[old_prints.drop_duplicates(subset='KeyHash', keep='last').index]
+    candidates = np.flatnonzero(status.to_numpy() == CHANGED)
+    if len(candidates):
+        changed = np.zeros(len(candidates), dtype=bool)
+        for column in value_columns:
+            new_values = df_new[column].iloc[candidates].reset_index(drop=True)
+            old_values = old_unique[column].iloc[position[candidates]].reset_index(drop=True)
+            if column in tolerances:
+                new_values = pd.to_numeric(new_values, errors='coerce')
+                old_values = pd.to_numeric(old_values, errors='coerce')
+                if inclusive:
+                    differs = ((new_values - old_values).abs() >= tolerances[column]) | new_values.isna() | old_values.isna()
+                else:
+                    differs = (new_values - old_values).abs() > tolerances[column]
+            else:
+                if decimals is not None and pd.api.types.is_float_dtype(new_values) and pd.api.types.is_float_dtype(old_values):
+                    # Values rounding apart by a hair hash differently, they are still the same value
+                    same = (new_values - old_values).abs() <= 0.5 * 10 ** -decimals
+                else:
+                    same = new_values == old_values
+                differs = ~same & ~(new_values.isna() & old_values.isna())
+            changed |= differs.to_numpy()
+        status.iloc[candidates[~changed]] = UNCHANGED
+
+    other_columns = [column for column in df_new.columns if column not in key_columns and column not in value_columns]
+    matched = position >= 0
+    new_side = df_new[key_columns + other_columns].reset_index(drop=True)
+    new_side['Status'] = status.to_numpy()
+    for column in value_columns:
+        new_side[column + suffixes[0]] = df_new[column].to_numpy()
+        old_values = pd.Series(np.nan, index=new_side.index, dtype=object)
+        old_values[matched] = old_unique[column].to_numpy()[position[matched]]
+        new_side[column + suffixes[1]] = old_values.infer_objects()
+
+    old_side = df_old.loc[deleted_index, key_columns].reset_index(drop=True)
+    old_side['Status'] = DELETED
+    for column in value_columns:
+        old_side[column + suffixes[1]] = df_old.loc[deleted_index, column].to_numpy()
+
+    diff = pd.concat([new_side, old_side], ignore_index=True) if len(old_side) else new_side
+    return diff[key_columns + ['Status'] + [column + suffix for column in value_columns for suffix in suffixes] + other_columns]
+
+
+def describe(df, columns):
+    # 'col1 col2 ...' label of every row, e.g. for warning messages
+    labels = df[columns[0]].astype(str)
+    for column in columns[1:]:
+        labels = labels + ' ' + df[column].astype(str)
+    return labels.tolist()